@@ -0,0 +1,270 @@
+"""
+Gateway Admission Control
+Per-service and per-tool concurrency limits with short, deadline-bound wait
+queues split into cost lanes (fast / standard / bulk) that share freed slots
+by weighted fair scheduling; requests beyond a full lane get Retry-After
+"""
+import asyncio
+import math
+import time
+from collections import deque
+from contextlib import asynccontextmanager
+from typing import Deque, Dict, Optional
+
+from fastapi import HTTPException
+
+from tool_registry import ToolSpec
+from tracing import span
+
+FAST = "fast"
+STANDARD = "standard"
+BULK = "bulk"
+LANES = (FAST, STANDARD, BULK)
+DEFAULT_LANE_WEIGHTS = {FAST: 8, STANDARD: 3, BULK: 1}
+
+
+class AdmissionRejected(Exception):
+    """The limiter is saturated or the wait deadline passed"""
+
+    def __init__(self, scope: str, retry_after: float, reason: str):
+        super().__init__(f"{scope}: {reason}")
+        self.scope = scope
+        self.retry_after = retry_after
+        self.reason = reason
+
+
+def classify_lane(spec: ToolSpec, size: int, fast_max_bytes: int, bulk_min_bytes: int) -> str:
+    """Pick a lane from the tool's registry cost and the upload size"""
+    if spec.cost == "heavy" or size >= bulk_min_bytes:
+        return BULK
+    if spec.cost == "light" or size <= fast_max_bytes:
+        return FAST
+    return STANDARD
+
+
+class _Lane:
+    """FIFO waiters of one cost class plus its stride-scheduling pass value"""
+
+    def __init__(self, weight: int):
+        self.weight = max(1, weight)
+        self.waiters: Deque[asyncio.Future] = deque()
+        self.passes = 0.0
+        self.admitted = 0
+        self.rejected = 0
+        self.total_wait = 0.0
+        self.max_wait = 0.0
+
+    def stats(self) -> dict:
+        return {
+            "weight": self.weight,
+            "queued": len(self.waiters),
+            "admitted": self.admitted,
+            "rejected": self.rejected,
+            "avg_wait_ms": round(self.total_wait / self.admitted * 1000, 2) if self.admitted else 0.0,
+            "max_wait_ms": round(self.max_wait * 1000, 2),
+        }
+
+
+class ConcurrencyLimiter:
+    """At most `limit` holders, with per-lane FIFO queues of up to `max_queue` waiters
+
+    Freed slots go to the lane with the lowest pass value (stride scheduling),
+    so backlogged lanes share slots in proportion to their weights and a bulk
+    backlog cannot starve small requests. The fast lane may also use
+    `fast_reserved` slots above the limit.
+    """
+
+    def __init__(
+        self,
+        name: str,
+        limit: int,
+        max_queue: int = 32,
+        queue_timeout: float = 5.0,
+        lane_weights: Optional[Dict[str, int]] = None,
+        fast_reserved: int = 0,
+    ):
+        self.name = name
+        self.limit = max(1, limit)
+        self.max_queue = max_queue
+        self.queue_timeout = queue_timeout
+        self.fast_reserved = fast_reserved
+        self.in_flight = 0
+        self.admitted = 0
+        self.queued_total = 0
+        self.rejected_full = 0
+        self.rejected_timeout = 0
+        self.avg_hold_seconds = 0.0
+        weights = {**DEFAULT_LANE_WEIGHTS, **(lane_weights or {})}
+        self.lanes: Dict[str, _Lane] = {lane: _Lane(weights[lane]) for lane in LANES}
+
+    @property
+    def queued(self) -> int:
+        return sum(len(lane.waiters) for lane in self.lanes.values())
+
+    def _capacity(self, lane: str) -> int:
+        return self.limit + (self.fast_reserved if lane == FAST else 0)
+
+    def retry_after(self) -> float:
+        """Rough time until a slot frees up for a newcomer"""
+        hold = self.avg_hold_seconds or 1.0
+        return max(1.0, hold * (self.queued + 1) / self.limit)
+
+    def _dispatch(self):
+        """Give free slots to waiting lanes, lowest pass value first"""
+        while True:
+            ready = [
+                (lane.passes, name) for name, lane in self.lanes.items()
+                if lane.waiters and self.in_flight < self._capacity(name)
+            ]
+            if not ready:
+                return
+            _, name = min(ready)
+            lane = self.lanes[name]
+            waiter = lane.waiters.popleft()
+            if waiter.done():
+                continue
+            lane.passes += 1.0 / lane.weight
+            self.in_flight += 1
+            waiter.set_result(None)
+
+    async def acquire(self, timeout: Optional[float] = None, lane_name: str = STANDARD):
+        lane = self.lanes[lane_name]
+        if len(lane.waiters) >= self.max_queue:
+            self.rejected_full += 1
+            lane.rejected += 1
+            raise AdmissionRejected(self.name, self.retry_after(), f"{lane_name} queue full")
+
+        if not lane.waiters:
+            # A lane that was idle rejoins at the current virtual time instead
+            # of cashing in the credit it accumulated while empty
+            active = [l.passes for l in self.lanes.values() if l.waiters]
+            lane.passes = max(lane.passes, min(active) if active else lane.passes)
+
+        waiter = asyncio.get_running_loop().create_future()
+        lane.waiters.append(waiter)
+        enqueued = time.monotonic()
+        self._dispatch()
+        if not waiter.done():
+            self.queued_total += 1
+        try:
+            await asyncio.wait_for(waiter, self.queue_timeout if timeout is None else timeout)
+        except asyncio.TimeoutError:
+            self.rejected_timeout += 1
+            lane.rejected += 1
+            raise AdmissionRejected(self.name, self.retry_after(), "queue wait deadline exceeded")
+        except asyncio.CancelledError:
+            # The slot may have been handed over just as we were cancelled
+            if waiter.done() and not waiter.cancelled():
+                self.release()
+            raise
+        finally:
+            if waiter in lane.waiters:
+                lane.waiters.remove(waiter)
+        waited = time.monotonic() - enqueued
+        self.admitted += 1
+        lane.admitted += 1
+        lane.total_wait += waited
+        lane.max_wait = max(lane.max_wait, waited)
+
+    def release(self, held_seconds: Optional[float] = None):
+        if held_seconds is not None:
+            self.avg_hold_seconds = held_seconds if not self.avg_hold_seconds else (
+                0.9 * self.avg_hold_seconds + 0.1 * held_seconds
+            )
+        self.in_flight -= 1
+        self._dispatch()
+
+    def stats(self) -> dict:
+        return {
+            "limit": self.limit,
+            "fast_reserved": self.fast_reserved,
+            "in_flight": self.in_flight,
+            "queued": self.queued,
+            "max_queue": self.max_queue,
+            "queue_timeout_s": self.queue_timeout,
+            "admitted": self.admitted,
+            "queued_total": self.queued_total,
+            "rejected_full": self.rejected_full,
+            "rejected_timeout": self.rejected_timeout,
+            "avg_hold_ms": round(self.avg_hold_seconds * 1000, 2),
+            "lanes": {name: lane.stats() for name, lane in self.lanes.items()},
+        }
+
+
+class AdmissionController:
+    """Tool limit (when configured) then service limit, released in reverse order"""
+
+    def __init__(
+        self,
+        services,
+        service_limits: Optional[Dict[str, int]] = None,
+        tool_limits: Optional[Dict[str, int]] = None,
+        default_limit: int = 16,
+        max_queue: int = 32,
+        queue_timeout: float = 5.0,
+        lane_weights: Optional[Dict[str, int]] = None,
+        fast_reserved: int = 0,
+        fast_max_bytes: int = 256 * 1024,
+        bulk_min_bytes: int = 20 * 1024 * 1024,
+    ):
+        service_limits = service_limits or {}
+        self.queue_timeout = queue_timeout
+        self.fast_max_bytes = fast_max_bytes
+        self.bulk_min_bytes = bulk_min_bytes
+        self.services: Dict[str, ConcurrencyLimiter] = {
+            service: ConcurrencyLimiter(
+                service, service_limits.get(service, default_limit), max_queue, queue_timeout,
+                lane_weights, fast_reserved,
+            )
+            for service in services
+        }
+        self.tools: Dict[str, ConcurrencyLimiter] = {
+            tool: ConcurrencyLimiter(tool, limit, max_queue, queue_timeout, lane_weights, fast_reserved)
+            for tool, limit in (tool_limits or {}).items()
+        }
+
+    def lane_for(self, spec: ToolSpec, size: int) -> str:
+        return classify_lane(spec, size, self.fast_max_bytes, self.bulk_min_bytes)
+
+    @asynccontextmanager
+    async def admit(self, spec: ToolSpec, size: int = 0, timeout: Optional[float] = None):
+        """Hold a slot for spec while the body runs; raises HTTPException 503 when rejected
+
+        size is the expected upload size (Content-Length), used with the
+        tool's registry cost to pick the lane.
+        """
+        lane = self.lane_for(spec, size)
+        limiters = [l for l in (self.tools.get(spec.name), self.services.get(spec.service)) if l is not None]
+        held = []
+        deadline = time.monotonic() + (self.queue_timeout if timeout is None else timeout)
+        try:
+            with span("admission", lane=lane):
+                for limiter in limiters:
+                    await limiter.acquire(max(0.0, deadline - time.monotonic()), lane)
+                    held.append(limiter)
+        except asyncio.CancelledError:
+            for limiter in reversed(held):
+                limiter.release()
+            raise
+        except AdmissionRejected as e:
+            for limiter in reversed(held):
+                limiter.release()
+            raise HTTPException(
+                status_code=503,
+                detail=f"Too many concurrent {e.scope} requests ({e.reason}). Please retry shortly.",
+                headers={"Retry-After": str(int(math.ceil(e.retry_after)))}
+            )
+
+        started = time.monotonic()
+        try:
+            yield
+        finally:
+            held_seconds = time.monotonic() - started
+            for limiter in reversed(held):
+                limiter.release(held_seconds)
+
+    def stats(self) -> dict:
+        return {
+            "services": {name: limiter.stats() for name, limiter in self.services.items()},
+            "tools": {name: limiter.stats() for name, limiter in self.tools.items()},
+        }
@@ -0,0 +1,159 @@
+"""
+Artifact Readiness Index
+In-process record of tool outputs in the static directory, with completion
+events so downloads of pending outputs wake as soon as the file is known
+"""
+import asyncio
+import os
+import time
+from collections import OrderedDict
+from typing import Callable, Dict, Optional
+
+PENDING = "pending"
+READY = "ready"
+FAILED = "failed"
+
+
+class ArtifactIndex:
+    """Bounded LRU of known artifacts plus readiness events for pending ones
+
+    A name the index has never heard of costs one os.stat before a 404; no
+    directory listing and no sleeping. Names announced as pending (a service
+    reported the output but it is not visible yet) are awaited on an event
+    with a deadline. Outputs published in this process (a result passing
+    through record_artifact) set the event directly; files written by
+    another process are picked up by re-checking every poll_interval.
+    """
+
+    def __init__(self, directory: str, max_entries: int = 100_000, locate: Optional[Callable[[str], str]] = None,
+                 poll_interval: float = 0.05):
+        self.directory = directory
+        self.locate = locate
+        self.max_entries = max_entries
+        self.poll_interval = poll_interval
+        self.hits = 0
+        self.misses = 0
+        self.waits = 0
+        self.wait_timeouts = 0
+        self._entries: "OrderedDict[str, dict]" = OrderedDict()
+        self._events: Dict[str, asyncio.Event] = {}
+
+    def path_for(self, filename: str) -> str:
+        if self.locate is not None:
+            return self.locate(filename)
+        return os.path.join(self.directory, filename)
+
+    def _stat(self, filename: str) -> Optional[os.stat_result]:
+        try:
+            return os.stat(self.path_for(filename))
+        except FileNotFoundError:
+            return None
+
+    def _set(self, filename: str, state: str, size: int = 0, mtime: float = 0.0):
+        self._entries[filename] = {"state": state, "size": size, "mtime": mtime, "updated": time.time()}
+        self._entries.move_to_end(filename)
+        while len(self._entries) > self.max_entries:
+            oldest = next(iter(self._entries))
+            del self._entries[oldest]
+            self._notify(oldest)
+
+    def _notify(self, filename: str):
+        event = self._events.pop(filename, None)
+        if event is not None:
+            event.set()
+
+    def mark_pending(self, filename: str):
+        entry = self._entries.get(filename)
+        if entry is None or entry["state"] != READY:
+            self._set(filename, PENDING)
+
+    def mark_ready(self, filename: str, size: int, mtime: float = 0.0):
+        self._set(filename, READY, size, mtime)
+        self._notify(filename)
+
+    def mark_failed(self, filename: str):
+        self._set(filename, FAILED)
+        self._notify(filename)
+
+    def forget(self, filename: str):
+        self._entries.pop(filename, None)
+        self._notify(filename)
+
+    def publish(self, filename: str):
+        """Record an output reported by a microservice"""
+        st = self._stat(filename)
+        if st is None:
+            self.mark_pending(filename)
+        else:
+            self.mark_ready(filename, st.st_size, st.st_mtime)
+
+    def lookup(self, filename: str) -> Optional[dict]:
+        """Ready entry for filename, checking the disk once for unknown names"""
+        entry = self._entries.get(filename)
+        if entry is not None and entry["state"] == READY:
+            st = self._stat(filename)
+            if st is not None:
+                self._entries.move_to_end(filename)
+                return {**entry, "size": st.st_size, "mtime": st.st_mtime, "stat": st}
+            # Deleted behind our back (cleanup job); forget it
+            self.forget(filename)
+            return None
+        if entry is None:
+            st = self._stat(filename)
+            if st is not None:
+                self.mark_ready(filename, st.st_size, st.st_mtime)
+                return {**self._entries[filename], "stat": st}
+        return None
+
+    async def wait_ready(self, filename: str, timeout: float) -> Optional[dict]:
+        """Return the ready entry, waiting up to timeout only if it is pending"""
+        entry = self.lookup(filename)
+        if entry is not None:
+            self.hits += 1
+            return entry
+        pending = self._entries.get(filename)
+        if pending is None or pending["state"] != PENDING:
+            self.misses += 1
+            return None
+        self.publish(filename)
+        entry = self.lookup(filename)
+        if entry is not None:
+            self.hits += 1
+            return entry
+
+        self.waits += 1
+        event = self._events.setdefault(filename, asyncio.Event())
+        deadline = time.monotonic() + timeout
+        while not event.is_set():
+            remaining = deadline - time.monotonic()
+            if remaining <= 0:
+                self.wait_timeouts += 1
+                if self._events.get(filename) is event:
+                    del self._events[filename]
+                break
+            try:
+                await asyncio.wait_for(event.wait(), min(self.poll_interval, remaining))
+            except asyncio.TimeoutError:
+                # Written by another process: no notification, so look again
+                self.publish(filename)
+        entry = self.lookup(filename)
+        if entry is None:
+            self.misses += 1
+        else:
+            self.hits += 1
+        return entry
+
+    def stats(self) -> dict:
+        states = {PENDING: 0, READY: 0, FAILED: 0}
+        for entry in self._entries.values():
+            states[entry["state"]] += 1
+        return {
+            "entries": len(self._entries),
+            "max_entries": self.max_entries,
+            **states,
+            "waiters": len(self._events),
+            "hits": self.hits,
+            "misses": self.misses,
+            "waits": self.waits,
+            "wait_timeouts": self.wait_timeouts,
+        }
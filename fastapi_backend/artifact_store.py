@@ -0,0 +1,306 @@
+"""
+Processed Artifact Store
+Tool outputs in hash-sharded directories with a persistent SQLite index of
+size, creation and last download time, plus background TTL / disk-quota
+eviction and sweeping of orphaned temp files
+"""
+import asyncio
+import hashlib
+import logging
+import os
+import sqlite3
+import tempfile
+import threading
+import time
+import uuid
+from datetime import datetime
+from typing import Callable, Iterable, List, Optional, Set, Tuple
+
+from starlette.staticfiles import StaticFiles
+
+from config import settings
+
+logger = logging.getLogger(__name__)
+
+INDEX_FILENAME = ".artifacts.db"
+
+SCHEMA = """
+CREATE TABLE IF NOT EXISTS artifacts (
+    name TEXT PRIMARY KEY,
+    size INTEGER NOT NULL,
+    created REAL NOT NULL,
+    last_access REAL NOT NULL
+);
+CREATE INDEX IF NOT EXISTS artifacts_last_access ON artifacts (last_access);
+"""
+
+
+def output_stamp() -> str:
+    """Timestamp plus a random part for output names; concurrent runs of a tool never share a name"""
+    return f"{datetime.now().strftime('%Y%m%d_%H%M%S')}-{uuid.uuid4().hex[:12]}"
+
+
+def safe_name(filename: str) -> bool:
+    """Outputs are addressed by a bare file name, never a path"""
+    return bool(filename) and filename not in (".", "..") and os.path.basename(filename) == filename \
+        and "\\" not in filename and "\0" not in filename
+
+
+class ArtifactStore:
+    """Outputs stored at <root>/<h[0:2]>/<h[2:4]>/<name>, h = sha1(name)
+
+    Sharding keeps every directory small however many outputs accumulate.
+    Only files registered through the store are ever evicted; files already
+    sitting flat in the root (older outputs, demo files) are still found
+    and served but left alone. Eviction removes outputs idle (not created or
+    downloaded) for ttl_seconds, then the least recently downloaded ones
+    until the total is under max_bytes.
+
+    The index is shared by every process writing or serving outputs (WAL
+    mode), so services register what they write and the gateway records
+    downloads and evicts.
+
+    temp_patterns are (directory, prefix, suffix[, max_age]) entries; a
+    pattern without its own max_age uses temp_max_age. Paths returned by
+    keep_temp (e.g. spools of jobs still queued) are never swept.
+    """
+
+    def __init__(
+        self,
+        root: str,
+        ttl_seconds: float = 3600,
+        max_bytes: int = 2 * 1024 * 1024 * 1024,
+        temp_max_age: float = 1800,
+        temp_patterns: Iterable[tuple] = (),
+        index_path: Optional[str] = None,
+        keep_temp: Optional[Callable[[], Set[str]]] = None,
+    ):
+        self.root = os.path.abspath(root)
+        self.ttl_seconds = ttl_seconds
+        self.max_bytes = max_bytes
+        self.temp_max_age = temp_max_age
+        self.temp_patterns: List[tuple] = list(temp_patterns)
+        self.keep_temp = keep_temp
+        self.index_path = index_path or os.path.join(self.root, INDEX_FILENAME)
+        self.expired = 0
+        self.evicted = 0
+        self.temp_removed = 0
+        self.last_sweep_at: Optional[float] = None
+        self._lock = threading.Lock()
+        self._conn: Optional[sqlite3.Connection] = None
+        self._pid: Optional[int] = None
+        self._task: Optional[asyncio.Task] = None
+
+    @property
+    def conn(self) -> sqlite3.Connection:
+        if self._conn is None or self._pid != os.getpid():
+            os.makedirs(self.root, exist_ok=True)
+            conn = sqlite3.connect(self.index_path, timeout=5.0, isolation_level=None, check_same_thread=False)
+            conn.execute("PRAGMA journal_mode=WAL")
+            conn.execute("PRAGMA synchronous=NORMAL")
+            conn.executescript(SCHEMA)
+            self._conn, self._pid = conn, os.getpid()
+        return self._conn
+
+    def _execute(self, sql: str, params: tuple = ()):
+        with self._lock:
+            self.conn.execute(sql, params)
+
+    def _fetch(self, sql: str, params: tuple = ()) -> list:
+        # Downloads record access from StaticFiles' worker threads
+        with self._lock:
+            return self.conn.execute(sql, params).fetchall()
+
+    # Paths
+
+    def shard_path(self, filename: str) -> str:
+        digest = hashlib.sha1(filename.encode("utf-8")).hexdigest()
+        return os.path.join(self.root, digest[:2], digest[2:4], filename)
+
+    def path_for(self, filename: str) -> str:
+        """Where to write a new output; creates its shard directory"""
+        if not safe_name(filename):
+            raise ValueError(f"Invalid artifact name: {filename!r}")
+        path = self.shard_path(filename)
+        os.makedirs(os.path.dirname(path), exist_ok=True)
+        return path
+
+    def locate(self, filename: str) -> Optional[str]:
+        """Path of an existing output, sharded or flat in the root; None if absent"""
+        if not safe_name(filename):
+            return None
+        for path in (self.shard_path(filename), os.path.join(self.root, filename)):
+            if os.path.isfile(path):
+                return path
+        return None
+
+    def resolve(self, filename: str) -> str:
+        """Path of an existing output, else where one with this name will be written"""
+        return self.locate(filename) or self.shard_path(filename)
+
+    # Index
+
+    def register(self, filename: str, size: Optional[int] = None):
+        """Record a finished output so it counts toward the quota and can expire"""
+        path = self.shard_path(filename)
+        try:
+            if size is None:
+                size = os.path.getsize(path)
+        except OSError:
+            return
+        now = time.time()
+        self._execute(
+            "INSERT OR REPLACE INTO artifacts (name, size, created, last_access) VALUES (?, ?, ?, ?)",
+            (filename, size, now, now),
+        )
+
+    def touch(self, filename: str):
+        """Record a download (eviction keeps recently downloaded outputs longest)"""
+        self._execute("UPDATE artifacts SET last_access = ? WHERE name = ?", (time.time(), filename))
+
+    def _delete(self, filename: str):
+        try:
+            os.remove(self.shard_path(filename))
+        except FileNotFoundError:
+            pass
+        except OSError as e:
+            logger.warning(f"Could not remove artifact {filename}: {str(e)}")
+            return
+        self._execute("DELETE FROM artifacts WHERE name = ?", (filename,))
+
+    # Eviction
+
+    def evict(self, now: Optional[float] = None) -> dict:
+        """Remove idle outputs past the TTL, then LRU outputs beyond the quota"""
+        now = time.time() if now is None else now
+        expired = [
+            row[0] for row in self._fetch("SELECT name FROM artifacts WHERE last_access < ?", (now - self.ttl_seconds,))
+        ]
+        for filename in expired:
+            self._delete(filename)
+
+        evicted = 0
+        total = self._fetch("SELECT COALESCE(SUM(size), 0) FROM artifacts")[0][0]
+        if total > self.max_bytes:
+            for filename, size in self._fetch("SELECT name, size FROM artifacts ORDER BY last_access"):
+                if total <= self.max_bytes:
+                    break
+                self._delete(filename)
+                total -= size
+                evicted += 1
+
+        self.expired += len(expired)
+        self.evicted += evicted
+        return {"expired": len(expired), "evicted": evicted, "total_bytes": total}
+
+    def sweep_temp_files(self, now: Optional[float] = None, keep: Iterable[str] = ()) -> int:
+        """Remove leftovers of crashed or interrupted requests (e.g. NamedTemporaryFile(delete=False))"""
+        now = time.time() if now is None else now
+        keep = {os.path.abspath(path) for path in keep}
+        removed = 0
+        uid = os.getuid() if hasattr(os, "getuid") else None
+        for pattern in self.temp_patterns:
+            directory, prefix, suffix = pattern[:3]
+            max_age = pattern[3] if len(pattern) > 3 else self.temp_max_age
+            try:
+                entries = list(os.scandir(directory))
+            except OSError:
+                continue
+            for entry in entries:
+                if not (entry.name.startswith(prefix) and entry.name.endswith(suffix)):
+                    continue
+                if os.path.abspath(entry.path) in keep:
+                    continue
+                try:
+                    st = entry.stat(follow_symlinks=False)
+                    if not entry.is_file(follow_symlinks=False) or now - st.st_mtime < max_age:
+                        continue
+                    if uid is not None and st.st_uid != uid:
+                        continue
+                    os.remove(entry.path)
+                    removed += 1
+                except OSError:
+                    pass
+        self.temp_removed += removed
+        return removed
+
+    def sweep(self, keep: Iterable[str] = ()) -> dict:
+        result = self.evict()
+        result["temp_removed"] = self.sweep_temp_files(keep=keep)
+        self.last_sweep_at = time.time()
+        return result
+
+    async def _run(self, interval: float):
+        while True:
+            try:
+                # Collected on the event loop, which owns the state keep_temp reads
+                keep = set(self.keep_temp()) if self.keep_temp is not None else set()
+                result = await asyncio.to_thread(self.sweep, keep)
+                if result["expired"] or result["evicted"] or result["temp_removed"]:
+                    logger.info(f"Artifact sweep: {result}")
+            except Exception as e:
+                logger.error(f"Artifact sweep error: {str(e)}")
+            await asyncio.sleep(interval)
+
+    def start(self, interval: float):
+        if self._task is None:
+            self._task = asyncio.create_task(self._run(interval))
+
+    async def stop(self):
+        if self._task is not None:
+            self._task.cancel()
+            try:
+                await self._task
+            except asyncio.CancelledError:
+                pass
+            self._task = None
+
+    def stats(self) -> dict:
+        count, total = self._fetch("SELECT COUNT(*), COALESCE(SUM(size), 0) FROM artifacts")[0]
+        return {
+            "root": self.root,
+            "artifacts": count,
+            "total_bytes": total,
+            "max_bytes": self.max_bytes,
+            "ttl_seconds": self.ttl_seconds,
+            "expired": self.expired,
+            "evicted": self.evicted,
+            "temp_removed": self.temp_removed,
+            "last_sweep_at": self.last_sweep_at,
+        }
+
+
+class ArtifactStaticFiles(StaticFiles):
+    """StaticFiles over the store: /static/<name> finds sharded outputs and counts as a download"""
+
+    def __init__(self, store: ArtifactStore, **kwargs):
+        super().__init__(directory=store.root, **kwargs)
+        self.store = store
+
+    def lookup_path(self, path: str) -> Tuple[str, Optional[os.stat_result]]:
+        name = os.path.basename(path)
+        if name.startswith("."):
+            # The index and in-progress files are not downloads
+            return "", None
+        if name == path:
+            full_path = self.store.locate(name)
+            if full_path is not None:
+                self.store.touch(name)
+                return full_path, os.stat(full_path)
+        return super().lookup_path(path)
+
+
+def create_artifact_store() -> ArtifactStore:
+    """Build the ArtifactStore shared by the gateway and services from settings"""
+    return ArtifactStore(
+        settings.ARTIFACT_DIR,
+        ttl_seconds=settings.PROCESSED_FILE_CLEANUP_SECONDS,
+        max_bytes=settings.ARTIFACT_MAX_MB * 1024 * 1024,
+        temp_max_age=settings.TEMP_FILE_CLEANUP_MINUTES * 60,
+        temp_patterns=[
+            (tempfile.gettempdir(), "tmp", ".pdf"),
+            # A job spool lives as long as its job may: queued records expire after the result TTL
+            (settings.JOB_SPOOL_DIR, "job_", ".body",
+             max(settings.TEMP_FILE_CLEANUP_MINUTES * 60, settings.JOB_RESULT_TTL_SECONDS + settings.JOB_TIMEOUT_SECONDS)),
+        ],
+    )
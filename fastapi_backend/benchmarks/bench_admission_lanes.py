@@ -0,0 +1,80 @@
+#!/usr/bin/env python3
+"""
+Admission Lane Simulation
+Mixed load against one service limiter: a steady stream of small
+json-formatter calls while pdf-merger calls keep every slot busy. Prints
+small-tool wait percentiles with and without cost lanes.
+
+Usage: cd fastapi_backend && python benchmarks/bench_admission_lanes.py
+"""
+import asyncio
+import os
+import random
+import sys
+import time
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+from admission import AdmissionController
+from tool_registry import registry
+
+LIMIT = 4
+SMALL_REQUESTS = 200
+LARGE_REQUESTS = 60
+SMALL_SERVICE_TIME = 0.005
+LARGE_SERVICE_TIME = 0.25
+
+
+def percentile(values, pct):
+    ordered = sorted(values)
+    return ordered[min(len(ordered) - 1, int(len(ordered) * pct))]
+
+
+async def simulate(lanes: bool):
+    small = registry.get("json-formatter")._replace(service="shared")
+    large = registry.get("pdf-merger")._replace(service="shared")
+    controller = AdmissionController(
+        ["shared"],
+        default_limit=LIMIT,
+        max_queue=10_000,
+        queue_timeout=600,
+        # Without lanes every request is classified the same and served FIFO
+        lane_weights=None if lanes else {"fast": 1, "standard": 1, "bulk": 1},
+        fast_reserved=1 if lanes else 0,
+        fast_max_bytes=64 * 1024 if lanes else -1,
+        bulk_min_bytes=20 * 1024 * 1024 if lanes else 1 << 62,
+    )
+    if not lanes:
+        small, large = small._replace(cost="medium"), large._replace(cost="medium")
+    waits = {"small": [], "large": []}
+
+    async def call(kind, spec, size, service_time):
+        start = time.perf_counter()
+        async with controller.admit(spec, size):
+            waits[kind].append(time.perf_counter() - start)
+            await asyncio.sleep(service_time)
+
+    rng = random.Random(7)
+    tasks = [asyncio.create_task(call("large", large, 50 * 1024 * 1024, LARGE_SERVICE_TIME))
+             for _ in range(LARGE_REQUESTS)]
+    for _ in range(SMALL_REQUESTS):
+        await asyncio.sleep(rng.expovariate(1 / 0.01))
+        tasks.append(asyncio.create_task(call("small", small, 2 * 1024, SMALL_SERVICE_TIME)))
+    await asyncio.gather(*tasks)
+    return waits
+
+
+def report(label, waits):
+    small, large = waits["small"], waits["large"]
+    print(f"{label:<12} small p50={percentile(small, .5) * 1000:7.1f}ms "
+          f"p99={percentile(small, .99) * 1000:7.1f}ms | "
+          f"large p50={percentile(large, .5) * 1000:7.1f}ms max={max(large) * 1000:7.1f}ms")
+
+
+def main():
+    report("FIFO", asyncio.run(simulate(lanes=False)))
+    report("cost lanes", asyncio.run(simulate(lanes=True)))
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,104 @@
+#!/usr/bin/env python3
+"""
+Metrics Overhead Benchmark
+Drives ASGI apps directly (no sockets) with and without MetricsMiddleware:
+a bare ASGI app, which isolates the middleware's own cost, and a minimal
+FastAPI app for scale. Rounds alternate and the best round counts, so
+scheduler noise does not land on one side. Also times a full scrape.
+
+Usage: cd fastapi_backend && python benchmarks/bench_metrics_overhead.py
+"""
+import asyncio
+import os
+import sys
+import time
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+from fastapi import FastAPI
+
+from metrics import HTTPMetrics, MetricsMiddleware, MetricsRegistry, tool_label_for
+from tool_registry import registry
+
+REQUESTS = 20_000
+ROUNDS = 7
+TOOLS = list(registry.tools)
+
+
+async def bare_app(scope, receive, send):
+    await receive()
+    await send({"type": "http.response.start", "status": 200, "headers": [(b"content-length", b"2")]})
+    await send({"type": "http.response.body", "body": b"{}"})
+
+
+def fastapi_app():
+    app = FastAPI()
+
+    @app.post("/api/tools/{tool_name}")
+    async def tool(tool_name: str):
+        return {"success": True, "tool": tool_name}
+
+    return app
+
+
+def instrument(app, metrics_registry: MetricsRegistry):
+    return MetricsMiddleware(
+        app,
+        metrics=HTTPMetrics(metrics_registry, "gateway"),
+        label_for=tool_label_for(TOOLS, ("/api/tools/",), ("/api",)),
+    )
+
+
+async def drive(app, requests: int) -> float:
+    body = b'{"x": 1}'
+
+    async def receive():
+        return {"type": "http.request", "body": body, "more_body": False}
+
+    async def send(message):
+        pass
+
+    scopes = [{
+        "type": "http", "asgi": {"version": "3.0"}, "http_version": "1.1", "method": "POST",
+        "scheme": "http", "path": f"/api/tools/{TOOLS[i % len(TOOLS)]}", "raw_path": b"",
+        "root_path": "", "query_string": b"", "client": ("127.0.0.1", 1234), "server": ("test", 80),
+        "headers": [(b"content-type", b"application/json"), (b"content-length", str(len(body)).encode())],
+    } for i in range(len(TOOLS))]
+
+    start = time.perf_counter()
+    for i in range(requests):
+        await app(dict(scopes[i % len(scopes)]), receive, send)
+    return time.perf_counter() - start
+
+
+async def compare(plain, instrumented):
+    await drive(plain, 500)
+    await drive(instrumented, 500)
+    plain_times, instrumented_times = [], []
+    for _ in range(ROUNDS):
+        plain_times.append(await drive(plain, REQUESTS))
+        instrumented_times.append(await drive(instrumented, REQUESTS))
+    return min(plain_times) / REQUESTS, min(instrumented_times) / REQUESTS
+
+
+def report(label, plain, instrumented):
+    overhead = instrumented - plain
+    print(f"{label:<8} baseline {plain * 1e6:7.2f} us  instrumented {instrumented * 1e6:7.2f} us  "
+          f"overhead {overhead * 1e6:6.2f} us/request ({overhead / plain * 100:.1f}%)")
+
+
+def main():
+    metrics_registry = MetricsRegistry()
+    print(f"{len(TOOLS)} tool labels, best of {ROUNDS} x {REQUESTS} requests")
+    report("bare", *asyncio.run(compare(bare_app, instrument(bare_app, metrics_registry))))
+    app = fastapi_app()
+    report("fastapi", *asyncio.run(compare(app, instrument(app, MetricsRegistry()))))
+
+    start = time.perf_counter()
+    text = metrics_registry.render()
+    print(f"scrape render {(time.perf_counter() - start) * 1000:.2f} ms "
+          f"({len(text.splitlines())} lines, {len(text) / 1024:.0f} KiB)")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,106 @@
+#!/usr/bin/env python3
+"""
+PDF Process Pool Benchmark
+Starts the real PDF service with PDF_POOL_WORKERS=0 (PyPDF2 work on the
+event loop) and with a process pool, sends concurrent merges of a generated
+multi-page PDF and probes /health throughout. Reports merges per second and
+the worst /health latency for each configuration.
+
+Usage: cd fastapi_backend && python benchmarks/bench_pdf_pool.py --workers 4 --concurrency 8
+"""
+import argparse
+import asyncio
+import os
+import sys
+import tempfile
+import time
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+import httpx
+from reportlab.pdfgen import canvas
+
+from loadtest_gateway import spawn, wait_healthy
+
+SERVICES_DIR = os.path.join(os.path.dirname(os.path.dirname(os.path.abspath(__file__))), "services")
+
+
+def parse_args():
+    parser = argparse.ArgumentParser(description=__doc__.split("\n")[1])
+    parser.add_argument("--workers", type=int, default=os.cpu_count() or 2, help="pool size to compare with inline")
+    parser.add_argument("--concurrency", type=int, default=8)
+    parser.add_argument("--merges", type=int, default=16, help="merges per configuration")
+    parser.add_argument("--pages", type=int, default=400, help="pages in each input PDF")
+    parser.add_argument("--port", type=int, default=18101)
+    return parser.parse_args()
+
+
+def make_pdf(path: str, pages: int):
+    c = canvas.Canvas(path)
+    for page in range(pages):
+        for line in range(40):
+            c.drawString(40, 800 - line * 18, f"page {page} line {line} " + "lorem ipsum dolor sit amet " * 3)
+        c.showPage()
+    c.save()
+
+
+async def measure(base_url: str, upload: bytes, merges: int, concurrency: int):
+    files = [("files", (f"input-{i}.pdf", upload, "application/pdf")) for i in range(2)]
+    counter = iter(range(merges))
+    statuses = {}
+    limits = httpx.Limits(max_connections=concurrency + 1)
+
+    async with httpx.AsyncClient(base_url=base_url, limits=limits, timeout=600) as client:
+        async def worker():
+            for _ in counter:
+                response = await client.post("/process/pdf-merger", files=files, headers={"X-Skip-Cache": "1"})
+                statuses[response.status_code] = statuses.get(response.status_code, 0) + 1
+
+        async def probe(done: asyncio.Event, worst: list):
+            while not done.is_set():
+                start = time.perf_counter()
+                await client.get("/health")
+                worst[0] = max(worst[0], time.perf_counter() - start)
+                await asyncio.sleep(0.05)
+
+        done, worst = asyncio.Event(), [0.0]
+        prober = asyncio.create_task(probe(done, worst))
+        start = time.perf_counter()
+        await asyncio.gather(*(worker() for _ in range(concurrency)))
+        elapsed = time.perf_counter() - start
+        done.set()
+        await prober
+    return merges / elapsed, worst[0], statuses
+
+
+async def run_config(args, workers: int, upload: bytes, log_dir: str):
+    env = {"PDF_POOL_WORKERS": str(workers), "RESULT_CACHE_MAX_ENTRIES": "0"}
+    process = spawn("pdf_service", args.port, env, SERVICES_DIR, os.path.join(log_dir, f"pdf-{workers}.log"))
+    try:
+        base_url = f"http://127.0.0.1:{args.port}"
+        await wait_healthy(f"{base_url}/health")
+        return await measure(base_url, upload, args.merges, args.concurrency)
+    finally:
+        process.terminate()
+        process.wait(timeout=30)
+
+
+def main():
+    args = parse_args()
+    log_dir = tempfile.mkdtemp(prefix="bench_pdf_pool_")
+    path = os.path.join(log_dir, "input.pdf")
+    make_pdf(path, args.pages)
+    with open(path, "rb") as f:
+        upload = f.read()
+
+    print(f"{args.merges} merges of 2 x {args.pages} pages, concurrency {args.concurrency}, "
+          f"{os.cpu_count()} CPUs")
+    for workers in (0, args.workers):
+        rate, worst, statuses = asyncio.run(run_config(args, workers, upload, log_dir))
+        label = "inline" if workers == 0 else f"pool x{workers}"
+        print(f"{label:<9} {rate:6.2f} merges/s  worst /health {worst * 1000:8.1f} ms  statuses {statuses}")
+    print(f"logs      {log_dir}")
+
+
+if __name__ == "__main__":
+    main()
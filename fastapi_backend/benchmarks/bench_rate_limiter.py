@@ -0,0 +1,69 @@
+#!/usr/bin/env python3
+"""
+Rate Limiter Microbenchmark
+Cost per check with 100k distinct client IPs: old list-rebuilding sliding
+window vs the token-bucket RateLimiter
+
+Usage: cd fastapi_backend && python benchmarks/bench_rate_limiter.py
+"""
+import os
+import random
+import sys
+import time
+from collections import defaultdict
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+from rate_limiter import RateLimiter, RateLimitRule
+
+DISTINCT_IPS = 100_000
+CHECKS = 1_000_000
+REQUESTS, WINDOW = 100, 900
+
+
+def legacy_limiter():
+    """The previous is_rate_limited implementation from main.py"""
+    storage = defaultdict(list)
+
+    def is_rate_limited(client_ip: str) -> bool:
+        now = time.time()
+        window_start = now - WINDOW
+        storage[client_ip] = [t for t in storage[client_ip] if t > window_start]
+        if len(storage[client_ip]) >= REQUESTS:
+            return True
+        storage[client_ip].append(now)
+        return False
+
+    return is_rate_limited, storage
+
+
+def run(label: str, check, ips):
+    start = time.perf_counter()
+    for ip in ips:
+        check(ip)
+    elapsed = time.perf_counter() - start
+    print(f"{label:<28} {elapsed / len(ips) * 1e9:8.0f} ns/check  ({len(ips)} checks)")
+
+
+def main():
+    rng = random.Random(42)
+    ips = [f"10.{i >> 16 & 255}.{i >> 8 & 255}.{i & 255}" for i in range(DISTINCT_IPS)]
+    # Warm every IP once, then draw a skewed stream so hot clients fill up
+    stream = ips + [ips[int(rng.paretovariate(1.2)) % DISTINCT_IPS] for _ in range(CHECKS)]
+
+    legacy_check, legacy_storage = legacy_limiter()
+    run("legacy sliding window", legacy_check, stream)
+
+    limiter = RateLimiter(
+        rules=[RateLimitRule("tools", REQUESTS, WINDOW, prefixes=("/api/tools/",))],
+        default=RateLimitRule("default", REQUESTS, WINDOW),
+    )
+    run("token bucket RateLimiter", lambda ip: limiter.check(ip, "/api/tools/pdf-merger"), stream)
+
+    print(f"\nTracked clients: legacy={len(legacy_storage)} "
+          f"token-bucket={limiter.stats()['tools']['tracked_clients']}")
+    print(f"Legacy timestamps held: {sum(len(v) for v in legacy_storage.values())}")
+
+
+if __name__ == "__main__":
+    main()
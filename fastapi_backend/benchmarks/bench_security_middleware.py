@@ -0,0 +1,127 @@
+#!/usr/bin/env python3
+"""
+Security Middleware Benchmark
+Requests per second through a FastAPI app guarded by the old decorator-style
+@app.middleware("http") security/rate-limit hook (BaseHTTPMiddleware) and by
+the pure ASGI SecurityMiddleware, for a small JSON route, a FileResponse
+download and a StaticFiles asset. ASGI apps are driven directly (no sockets);
+rounds alternate and the best round counts.
+
+Usage: cd fastapi_backend && python benchmarks/bench_security_middleware.py
+"""
+import asyncio
+import os
+import sys
+import tempfile
+import time
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+from fastapi import FastAPI, Request
+from fastapi.responses import FileResponse, JSONResponse
+from fastapi.staticfiles import StaticFiles
+
+from rate_limiter import RateLimiter, RateLimitRule
+from security import SECURITY_HEADERS, SecurityMiddleware, client_ip
+
+REQUESTS = 3_000
+ROUNDS = 5
+FILE_SIZE = 256 * 1024
+STATIC_PREFIXES = ("/assets/", "/static/")
+PATHS = {"json": "/api/ping", "download": "/api/download/out.pdf", "static": "/static/out.pdf"}
+
+
+def limiter() -> RateLimiter:
+    return RateLimiter(rules=[], default=RateLimitRule("default", 10 ** 9, 1.0))
+
+
+def base_app(directory: str) -> FastAPI:
+    app = FastAPI()
+    path = os.path.join(directory, "out.pdf")
+
+    @app.get("/api/ping")
+    async def ping():
+        return {"status": "ok"}
+
+    @app.get("/api/download/{filename}")
+    async def download(filename: str):
+        return FileResponse(path, media_type="application/pdf")
+
+    app.mount("/static", StaticFiles(directory=directory), name="static")
+    return app
+
+
+def decorator_app(directory: str) -> FastAPI:
+    """The gateway's previous middleware, verbatim apart from the client IP helper"""
+    app = base_app(directory)
+    rate_limiter = limiter()
+
+    @app.middleware("http")
+    async def security_headers_middleware(request: Request, call_next):
+        allowed, retry_after, _ = rate_limiter.check(client_ip(request.scope), request.url.path)
+        if not allowed:
+            return JSONResponse(status_code=429, content={"detail": "Rate limit exceeded. Try again later."},
+                                headers={"Retry-After": str(max(1, int(retry_after + 0.999)))})
+        response = await call_next(request)
+        for name, value in SECURITY_HEADERS.items():
+            response.headers[name] = value
+        return response
+
+    return app
+
+
+def asgi_app(directory: str) -> FastAPI:
+    app = base_app(directory)
+    app.add_middleware(SecurityMiddleware, rate_limiter=limiter(), skip_prefixes=STATIC_PREFIXES)
+    return app
+
+
+async def drive(app, path: str, requests: int) -> float:
+    scope = {
+        "type": "http", "asgi": {"version": "3.0"}, "http_version": "1.1", "method": "GET",
+        "scheme": "http", "path": path, "raw_path": path.encode(), "root_path": "", "query_string": b"",
+        "client": ("127.0.0.1", 1234), "server": ("test", 80), "headers": [(b"host", b"test")],
+    }
+    received = []
+
+    async def receive():
+        await asyncio.sleep(3600)  # only asked for on disconnect
+        return {"type": "http.disconnect"}
+
+    async def send(message):
+        if message["type"] == "http.response.start":
+            received.append(message["status"])
+
+    start = time.perf_counter()
+    for _ in range(requests):
+        await app(dict(scope), receive, send)
+    elapsed = time.perf_counter() - start
+    assert set(received) == {200}, set(received)
+    return elapsed
+
+
+async def compare(before, after, path: str):
+    await drive(before, path, 200)
+    await drive(after, path, 200)
+    before_times, after_times = [], []
+    for _ in range(ROUNDS):
+        before_times.append(await drive(before, path, REQUESTS))
+        after_times.append(await drive(after, path, REQUESTS))
+    return REQUESTS / min(before_times), REQUESTS / min(after_times)
+
+
+def main():
+    directory = tempfile.mkdtemp(prefix="bench_security_")
+    with open(os.path.join(directory, "out.pdf"), "wb") as f:
+        f.write(os.urandom(FILE_SIZE))
+
+    before, after = decorator_app(directory), asgi_app(directory)
+    print(f"best of {ROUNDS} x {REQUESTS} requests, {FILE_SIZE // 1024} KiB file")
+    for label, path in PATHS.items():
+        rps_before, rps_after = asyncio.run(compare(before, after, path))
+        print(f"{label:<9} decorator {rps_before:8,.0f} req/s  pure ASGI {rps_after:8,.0f} req/s  "
+              f"({(rps_after / rps_before - 1) * 100:+.1f}%)")
+
+
+if __name__ == "__main__":
+    main()
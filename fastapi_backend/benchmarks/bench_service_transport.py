@@ -0,0 +1,126 @@
+#!/usr/bin/env python3
+"""
+Service Transport Benchmark
+Per-request latency of gateway-style calls (pooled keep-alive httpx client)
+to the same FastAPI app served by uvicorn over localhost TCP and over a Unix
+domain socket. The server runs in its own process, as the services do, and
+the two transports alternate rounds so drift does not favour either side.
+
+Usage: cd fastapi_backend && python benchmarks/bench_service_transport.py
+"""
+import asyncio
+import os
+import statistics
+import subprocess
+import sys
+import tempfile
+import time
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+import httpx
+from fastapi import FastAPI, Request
+
+from http_pool import split_endpoint
+
+REQUESTS = 2_000
+ROUNDS = 5
+PORT = 8791
+PAYLOADS = {"health": 0, "64KiB": 64 * 1024, "1MiB": 1024 * 1024}
+
+app = FastAPI()
+
+
+@app.get("/health")
+async def health():
+    return {"status": "healthy"}
+
+
+@app.post("/process/{tool_name}")
+async def process(tool_name: str, request: Request):
+    body = await request.body()
+    return {"success": True, "tool": tool_name, "received": len(body)}
+
+
+def serve(bind: list) -> subprocess.Popen:
+    return subprocess.Popen(
+        [sys.executable, "-m", "uvicorn", "bench_service_transport:app", "--log-level", "warning", *bind],
+        cwd=os.path.dirname(os.path.abspath(__file__)),
+    )
+
+
+async def wait_ready(client: httpx.AsyncClient):
+    for _ in range(100):
+        try:
+            if (await client.get("/health")).status_code == 200:
+                return
+        except httpx.TransportError:
+            pass
+        await asyncio.sleep(0.1)
+    raise RuntimeError("benchmark server did not start")
+
+
+async def drive(client: httpx.AsyncClient, payload: int, requests: int) -> list:
+    body = os.urandom(payload)
+    latencies = []
+    for _ in range(requests):
+        start = time.perf_counter()
+        if payload:
+            response = await client.post("/process/pdf-merger", content=body)
+        else:
+            response = await client.get("/health")
+        latencies.append(time.perf_counter() - start)
+        response.raise_for_status()
+    return latencies
+
+
+def client_for(url: str) -> httpx.AsyncClient:
+    base_url, uds = split_endpoint(url)
+    return httpx.AsyncClient(base_url=base_url, transport=httpx.AsyncHTTPTransport(uds=uds))
+
+
+async def compare(urls: dict):
+    clients = {name: client_for(url) for name, url in urls.items()}
+    try:
+        for client in clients.values():
+            await wait_ready(client)
+        for label, payload in PAYLOADS.items():
+            requests = REQUESTS if payload < 1024 * 1024 else REQUESTS // 10
+            samples = {name: [] for name in clients}
+            for name, client in clients.items():
+                await drive(client, payload, 100)
+            for _ in range(ROUNDS):
+                for name, client in clients.items():
+                    samples[name].append(await drive(client, payload, requests))
+            report(label, requests, samples)
+    finally:
+        for client in clients.values():
+            await client.aclose()
+
+
+def report(label: str, requests: int, samples: dict):
+    print(f"{label} ({requests} requests, best of {ROUNDS} rounds)")
+    means = {}
+    for name, rounds in samples.items():
+        best = min(rounds, key=statistics.fmean)
+        ordered = sorted(best)
+        means[name] = statistics.fmean(best)
+        print(f"  {name:<4} mean {means[name] * 1e6:8.1f} us  p50 {ordered[len(ordered) // 2] * 1e6:8.1f} us  "
+              f"p99 {ordered[int(len(ordered) * 0.99)] * 1e6:8.1f} us")
+    saved = means["tcp"] - means["uds"]
+    print(f"  uds saves {saved * 1e6:.1f} us/request ({saved / means['tcp'] * 100:.1f}%)")
+
+
+def main():
+    socket_path = os.path.join(tempfile.mkdtemp(prefix="bench_uds_"), "service.sock")
+    servers = [serve(["--host", "127.0.0.1", "--port", str(PORT)]), serve(["--uds", socket_path])]
+    try:
+        asyncio.run(compare({"tcp": f"http://127.0.0.1:{PORT}", "uds": f"unix:{socket_path}"}))
+    finally:
+        for server in servers:
+            server.terminate()
+            server.wait()
+
+
+if __name__ == "__main__":
+    main()
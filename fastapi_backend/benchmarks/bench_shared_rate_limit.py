@@ -0,0 +1,86 @@
+#!/usr/bin/env python3
+"""
+Shared Rate Limit Benchmark
+Several worker processes hammer the same SQLite-backed token buckets at
+once. With a window long enough that refill is negligible, exactly
+"capacity" hits per client may be allowed in total, however the checks
+interleave; the script fails if any worker over-admits. Also reports the
+per-check cost against the in-process limiter.
+
+Usage: cd fastapi_backend && python benchmarks/bench_shared_rate_limit.py
+"""
+import multiprocessing
+import os
+import sys
+import tempfile
+import time
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+from rate_limiter import SharedTokenBucketLimiter, TokenBucketLimiter
+from shared_state import SharedState
+
+WORKERS = 8
+CLIENTS = 20
+CAPACITY = 250
+HITS_PER_CLIENT = 100  # per worker, so WORKERS * HITS_PER_CLIENT > CAPACITY
+WINDOW = 10_000_000.0
+LATENCY_CHECKS = 20_000
+
+
+def hammer(path: str, start, results):
+    limiter = SharedTokenBucketLimiter(SharedState(path), "tools", CAPACITY, WINDOW)
+    allowed = {}
+    start.wait()
+    for i in range(HITS_PER_CLIENT):
+        for client in range(CLIENTS):
+            ok, _ = limiter.hit(f"10.0.0.{client}")
+            allowed[client] = allowed.get(client, 0) + ok
+    results.put(allowed)
+
+
+def check_correctness(path: str):
+    start = multiprocessing.Event()
+    results = multiprocessing.Queue()
+    workers = [multiprocessing.Process(target=hammer, args=(path, start, results)) for _ in range(WORKERS)]
+    for worker in workers:
+        worker.start()
+    began = time.perf_counter()
+    start.set()
+    totals = {}
+    for _ in workers:
+        for client, count in results.get().items():
+            totals[client] = totals.get(client, 0) + count
+    for worker in workers:
+        worker.join()
+    elapsed = time.perf_counter() - began
+
+    hits = WORKERS * HITS_PER_CLIENT * CLIENTS
+    print(f"{WORKERS} processes, {CLIENTS} clients, {hits} checks in {elapsed:.2f}s "
+          f"({hits / elapsed:,.0f} checks/s across workers)")
+    wrong = {client: count for client, count in totals.items() if count != CAPACITY}
+    print(f"allowed per client: min {min(totals.values())} max {max(totals.values())} (capacity {CAPACITY})")
+    if wrong:
+        print(f"FAIL: {len(wrong)} clients admitted a wrong number of requests: {wrong}")
+        sys.exit(1)
+    print("OK: every client got exactly its capacity")
+
+
+def time_checks(limiter) -> float:
+    start = time.perf_counter()
+    for i in range(LATENCY_CHECKS):
+        limiter.hit(f"192.168.{i % 250}.{i % 7}")
+    return (time.perf_counter() - start) / LATENCY_CHECKS
+
+
+def main():
+    directory = tempfile.mkdtemp(prefix="bench_shared_state_")
+    check_correctness(os.path.join(directory, "correctness.db"))
+
+    local = time_checks(TokenBucketLimiter(CAPACITY, 60))
+    shared = time_checks(SharedTokenBucketLimiter(SharedState(os.path.join(directory, "latency.db")), "default", CAPACITY, 60))
+    print(f"per check: in-process {local * 1e6:.2f} us, shared sqlite {shared * 1e6:.2f} us")
+
+
+if __name__ == "__main__":
+    main()
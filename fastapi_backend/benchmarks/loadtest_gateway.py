@@ -0,0 +1,283 @@
+#!/usr/bin/env python3
+"""
+Gateway Load Test
+Starts the real gateway (main:app) against loadtest_stub services with
+configurable latency, failure rate and result size, drives concurrent
+multipart uploads to /api/tools/{tool} and reports throughput, p50/p95/p99
+latency, status counts, peak gateway RSS and gateway CPU time per request.
+
+Everything runs on this host with no processing backends, so any gateway
+change can be measured offline. Gateway settings are passed through as
+--env KEY=VALUE (rate limits are lifted by default so they do not skew the
+numbers). RSS and CPU come from /proc and are reported as n/a elsewhere.
+
+Usage: cd fastapi_backend && python benchmarks/loadtest_gateway.py \
+           --requests 2000 --concurrency 32 --latency-ms 20 --failure-rate 0.01
+"""
+import argparse
+import asyncio
+import json
+import os
+import random
+import socket
+import statistics
+import subprocess
+import sys
+import tempfile
+import time
+from typing import Dict, List, Optional
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+import httpx
+
+from config import SERVICE_NAMES
+from tool_registry import registry
+
+BACKEND_DIR = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+BENCH_DIR = os.path.dirname(os.path.abspath(__file__))
+DEFAULT_TOOLS = "pdf-merger,pdf-compressor,image-compressor,image-resizer"
+CLOCK_TICKS = os.sysconf("SC_CLK_TCK") if hasattr(os, "sysconf") else 100
+
+
+def parse_args():
+    parser = argparse.ArgumentParser(description=__doc__.split("\n")[1])
+    parser.add_argument("--requests", type=int, default=1000, help="measured requests (after warmup)")
+    parser.add_argument("--warmup", type=int, default=50)
+    parser.add_argument("--concurrency", type=int, default=16)
+    parser.add_argument("--tools", default=DEFAULT_TOOLS, help="comma-separated tools, picked round-robin")
+    parser.add_argument("--files", type=int, default=1, help="files per upload")
+    parser.add_argument("--file-kb", type=int, default=256, help="size of each uploaded file")
+    parser.add_argument("--latency-ms", type=float, default=10.0, help="stub processing delay")
+    parser.add_argument("--jitter-ms", type=float, default=0.0)
+    parser.add_argument("--failure-rate", type=float, default=0.0, help="fraction of stub 500s")
+    parser.add_argument("--payload-bytes", type=int, default=0, help="padding in each stub result")
+    parser.add_argument("--port", type=int, default=18000, help="gateway port; stubs use the next ones")
+    parser.add_argument("--env", action="append", default=[], metavar="KEY=VALUE", help="gateway setting")
+    parser.add_argument("--json", dest="json_path", help="also write the report to this file")
+    return parser.parse_args()
+
+
+def free_port(port: int) -> bool:
+    with socket.socket(socket.AF_INET, socket.SOCK_STREAM) as s:
+        return s.connect_ex(("127.0.0.1", port)) != 0
+
+
+def spawn(module: str, port: int, env: Dict[str, str], app_dir: str, log_path: str) -> subprocess.Popen:
+    if not free_port(port):
+        raise SystemExit(f"Port {port} is already in use; pick another --port")
+    log = open(log_path, "w")
+    return subprocess.Popen(
+        [sys.executable, "-m", "uvicorn", f"{module}:app", "--app-dir", app_dir,
+         "--host", "127.0.0.1", "--port", str(port), "--log-level", "warning", "--no-access-log"],
+        cwd=BACKEND_DIR, env={**os.environ, **env}, stdout=log, stderr=subprocess.STDOUT,
+    )
+
+
+async def wait_healthy(url: str, timeout: float = 30.0):
+    deadline = time.monotonic() + timeout
+    async with httpx.AsyncClient() as client:
+        while time.monotonic() < deadline:
+            try:
+                if (await client.get(url, timeout=2)).status_code == 200:
+                    return
+            except httpx.TransportError:
+                pass
+            await asyncio.sleep(0.2)
+    raise SystemExit(f"{url} did not become healthy; see the logs in {tempfile.gettempdir()}")
+
+
+def process_tree(pid: int) -> List[int]:
+    """pid and all of its descendants (uvicorn workers)"""
+    pids = [pid]
+    for current in pids:
+        try:
+            with open(f"/proc/{current}/task/{current}/children") as f:
+                pids.extend(int(child) for child in f.read().split())
+        except OSError:
+            pass
+    return pids
+
+
+def cpu_seconds(pid: int) -> Optional[float]:
+    total = 0
+    try:
+        for current in process_tree(pid):
+            with open(f"/proc/{current}/stat") as f:
+                fields = f.read().rsplit(")", 1)[1].split()
+            total += int(fields[11]) + int(fields[12])  # utime + stime
+    except (OSError, IndexError, ValueError):
+        return None
+    return total / CLOCK_TICKS
+
+
+def rss_bytes(pid: int) -> Optional[int]:
+    total = 0
+    try:
+        for current in process_tree(pid):
+            with open(f"/proc/{current}/status") as f:
+                for line in f:
+                    if line.startswith("VmRSS:"):
+                        total += int(line.split()[1]) * 1024
+                        break
+    except (OSError, ValueError):
+        return None
+    return total
+
+
+async def sample_rss(pid: int, peak: list, stop: asyncio.Event):
+    while not stop.is_set():
+        rss = rss_bytes(pid)
+        if rss is not None:
+            peak[0] = max(peak[0], rss)
+        try:
+            await asyncio.wait_for(stop.wait(), 0.1)
+        except asyncio.TimeoutError:
+            pass
+
+
+def upload_for(tool: str, files: int, size: int) -> list:
+    spec = registry.get(tool)
+    extension = ".pdf" if spec.service == "pdf" else ".png" if spec.service == "image" else ".bin"
+    header = b"%PDF-1.4\n" if extension == ".pdf" else b"\x89PNG\r\n\x1a\n" if extension == ".png" else b""
+    return [
+        ("files", (f"input-{i}{extension}", header + random.randbytes(max(0, size - len(header))), "application/octet-stream"))
+        for i in range(files)
+    ]
+
+
+async def drive(base_url: str, tools: List[str], uploads: Dict[str, list], total: int, concurrency: int):
+    """Send total uploads with at most concurrency in flight; return (latencies, statuses, elapsed)"""
+    latencies: List[float] = []
+    statuses: Dict[str, int] = {}
+    counter = iter(range(total))
+    limits = httpx.Limits(max_connections=concurrency, max_keepalive_connections=concurrency)
+
+    async with httpx.AsyncClient(base_url=base_url, limits=limits, timeout=120) as client:
+        async def worker():
+            for i in counter:
+                tool = tools[i % len(tools)]
+                start = time.perf_counter()
+                try:
+                    response = await client.post(f"/api/tools/{tool}", files=uploads[tool],
+                                                 data={"metadata": json.dumps({"loadtest": i})})
+                    key = str(response.status_code)
+                except httpx.TransportError as e:
+                    key = type(e).__name__
+                latencies.append(time.perf_counter() - start)
+                statuses[key] = statuses.get(key, 0) + 1
+
+        start = time.perf_counter()
+        await asyncio.gather(*(worker() for _ in range(concurrency)))
+        return latencies, statuses, time.perf_counter() - start
+
+
+def percentile(ordered: List[float], fraction: float) -> float:
+    return ordered[min(len(ordered) - 1, int(len(ordered) * fraction))]
+
+
+async def run(args) -> dict:
+    tools = [tool.strip() for tool in args.tools.split(",") if tool.strip()]
+    unknown = [tool for tool in tools if tool not in registry.tools]
+    if unknown:
+        raise SystemExit(f"Unknown tools: {', '.join(unknown)}")
+
+    log_dir = tempfile.mkdtemp(prefix="loadtest_")
+    stub_env = {
+        "STUB_LATENCY_MS": str(args.latency_ms),
+        "STUB_JITTER_MS": str(args.jitter_ms),
+        "STUB_FAILURE_RATE": str(args.failure_rate),
+        "STUB_PAYLOAD_BYTES": str(args.payload_bytes),
+    }
+    endpoints = {service: args.port + 1 + i for i, service in enumerate(SERVICE_NAMES)}
+    gateway_env = {
+        "SERVICE_ENDPOINTS": ",".join(f"{s}=http://127.0.0.1:{port}" for s, port in endpoints.items()),
+        "RATE_LIMIT_TOOLS": "1000000000/1",
+        "RATE_LIMIT_DEFAULT": "1000000000/1",
+        "TRACE_EXPORT_FILE": "",
+    }
+    for item in args.env:
+        key, _, value = item.partition("=")
+        gateway_env[key.strip()] = value
+
+    processes = []
+    try:
+        for service, port in endpoints.items():
+            processes.append(spawn("loadtest_stub", port, {**stub_env, "STUB_SERVICE": service},
+                                   BENCH_DIR, os.path.join(log_dir, f"stub-{service}.log")))
+        gateway = spawn("main", args.port, gateway_env, BACKEND_DIR, os.path.join(log_dir, "gateway.log"))
+        processes.append(gateway)
+
+        for port in endpoints.values():
+            await wait_healthy(f"http://127.0.0.1:{port}/health")
+        base_url = f"http://127.0.0.1:{args.port}"
+        await wait_healthy(f"{base_url}/api/gateway/pool")
+
+        uploads = {tool: upload_for(tool, args.files, args.file_kb * 1024) for tool in tools}
+        await drive(base_url, tools, uploads, args.warmup, args.concurrency)
+
+        peak = [rss_bytes(gateway.pid) or 0]
+        stop = asyncio.Event()
+        sampler = asyncio.create_task(sample_rss(gateway.pid, peak, stop))
+        cpu_before = cpu_seconds(gateway.pid)
+        latencies, statuses, elapsed = await drive(base_url, tools, uploads, args.requests, args.concurrency)
+        cpu_after = cpu_seconds(gateway.pid)
+        stop.set()
+        await sampler
+    finally:
+        for process in processes:
+            process.terminate()
+        for process in processes:
+            try:
+                process.wait(timeout=10)
+            except subprocess.TimeoutExpired:
+                process.kill()
+
+    ordered = sorted(latencies)
+    cpu = cpu_after - cpu_before if cpu_before is not None and cpu_after is not None else None
+    return {
+        "config": {key: value for key, value in vars(args).items() if key != "json_path"},
+        "requests": len(latencies),
+        "elapsed_s": round(elapsed, 3),
+        "throughput_rps": round(len(latencies) / elapsed, 1),
+        "latency_ms": {
+            "mean": round(statistics.fmean(ordered) * 1000, 2),
+            "p50": round(percentile(ordered, 0.50) * 1000, 2),
+            "p95": round(percentile(ordered, 0.95) * 1000, 2),
+            "p99": round(percentile(ordered, 0.99) * 1000, 2),
+            "max": round(ordered[-1] * 1000, 2),
+        },
+        "statuses": statuses,
+        "gateway_peak_rss_mb": round(peak[0] / 1024 / 1024, 1) if peak[0] else None,
+        "gateway_cpu_ms_per_request": round(cpu / len(latencies) * 1000, 3) if cpu is not None else None,
+        "logs": log_dir,
+    }
+
+
+def print_report(report: dict):
+    config = report["config"]
+    latency = report["latency_ms"]
+    print(f"{report['requests']} requests, concurrency {config['concurrency']}, "
+          f"{config['files']} x {config['file_kb']} KiB per upload, stub latency {config['latency_ms']} ms "
+          f"(+/-{config['jitter_ms']}), failure rate {config['failure_rate']}")
+    print(f"throughput  {report['throughput_rps']:,.1f} req/s over {report['elapsed_s']} s")
+    print(f"latency     mean {latency['mean']} ms  p50 {latency['p50']} ms  p95 {latency['p95']} ms  "
+          f"p99 {latency['p99']} ms  max {latency['max']} ms")
+    print(f"statuses    {', '.join(f'{k}: {v}' for k, v in sorted(report['statuses'].items()))}")
+    rss, cpu = report["gateway_peak_rss_mb"], report["gateway_cpu_ms_per_request"]
+    print(f"gateway     peak RSS {f'{rss} MiB' if rss is not None else 'n/a'}, "
+          f"CPU {f'{cpu} ms/request' if cpu is not None else 'n/a'}")
+    print(f"logs        {report['logs']}")
+
+
+def main():
+    args = parse_args()
+    report = asyncio.run(run(args))
+    print_report(report)
+    if args.json_path:
+        with open(args.json_path, "w") as f:
+            json.dump(report, f, indent=2)
+
+
+if __name__ == "__main__":
+    main()
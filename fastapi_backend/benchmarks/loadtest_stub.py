@@ -0,0 +1,73 @@
+"""
+Load-Test Stub Service
+Stands in for a processing microservice: same /health and /process/{tool}
+API, no real work. Behaviour comes from the environment so the harness can
+start one per service:
+
+  STUB_SERVICE        service name reported in responses (default "stub")
+  STUB_LATENCY_MS     mean processing delay per request (default 0)
+  STUB_JITTER_MS      +/- uniform jitter around the mean (default 0)
+  STUB_FAILURE_RATE   fraction of requests answered with 500 (default 0)
+  STUB_PAYLOAD_BYTES  padding added to each JSON result (default 0)
+
+Handed-off inputs (X-Input-Handoff) are opened like the real services do.
+
+Usage: uvicorn loadtest_stub:app --app-dir fastapi_backend/benchmarks --port 8001
+"""
+import asyncio
+import os
+import random
+import sys
+from typing import List, Optional
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+from fastapi import FastAPI, File, Form, HTTPException, Request, UploadFile
+
+from artifact_store import output_stamp
+from upload_handoff import HANDOFF_HEADER, open_handoff
+
+SERVICE = os.getenv("STUB_SERVICE", "stub")
+LATENCY = float(os.getenv("STUB_LATENCY_MS", "0")) / 1000
+JITTER = float(os.getenv("STUB_JITTER_MS", "0")) / 1000
+FAILURE_RATE = float(os.getenv("STUB_FAILURE_RATE", "0"))
+PADDING = "x" * int(os.getenv("STUB_PAYLOAD_BYTES", "0"))
+
+app = FastAPI(title=f"Load-test stub ({SERVICE})")
+
+
+@app.get("/health")
+async def health():
+    return {"status": "healthy", "service": SERVICE}
+
+
+@app.post("/process/{tool_name}")
+async def process(
+    tool_name: str,
+    request: Request,
+    files: List[UploadFile] = File([]),
+    metadata: Optional[str] = Form(None)
+):
+    handoff = request.headers.get(HANDOFF_HEADER)
+    if handoff and not files:
+        files = open_handoff(handoff)
+    sizes = [file.size for file in files]
+    for file in files:
+        file.file.close()
+
+    delay = LATENCY + random.uniform(-JITTER, JITTER)
+    if delay > 0:
+        await asyncio.sleep(delay)
+    if FAILURE_RATE and random.random() < FAILURE_RATE:
+        raise HTTPException(status_code=500, detail="Injected stub failure")
+
+    filename = f"loadtest-{tool_name}-{output_stamp()}.bin"
+    return {
+        "success": True,
+        "message": f"{tool_name} completed by {SERVICE} stub",
+        "downloadUrl": f"/static/{filename}",
+        "filename": filename,
+        "fileSize": sum(sizes),
+        "toolId": tool_name,
+        "metadata": {"service": SERVICE, "inputs": sizes, "padding": PADDING},
+    }
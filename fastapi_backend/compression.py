@@ -0,0 +1,233 @@
+"""
+Response Compression
+Negotiated gzip / brotli compression for compressible responses and static
+files that serve precompressed .br / .gz siblings when the build produced them
+"""
+import os
+import zlib
+from typing import Optional
+
+from starlette.datastructures import Headers, MutableHeaders
+from starlette.responses import FileResponse, Response
+from starlette.staticfiles import StaticFiles
+from starlette.types import ASGIApp, Message, Receive, Scope, Send
+
+try:
+    import brotli
+except ImportError:  # brotli is optional; gzip is always available
+    brotli = None
+
+COMPRESSIBLE_TYPES = {
+    "application/json",
+    "application/javascript",
+    "application/x-javascript",
+    "application/xml",
+    "application/manifest+json",
+    "application/wasm",
+    "image/svg+xml",
+}
+# Streams that must reach the client as they are produced
+UNBUFFERED_TYPES = {"text/event-stream"}
+IMMUTABLE_CACHE_CONTROL = "public, max-age=31536000, immutable"
+
+
+def is_compressible(content_type: str) -> bool:
+    media_type = content_type.split(";", 1)[0].strip().lower()
+    if not media_type or media_type in UNBUFFERED_TYPES:
+        return False
+    return (
+        media_type.startswith("text/")
+        or media_type in COMPRESSIBLE_TYPES
+        or media_type.endswith("+json")
+        or media_type.endswith("+xml")
+    )
+
+
+def accepted_encodings(accept_encoding: str) -> dict:
+    """Map of coding -> q-value from an Accept-Encoding header"""
+    accepted = {}
+    for item in accept_encoding.lower().split(","):
+        coding, _, params = item.strip().partition(";")
+        if not coding:
+            continue
+        q = 1.0
+        params = params.strip()
+        if params.startswith("q="):
+            try:
+                q = float(params[2:])
+            except ValueError:
+                q = 0.0
+        accepted[coding.strip()] = q
+    return accepted
+
+
+def negotiate_encoding(accept_encoding: str, brotli_available: bool = brotli is not None) -> Optional[str]:
+    """Preferred content coding the client accepts: br, then gzip"""
+    accepted = accepted_encodings(accept_encoding)
+    if brotli_available and accepted.get("br", 0) > 0:
+        return "br"
+    if accepted.get("gzip", 0) > 0:
+        return "gzip"
+    return None
+
+
+class _Compressor:
+    def __init__(self, encoding: str, gzip_level: int, brotli_quality: int):
+        if encoding == "br":
+            self._brotli = brotli.Compressor(quality=brotli_quality)
+            self._zlib = None
+        else:
+            self._brotli = None
+            self._zlib = zlib.compressobj(gzip_level, zlib.DEFLATED, 16 + zlib.MAX_WBITS)
+
+    def compress(self, data: bytes) -> bytes:
+        if self._brotli is not None:
+            return self._brotli.process(data)
+        return self._zlib.compress(data)
+
+    def flush(self) -> bytes:
+        if self._brotli is not None:
+            return self._brotli.flush()
+        return self._zlib.flush(zlib.Z_SYNC_FLUSH)
+
+    def finish(self) -> bytes:
+        if self._brotli is not None:
+            return self._brotli.finish()
+        return self._zlib.flush(zlib.Z_FINISH)
+
+
+class CompressionMiddleware:
+    """Pure ASGI middleware compressing eligible responses above a size threshold
+
+    Skips bodies that already carry a Content-Encoding, partial content,
+    non-compressible types (PDF, JPEG, MP4, ZIP, ...) and event streams.
+    Compressed responses drop Accept-Ranges and get a weak ETag, since the
+    bytes on the wire no longer match the stored representation.
+    """
+
+    def __init__(self, app: ASGIApp, minimum_size: int = 1024, gzip_level: int = 6, brotli_quality: int = 4):
+        self.app = app
+        self.minimum_size = minimum_size
+        self.gzip_level = gzip_level
+        self.brotli_quality = brotli_quality
+
+    async def __call__(self, scope: Scope, receive: Receive, send: Send):
+        if scope["type"] != "http":
+            await self.app(scope, receive, send)
+            return
+        encoding = negotiate_encoding(Headers(scope=scope).get("accept-encoding", ""))
+        if encoding is None:
+            await self.app(scope, receive, send)
+            return
+
+        start_message: Optional[Message] = None
+        compressor: Optional[_Compressor] = None
+        passthrough = False
+
+        async def send_wrapper(message: Message):
+            nonlocal start_message, compressor, passthrough
+            if message["type"] == "http.response.start":
+                start_message = message
+                headers = Headers(raw=message["headers"])
+                passthrough = (
+                    message["status"] in (204, 206, 304)
+                    or "content-encoding" in headers
+                    or "content-range" in headers
+                    or not is_compressible(headers.get("content-type", ""))
+                )
+                if passthrough:
+                    await send(message)
+                return
+            if message["type"] != "http.response.body" or passthrough:
+                if not passthrough:
+                    # e.g. http.response.pathsend: leave the response untouched
+                    passthrough = True
+                    await send(start_message)
+                await send(message)
+                return
+
+            body = message.get("body", b"")
+            more_body = message.get("more_body", False)
+            if compressor is None:
+                if not more_body and len(body) < self.minimum_size:
+                    passthrough = True
+                    await send(start_message)
+                    await send(message)
+                    return
+                compressor = _Compressor(encoding, self.gzip_level, self.brotli_quality)
+                headers = MutableHeaders(raw=start_message["headers"])
+                headers["Content-Encoding"] = encoding
+                headers.add_vary_header("Accept-Encoding")
+                if "accept-ranges" in headers:
+                    del headers["accept-ranges"]
+                etag = headers.get("etag")
+                if etag and not etag.startswith("W/"):
+                    headers["etag"] = "W/" + etag
+                if more_body:
+                    if "content-length" in headers:
+                        del headers["content-length"]
+                    await send(start_message)
+                else:
+                    compressed = compressor.compress(body) + compressor.finish()
+                    headers["Content-Length"] = str(len(compressed))
+                    await send(start_message)
+                    await send({"type": "http.response.body", "body": compressed})
+                    return
+
+            if more_body:
+                chunk = compressor.compress(body) + compressor.flush()
+                if chunk:
+                    await send({"type": "http.response.body", "body": chunk, "more_body": True})
+            else:
+                await send({"type": "http.response.body", "body": compressor.compress(body) + compressor.finish()})
+
+        await self.app(scope, receive, send_wrapper)
+
+
+class PrecompressedStaticFiles(StaticFiles):
+    """StaticFiles that prefers a .br / .gz sibling the client accepts
+
+    With immutable=True (content-hashed build assets) responses are cached
+    for a year.
+    """
+
+    def __init__(self, *args, immutable: bool = False, **kwargs):
+        super().__init__(*args, **kwargs)
+        self.immutable = immutable
+
+    async def get_response(self, path: str, scope: Scope) -> Response:
+        response = await super().get_response(path, scope)
+        if isinstance(response, FileResponse) and response.status_code == 200:
+            variant = self._precompressed_variant(path, scope, response)
+            if variant is not None:
+                response = variant
+        if self.immutable and response.status_code in (200, 304):
+            response.headers["Cache-Control"] = IMMUTABLE_CACHE_CONTROL
+        return response
+
+    def _precompressed_variant(self, path: str, scope: Scope, original: FileResponse) -> Optional[Response]:
+        request_headers = Headers(scope=scope)
+        accepted = accepted_encodings(request_headers.get("accept-encoding", ""))
+        full_path, _ = self.lookup_path(path)
+        if not full_path:
+            return None
+        for encoding, suffix in (("br", ".br"), ("gzip", ".gz")):
+            if accepted.get(encoding, 0) <= 0:
+                continue
+            try:
+                stat_result = os.stat(full_path + suffix)
+            except OSError:
+                continue
+            response = FileResponse(
+                full_path + suffix,
+                stat_result=stat_result,
+                media_type=original.media_type,
+                headers={"Content-Encoding": encoding, "Vary": "Accept-Encoding"},
+            )
+            if self.is_not_modified(response.headers, request_headers):
+                return Response(status_code=304, headers={
+                    "ETag": response.headers["etag"],
+                    "Vary": "Accept-Encoding",
+                })
+            return response
+        return None
@@ -5,9 +5,14 @@ Environment-based configuration for FastAPI microservices
 """
 
 import os
+import tempfile
 from dotenv import load_dotenv
-from pydantic import BaseSettings
-from typing import Optional
+from typing import Dict, List, Optional, Tuple
+
+try:
+    from pydantic_settings import BaseSettings
+except ImportError:  # pydantic v1
+    from pydantic import BaseSettings
 
 # Load environment variables from .env file
 load_dotenv()
@@ -26,13 +31,29 @@ class Settings(BaseSettings):
     MEDIA_SERVICE_PORT: int = int(os.getenv("MEDIA_SERVICE_PORT", "8003"))
     GOVERNMENT_SERVICE_PORT: int = int(os.getenv("GOVERNMENT_SERVICE_PORT", "8004"))
     DEVELOPER_SERVICE_PORT: int = int(os.getenv("DEVELOPER_SERVICE_PORT", "8005"))
+    # Replicas per service ("4" for all, or "pdf=4,image=4"); replica i of a
+    # service listens on its port + i * REPLICA_PORT_STRIDE
+    SERVICE_REPLICAS: str = os.getenv("SERVICE_REPLICAS", "1")
+    REPLICA_PORT_STRIDE: int = int(os.getenv("REPLICA_PORT_STRIDE", "100"))
+    # Explicit replica URLs override the above: "pdf=http://a:8001|http://b:8001"
+    # (or "pdf=unix:/run/suntyn/pdf-0.sock" for a Unix domain socket)
+    SERVICE_ENDPOINTS: str = os.getenv("SERVICE_ENDPOINTS", "")
+    # "uds" runs every replica on a Unix socket in SERVICE_SOCKET_DIR instead of a localhost port
+    SERVICE_TRANSPORT: str = os.getenv("SERVICE_TRANSPORT", "tcp").lower()
+    SERVICE_SOCKET_DIR: str = os.getenv("SERVICE_SOCKET_DIR", os.path.join(tempfile.gettempdir(), "suntyn_sockets"))
+    LOAD_BALANCER_STRATEGY: str = os.getenv("LOAD_BALANCER_STRATEGY", "least_outstanding")
     
     # File Processing
     UPLOAD_DIR: str = os.getenv("UPLOAD_DIR", "./uploads")
     PROCESSED_DIR: str = os.getenv("PROCESSED_DIR", "./static")
     MAX_FILE_SIZE: str = os.getenv("MAX_FILE_SIZE", "50MB")
     TEMP_FILE_CLEANUP_MINUTES: int = int(os.getenv("TEMP_FILE_CLEANUP_MINUTES", "30"))
-    PROCESSED_FILE_CLEANUP_SECONDS: int = int(os.getenv("PROCESSED_FILE_CLEANUP_SECONDS", "30"))
+    # Outputs not downloaded for this long are deleted by the artifact store
+    PROCESSED_FILE_CLEANUP_SECONDS: int = int(os.getenv("PROCESSED_FILE_CLEANUP_SECONDS", "3600"))
+    # Hash-sharded output store shared by the gateway and services
+    ARTIFACT_DIR: str = os.getenv("ARTIFACT_DIR", os.path.join(os.path.dirname(os.path.dirname(os.path.abspath(__file__))), "static"))
+    ARTIFACT_MAX_MB: int = int(os.getenv("ARTIFACT_MAX_MB", "2048"))
+    ARTIFACT_SWEEP_SECONDS: float = float(os.getenv("ARTIFACT_SWEEP_SECONDS", "60"))
     
     # Security
     SECRET_KEY: str = os.getenv("SECRET_KEY", "your-secret-key-here")
@@ -42,7 +63,111 @@ class Settings(BaseSettings):
     ENABLE_FAST_MODE: bool = os.getenv("ENABLE_FAST_MODE", "true").lower() == "true"
     CACHE_STATIC_FILES: bool = os.getenv("CACHE_STATIC_FILES", "true").lower() == "true"
     ENABLE_COMPRESSION: bool = os.getenv("ENABLE_COMPRESSION", "true").lower() == "true"
-    
+    COMPRESSION_MIN_BYTES: int = int(os.getenv("COMPRESSION_MIN_BYTES", "1024"))
+    # Content-addressed cache of tool outputs (0 entries disables it)
+    RESULT_CACHE_MAX_ENTRIES: int = int(os.getenv("RESULT_CACHE_MAX_ENTRIES", "1024"))
+    RESULT_CACHE_MAX_MB: int = int(os.getenv("RESULT_CACHE_MAX_MB", "1024"))
+    RESULT_CACHE_TTL_SECONDS: int = int(os.getenv("RESULT_CACHE_TTL_SECONDS", "3600"))
+    # Worker processes per PDF service replica for PyPDF2 / ReportLab work
+    # (0 runs it on the event loop); jobs past the time or memory limit are killed.
+    # The gateway waits PROXY_TIMEOUT_MARGIN_SECONDS longer than the job limit
+    # so an overrun comes back as the service's 504, not a dropped connection
+    PDF_POOL_WORKERS: int = int(os.getenv("PDF_POOL_WORKERS", str(os.cpu_count() or 2)))
+    PDF_JOB_TIMEOUT_SECONDS: float = float(os.getenv("PDF_JOB_TIMEOUT_SECONDS", "45"))
+    PROXY_TIMEOUT_MARGIN_SECONDS: float = float(os.getenv("PROXY_TIMEOUT_MARGIN_SECONDS", "15"))
+    PDF_JOB_MAX_MEMORY_MB: int = int(os.getenv("PDF_JOB_MAX_MEMORY_MB", "1024"))
+    GATEWAY_STREAM_UPLOADS: bool = os.getenv("GATEWAY_STREAM_UPLOADS", "true").lower() == "true"
+    # Same-host upload handoff: the gateway spools each upload once into a shared
+    # directory (tmpfs when available) and services open it in place; "auto"
+    # enables it for services whose replicas all listen on localhost
+    UPLOAD_HANDOFF: str = os.getenv("UPLOAD_HANDOFF", "auto").lower()
+    UPLOAD_HANDOFF_DIR: str = os.getenv(
+        "UPLOAD_HANDOFF_DIR",
+        "/dev/shm/suntyn_handoff" if os.path.isdir("/dev/shm") else os.path.join(tempfile.gettempdir(), "suntyn_handoff")
+    )
+    UPLOAD_HANDOFF_TTL_SECONDS: float = float(os.getenv("UPLOAD_HANDOFF_TTL_SECONDS", "3600"))
+    # HMAC key for the handoff header; empty generates one in UPLOAD_HANDOFF_DIR,
+    # which every gateway and service process on the host shares
+    UPLOAD_HANDOFF_SECRET: str = os.getenv("UPLOAD_HANDOFF_SECRET", "")
+    # Downloads wait this long for an output a service announced but not yet wrote
+    ARTIFACT_WAIT_SECONDS: float = float(os.getenv("ARTIFACT_WAIT_SECONDS", "5"))
+    # ...re-checking the disk this often in case the file lands without a notification
+    ARTIFACT_WAIT_POLL_MS: int = int(os.getenv("ARTIFACT_WAIT_POLL_MS", "50"))
+    ARTIFACT_INDEX_MAX_ENTRIES: int = int(os.getenv("ARTIFACT_INDEX_MAX_ENTRIES", "100000"))
+
+    # Asynchronous job API (/api/jobs): bounded worker pool behind a queue
+    JOB_WORKERS: int = int(os.getenv("JOB_WORKERS", "4"))
+    JOB_QUEUE_MAX: int = int(os.getenv("JOB_QUEUE_MAX", "100"))
+    JOB_RESULT_TTL_SECONDS: int = int(os.getenv("JOB_RESULT_TTL_SECONDS", "3600"))
+    JOB_TIMEOUT_SECONDS: float = float(os.getenv("JOB_TIMEOUT_SECONDS", "300"))
+    JOB_SPOOL_DIR: str = os.getenv("JOB_SPOOL_DIR", tempfile.gettempdir())
+
+    # Gateway HTTP Connection Pool (one client per microservice)
+    HTTP_POOL_MAX_CONNECTIONS: int = int(os.getenv("HTTP_POOL_MAX_CONNECTIONS", "100"))
+    HTTP_POOL_MAX_KEEPALIVE: int = int(os.getenv("HTTP_POOL_MAX_KEEPALIVE", "20"))
+    HTTP_POOL_KEEPALIVE_EXPIRY: float = float(os.getenv("HTTP_POOL_KEEPALIVE_EXPIRY", "30"))
+    HTTP_POOL_TIMEOUT: float = float(os.getenv("HTTP_POOL_TIMEOUT", "60"))
+    HTTP_POOL_CONNECT_TIMEOUT: float = float(os.getenv("HTTP_POOL_CONNECT_TIMEOUT", "5"))
+    # Per-host overrides, e.g. "pdf=40,image=40"
+    HTTP_POOL_HOST_LIMITS: str = os.getenv("HTTP_POOL_HOST_LIMITS", "")
+
+    # Rate Limiting ("requests/seconds" token buckets per client IP)
+    RATE_LIMIT_TOOLS: str = os.getenv("RATE_LIMIT_TOOLS", "100/900")
+    RATE_LIMIT_ASSETS: str = os.getenv("RATE_LIMIT_ASSETS", "1200/60")
+    RATE_LIMIT_DEFAULT: str = os.getenv("RATE_LIMIT_DEFAULT", "300/900")
+    RATE_LIMIT_MAX_CLIENTS: int = int(os.getenv("RATE_LIMIT_MAX_CLIENTS", "100000"))
+
+    # Gateway worker processes; rate-limit buckets and job records then move to
+    # a SQLite (WAL) file shared by every worker on the host
+    GATEWAY_WORKERS: int = int(os.getenv("GATEWAY_WORKERS", "1"))
+    GATEWAY_SHARED_STATE: bool = os.getenv(
+        "GATEWAY_SHARED_STATE", "true" if GATEWAY_WORKERS > 1 else "false"
+    ).lower() == "true"
+    GATEWAY_STATE_FILE: str = os.getenv("GATEWAY_STATE_FILE", os.path.join(tempfile.gettempdir(), "suntyn_gateway_state.db"))
+    # Longest a worker's event loop waits on another worker's write lock before giving up
+    GATEWAY_STATE_BUSY_TIMEOUT_MS: int = int(os.getenv("GATEWAY_STATE_BUSY_TIMEOUT_MS", "20"))
+
+    # Background Health Probes and Circuit Breaker
+    HEALTH_PROBE_INTERVAL: float = float(os.getenv("HEALTH_PROBE_INTERVAL", "5"))
+    HEALTH_PROBE_TIMEOUT: float = float(os.getenv("HEALTH_PROBE_TIMEOUT", "2"))
+    CIRCUIT_FAILURE_THRESHOLD: int = int(os.getenv("CIRCUIT_FAILURE_THRESHOLD", "3"))
+    CIRCUIT_RECOVERY_SECONDS: float = float(os.getenv("CIRCUIT_RECOVERY_SECONDS", "15"))
+    HEALTH_CHECK_DEADLINE: float = float(os.getenv("HEALTH_CHECK_DEADLINE", "3"))
+
+    # Retries: capped per service as a share of recent traffic; retries refer to
+    # inputs the service staged instead of re-uploading them
+    RETRY_BUDGET_RATIO: float = float(os.getenv("RETRY_BUDGET_RATIO", "0.1"))
+    RETRY_BUDGET_MIN_RETRIES: int = int(os.getenv("RETRY_BUDGET_MIN_RETRIES", "3"))
+    RETRY_BUDGET_WINDOW_SECONDS: int = int(os.getenv("RETRY_BUDGET_WINDOW_SECONDS", "10"))
+    INPUT_STAGE_DIR: str = os.getenv("INPUT_STAGE_DIR", os.path.join(tempfile.gettempdir(), "suntyn_staged_inputs"))
+    INPUT_STAGE_TTL_SECONDS: float = float(os.getenv("INPUT_STAGE_TTL_SECONDS", "600"))
+    # Hedged requests for light tools with small inputs (off by default)
+    HEDGE_ENABLED: bool = os.getenv("HEDGE_ENABLED", "false").lower() == "true"
+    HEDGE_DELAY_MS: float = float(os.getenv("HEDGE_DELAY_MS", "250"))
+    HEDGE_MAX_KB: int = int(os.getenv("HEDGE_MAX_KB", "512"))
+
+    # Admission control: concurrent requests per service / tool ("image=8",
+    # "bg-remover=4"), with a short FIFO wait queue bounded in size and time.
+    # Limits, queue size and reserved slots are for the whole host; each of
+    # GATEWAY_WORKERS workers enforces its share (config.per_worker)
+    ADMISSION_DEFAULT_LIMIT: int = int(os.getenv("ADMISSION_DEFAULT_LIMIT", "16"))
+    ADMISSION_SERVICE_LIMITS: str = os.getenv("ADMISSION_SERVICE_LIMITS", "")
+    ADMISSION_TOOL_LIMITS: str = os.getenv("ADMISSION_TOOL_LIMITS", "")
+    ADMISSION_QUEUE_SIZE: int = int(os.getenv("ADMISSION_QUEUE_SIZE", "32"))
+    ADMISSION_QUEUE_TIMEOUT: float = float(os.getenv("ADMISSION_QUEUE_TIMEOUT", "5"))
+    # Cost lanes: light tools / small uploads go fast, heavy tools / big uploads
+    # go bulk; freed slots are shared between waiting lanes by weight
+    ADMISSION_LANE_WEIGHTS: str = os.getenv("ADMISSION_LANE_WEIGHTS", "fast=8,standard=3,bulk=1")
+    ADMISSION_FAST_LANE_RESERVED: int = int(os.getenv("ADMISSION_FAST_LANE_RESERVED", "2"))
+    ADMISSION_FAST_LANE_MAX_KB: int = int(os.getenv("ADMISSION_FAST_LANE_MAX_KB", "256"))
+    ADMISSION_BULK_LANE_MIN_MB: int = int(os.getenv("ADMISSION_BULK_LANE_MIN_MB", "20"))
+
+    # Request tracing: X-Request-ID propagation and Server-Timing spans; traces
+    # are appended as JSON lines to TRACE_EXPORT_FILE when it is set
+    TRACE_ENABLED: bool = os.getenv("TRACE_ENABLED", "true").lower() == "true"
+    TRACE_EXPORT_FILE: str = os.getenv("TRACE_EXPORT_FILE", "")
+    TRACE_EXPORT_MAX_MB: int = int(os.getenv("TRACE_EXPORT_MAX_MB", "50"))
+
     # Development
     DEBUG: bool = os.getenv("DEBUG", "true").lower() == "true"
     LOG_LEVEL: str = os.getenv("LOG_LEVEL", "info")
@@ -58,24 +183,59 @@ class Settings(BaseSettings):
     class Config:
         env_file = ".env"
         case_sensitive = True
+        extra = "ignore"
 
 # Create settings instance
 settings = Settings()
 
-def get_service_url(service_name: str) -> str:
-    """Get URL for microservice"""
-    port_mapping = {
+SERVICE_NAMES = ("pdf", "image", "media", "government", "developer")
+
+def get_service_port(service_name: str) -> int:
+    """Base port of a microservice (replica 0); KeyError for unknown services"""
+    return {
         "pdf": settings.PDF_SERVICE_PORT,
         "image": settings.IMAGE_SERVICE_PORT,
         "media": settings.MEDIA_SERVICE_PORT,
         "government": settings.GOVERNMENT_SERVICE_PORT,
         "developer": settings.DEVELOPER_SERVICE_PORT
-    }
-    
-    port = port_mapping.get(service_name.lower())
-    if port:
-        return f"http://{settings.HOST}:{port}"
-    return f"http://{settings.HOST}:5001"
+    }[service_name.lower()]
+
+def get_service_host() -> str:
+    """Host to reach the services on: settings.HOST, or localhost when that is a wildcard bind address"""
+    return "localhost" if settings.HOST in ("0.0.0.0", "::", "") else settings.HOST
+
+def get_service_url(service_name: str) -> str:
+    """Get URL for microservice (its first replica; the gateway itself for unknown services)"""
+    if service_name.lower() not in SERVICE_NAMES:
+        return f"http://{get_service_host()}:{settings.PORT}"
+    return get_service_urls(service_name)[0]
+
+def get_replica_count(service_name: str) -> int:
+    """Number of replicas configured for a service via SERVICE_REPLICAS"""
+    value = settings.SERVICE_REPLICAS.strip()
+    if value.isdigit():
+        return max(1, int(value))
+    return max(1, int(parse_service_map(value).get(service_name.lower(), "1")))
+
+def get_replica_ports(service_name: str) -> List[int]:
+    port = get_service_port(service_name)
+    return [port + i * settings.REPLICA_PORT_STRIDE for i in range(get_replica_count(service_name))]
+
+def get_replica_sockets(service_name: str) -> List[str]:
+    """Unix socket path of every replica of a service (SERVICE_TRANSPORT=uds)"""
+    return [
+        os.path.join(settings.SERVICE_SOCKET_DIR, f"{service_name.lower()}-{i}.sock")
+        for i in range(get_replica_count(service_name))
+    ]
+
+def get_service_urls(service_name: str) -> List[str]:
+    """Base URLs of every replica of a microservice ("unix:<path>" for sockets)"""
+    endpoints = parse_service_map(settings.SERVICE_ENDPOINTS).get(service_name.lower())
+    if endpoints:
+        return [url.strip() for url in endpoints.split("|") if url.strip()]
+    if settings.SERVICE_TRANSPORT == "uds":
+        return [f"unix:{path}" for path in get_replica_sockets(service_name)]
+    return [f"http://{get_service_host()}:{port}" for port in get_replica_ports(service_name)]
 
 def get_max_file_size_bytes() -> int:
     """Convert MAX_FILE_SIZE string to bytes"""
@@ -90,6 +250,42 @@ def get_max_file_size_bytes() -> int:
     else:
         return int(size_str)
 
+def parse_service_map(value: str) -> Dict[str, str]:
+    """Parse "pdf=40,image=40" style settings into a dict"""
+    mapping = {}
+    for item in value.split(","):
+        if "=" not in item:
+            continue
+        key, raw = item.split("=", 1)
+        if key.strip() and raw.strip():
+            mapping[key.strip().lower()] = raw.strip()
+    return mapping
+
+def get_pool_host_limits() -> Dict[str, int]:
+    """Per-service max connection overrides for the gateway pool"""
+    return {service: int(limit) for service, limit in parse_service_map(settings.HTTP_POOL_HOST_LIMITS).items()}
+
+def per_worker(limit: int) -> int:
+    """One gateway worker's share of a host-wide limit (at least 1 when the limit is set)"""
+    if limit <= 0:
+        return limit
+    return max(1, limit // max(1, settings.GATEWAY_WORKERS))
+
+def get_proxy_timeout(service_name: str) -> float:
+    """Gateway read timeout for a tool request: past the service's own job limit, never below HTTP_POOL_TIMEOUT"""
+    if service_name == "pdf" and settings.PDF_POOL_WORKERS > 0:
+        return max(settings.HTTP_POOL_TIMEOUT, settings.PDF_JOB_TIMEOUT_SECONDS + settings.PROXY_TIMEOUT_MARGIN_SECONDS)
+    return settings.HTTP_POOL_TIMEOUT
+
+def get_admission_limits() -> Tuple[Dict[str, int], Dict[str, int]]:
+    """Per-service and per-tool concurrency limits for admission control, per gateway worker"""
+    services = {service: per_worker(int(limit)) for service, limit in parse_service_map(settings.ADMISSION_SERVICE_LIMITS).items()}
+    tools = {tool: per_worker(int(limit)) for tool, limit in parse_service_map(settings.ADMISSION_TOOL_LIMITS).items()}
+    return services, tools
+
+def get_lane_weights() -> Dict[str, int]:
+    return {lane: int(weight) for lane, weight in parse_service_map(settings.ADMISSION_LANE_WEIGHTS).items()}
+
 # Log configuration on import
 if settings.DEBUG:
     print("🔧 FastAPI Configuration Loaded")
@@ -0,0 +1,161 @@
+"""
+Conditional and Range Downloads
+Strong ETags, If-None-Match / If-Range handling and single or multi-range
+206 responses for processed outputs, which never change once written
+"""
+import hashlib
+import os
+import secrets
+from email.utils import formatdate
+from typing import Dict, Iterator, List, Optional, Tuple
+
+from fastapi import Request
+from fastapi.responses import FileResponse, Response, StreamingResponse
+
+CHUNK_SIZE = 256 * 1024
+MAX_RANGES = 16
+IMMUTABLE_CACHE_CONTROL = "public, max-age=31536000, immutable"
+
+
+def strong_etag(st: os.stat_result) -> str:
+    """Strong validator from inode, size and nanosecond mtime
+
+    Output names carry artifact_store.output_stamp(), so a name is written
+    once and these three identify the exact bytes without hashing the file
+    on every request. That is also what makes immutable caching safe.
+    """
+    base = f"{st.st_ino}-{st.st_size}-{st.st_mtime_ns}"
+    return '"' + hashlib.sha256(base.encode()).hexdigest()[:32] + '"'
+
+
+def etag_matches(header: str, etag: str) -> bool:
+    """If-None-Match uses weak comparison: W/ prefixes are ignored"""
+    if header.strip() == "*":
+        return True
+    bare = etag[2:] if etag.startswith("W/") else etag
+    for candidate in header.split(","):
+        candidate = candidate.strip()
+        if candidate.startswith("W/"):
+            candidate = candidate[2:]
+        if candidate == bare:
+            return True
+    return False
+
+
+def parse_range(header: str, size: int) -> Optional[List[Tuple[int, int]]]:
+    """Parse a bytes Range header into sorted, merged inclusive ranges
+
+    Returns None when the header is malformed or uses another unit (the
+    caller then serves the whole file) and [] when nothing is satisfiable.
+    """
+    unit, _, spec = header.partition("=")
+    if unit.strip().lower() != "bytes" or not spec:
+        return None
+    ranges = []
+    for part in spec.split(","):
+        start_s, sep, end_s = part.strip().partition("-")
+        if not sep:
+            return None
+        try:
+            if start_s == "":
+                length = int(end_s)
+                if length <= 0:
+                    continue
+                start, end = max(0, size - length), size - 1
+            else:
+                start = int(start_s)
+                end = int(end_s) if end_s else size - 1
+        except ValueError:
+            return None
+        if start > end:
+            return None
+        if start >= size:
+            continue
+        ranges.append((start, min(end, size - 1)))
+
+    ranges.sort()
+    merged: List[Tuple[int, int]] = []
+    for start, end in ranges:
+        if merged and start <= merged[-1][1] + 1:
+            merged[-1] = (merged[-1][0], max(merged[-1][1], end))
+        else:
+            merged.append((start, end))
+    return merged
+
+
+def read_range(path: str, start: int, end: int) -> Iterator[bytes]:
+    with open(path, "rb") as f:
+        f.seek(start)
+        remaining = end - start + 1
+        while remaining > 0:
+            chunk = f.read(min(CHUNK_SIZE, remaining))
+            if not chunk:
+                break
+            remaining -= len(chunk)
+            yield chunk
+
+
+def read_multipart_ranges(path: str, ranges: List[Tuple[int, int]], parts: List[bytes], boundary: str) -> Iterator[bytes]:
+    for header, (start, end) in zip(parts, ranges):
+        yield header
+        yield from read_range(path, start, end)
+    yield f"\r\n--{boundary}--\r\n".encode()
+
+
+def file_download_response(
+    request: Request,
+    path: str,
+    st: os.stat_result,
+    media_type: str,
+    filename: str,
+    headers: Optional[Dict[str, str]] = None,
+) -> Response:
+    """FileResponse for full downloads, 304 for matching validators, 206 for ranges"""
+    etag = strong_etag(st)
+    size = st.st_size
+    headers = {
+        **(headers or {}),
+        "ETag": etag,
+        "Last-Modified": formatdate(st.st_mtime, usegmt=True),
+        "Accept-Ranges": "bytes",
+        "Cache-Control": IMMUTABLE_CACHE_CONTROL,
+    }
+
+    if_none_match = request.headers.get("if-none-match")
+    if if_none_match and etag_matches(if_none_match, etag):
+        return Response(status_code=304, headers={k: v for k, v in headers.items()
+                                                  if k in ("ETag", "Last-Modified", "Cache-Control", "Accept-Ranges")})
+
+    range_header = request.headers.get("range")
+    if_range = request.headers.get("if-range")
+    if range_header and (not if_range or if_range.strip() == etag or if_range.strip() == headers["Last-Modified"]):
+        ranges = parse_range(range_header, size)
+        if ranges == []:
+            return Response(status_code=416, headers={**headers, "Content-Range": f"bytes */{size}"})
+        if ranges and len(ranges) <= MAX_RANGES:
+            headers.pop("Content-Length", None)
+            if len(ranges) == 1:
+                start, end = ranges[0]
+                headers["Content-Range"] = f"bytes {start}-{end}/{size}"
+                headers["Content-Length"] = str(end - start + 1)
+                return StreamingResponse(read_range(path, start, end), status_code=206,
+                                         media_type=media_type, headers=headers)
+
+            boundary = secrets.token_hex(16)
+            parts = [
+                (f"\r\n--{boundary}\r\nContent-Type: {media_type}\r\n"
+                 f"Content-Range: bytes {start}-{end}/{size}\r\n\r\n").encode()
+                for start, end in ranges
+            ]
+            body_length = sum(len(p) for p in parts) + sum(end - start + 1 for start, end in ranges)
+            body_length += len(f"\r\n--{boundary}--\r\n")
+            headers["Content-Length"] = str(body_length)
+            return StreamingResponse(
+                read_multipart_ranges(path, ranges, parts, boundary),
+                status_code=206,
+                media_type=f"multipart/byteranges; boundary={boundary}",
+                headers=headers,
+            )
+
+    headers["Content-Length"] = str(size)
+    return FileResponse(path=path, media_type=media_type, filename=filename, headers=headers, stat_result=st)
@@ -0,0 +1,226 @@
+"""
+Background Health Monitoring for Microservices
+Periodic probes of every replica with cached state and a per-service circuit breaker
+"""
+import asyncio
+import logging
+import time
+from datetime import datetime
+from typing import Callable, Dict, Optional
+
+import httpx
+
+from http_pool import ServiceClientPool
+
+logger = logging.getLogger(__name__)
+
+CLOSED = "closed"
+OPEN = "open"
+HALF_OPEN = "half_open"
+
+
+class CircuitBreaker:
+    """Closed/open/half-open breaker that fails fast for a dead service"""
+
+    def __init__(self, failure_threshold: int = 3, recovery_timeout: float = 15.0, half_open_max_calls: int = 1):
+        self.failure_threshold = failure_threshold
+        self.recovery_timeout = recovery_timeout
+        self.half_open_max_calls = half_open_max_calls
+        self.state = CLOSED
+        self.consecutive_failures = 0
+        self.opened_at = 0.0
+        self.half_open_calls = 0
+        self.half_open_since = 0.0
+
+    def allow_request(self) -> bool:
+        """Return True if a request may be sent to the service now"""
+        now = time.monotonic()
+        if self.state == CLOSED:
+            return True
+        if self.state == OPEN:
+            if now - self.opened_at < self.recovery_timeout:
+                return False
+            self.state = HALF_OPEN
+            self.half_open_calls = 0
+            self.half_open_since = now
+        # Half-open: let a limited number of trial requests through. Trials
+        # that never report back (e.g. cancelled) are forgotten after a
+        # recovery period so the breaker cannot wedge half-open.
+        if now - self.half_open_since >= self.recovery_timeout:
+            self.half_open_calls = 0
+            self.half_open_since = now
+        if self.half_open_calls < self.half_open_max_calls:
+            self.half_open_calls += 1
+            return True
+        return False
+
+    def record_success(self):
+        self.state = CLOSED
+        self.consecutive_failures = 0
+        self.half_open_calls = 0
+
+    def record_failure(self):
+        self.consecutive_failures += 1
+        if self.state == HALF_OPEN or self.consecutive_failures >= self.failure_threshold:
+            if self.state != OPEN:
+                logger.warning(f"Circuit opened after {self.consecutive_failures} consecutive failures")
+            self.state = OPEN
+            self.opened_at = time.monotonic()
+            self.half_open_calls = 0
+
+    def retry_after(self) -> float:
+        """Seconds until the breaker will admit a trial request"""
+        if self.state != OPEN:
+            return 0.0
+        return max(0.0, self.recovery_timeout - (time.monotonic() - self.opened_at))
+
+    def snapshot(self) -> dict:
+        return {
+            "state": self.state,
+            "consecutive_failures": self.consecutive_failures,
+            "retry_after_s": round(self.retry_after(), 2),
+        }
+
+
+class HealthMonitor:
+    """Probe every microservice on an interval and cache the result"""
+
+    def __init__(
+        self,
+        clients: ServiceClientPool,
+        interval: float = 5.0,
+        timeout: float = 2.0,
+        failure_threshold: int = 3,
+        recovery_timeout: float = 15.0,
+        probe_latency: Optional[Callable[[str, float], None]] = None,
+    ):
+        self.clients = clients
+        self.probe_latency = probe_latency
+        self.interval = interval
+        self.timeout = timeout
+        self.breakers: Dict[str, CircuitBreaker] = {
+            service: CircuitBreaker(failure_threshold, recovery_timeout)
+            for service in clients.services
+        }
+        self.state: Dict[str, dict] = {
+            service: {"status": "unknown", "url": urls[0]}
+            for service, urls in clients.services.items()
+        }
+        self.last_probe_at: Optional[float] = None
+        self._task: Optional[asyncio.Task] = None
+
+    def breaker(self, service: str) -> CircuitBreaker:
+        return self.breakers[service]
+
+    async def _probe_replica(self, service: str, client: httpx.AsyncClient, url: str) -> dict:
+        start_time = time.perf_counter()
+        try:
+            return await self._request_health(client, url, start_time)
+        finally:
+            if self.probe_latency is not None:
+                self.probe_latency(service, time.perf_counter() - start_time)
+
+    async def _request_health(self, client: httpx.AsyncClient, url: str, start_time: float) -> dict:
+        try:
+            response = await client.get("/health", timeout=self.timeout)
+            response_time_ms = round((time.perf_counter() - start_time) * 1000, 2)
+            if response.status_code == 200:
+                return {"status": "healthy", "response_time_ms": response_time_ms, "url": url}
+            return {"status": "unhealthy", "status_code": response.status_code, "url": url}
+        except httpx.TimeoutException:
+            return {"status": "timeout", "error": "Service response timeout", "url": url}
+        except httpx.NetworkError as e:
+            return {"status": "down", "error": f"Network error: {str(e)}", "url": url}
+        except Exception as e:
+            logger.error(f"Health probe error for {url}: {str(e)}")
+            return {"status": "error", "error": f"Unknown error: {str(e)}", "url": url}
+
+    async def probe(self, service: str) -> dict:
+        """Probe every replica of one service, update rotation, cached state and breaker"""
+        clients = self.clients.replica_clients(service)
+        urls = self.clients.services[service]
+        replicas = await asyncio.gather(*(
+            self._probe_replica(service, client, url) for client, url in zip(clients, urls)
+        ))
+        for index, replica in enumerate(replicas):
+            self.clients.set_replica_health(service, index, replica["status"] == "healthy")
+
+        healthy = [r for r in replicas if r["status"] == "healthy"]
+        if healthy and len(replicas) > 1:
+            result = {
+                "status": "healthy",
+                "response_time_ms": min(r["response_time_ms"] for r in healthy),
+                "url": healthy[0]["url"],
+            }
+        else:
+            result = dict(replicas[0])
+        if len(replicas) > 1:
+            result["healthy_replicas"] = len(healthy)
+            result["replicas"] = replicas
+
+        breaker = self.breakers[service]
+        if result["status"] == "healthy":
+            breaker.record_success()
+        else:
+            breaker.record_failure()
+
+        result["checked_at"] = datetime.now().isoformat()
+        self.state[service] = result
+        return result
+
+    async def probe_all(self, deadline: Optional[float] = None) -> Dict[str, dict]:
+        """Probe every service concurrently; stragglers past the deadline report a timeout"""
+        tasks = {
+            service: asyncio.create_task(self.probe(service))
+            for service in self.clients.services
+        }
+        done, pending = await asyncio.wait(tasks.values(), timeout=deadline)
+        for task in pending:
+            task.cancel()
+        self.last_probe_at = time.time()
+
+        results = {}
+        for service, task in tasks.items():
+            if task in done and not task.cancelled() and task.exception() is None:
+                results[service] = task.result()
+            else:
+                results[service] = {
+                    "status": "timeout",
+                    "error": f"No answer within the {deadline}s health check deadline",
+                    "url": self.clients.services[service][0],
+                }
+        return results
+
+    def cached(self) -> Dict[str, dict]:
+        """Last known state of every service without any I/O"""
+        return dict(self.state)
+
+    def staleness(self) -> Optional[float]:
+        """Seconds since the last completed probe round"""
+        if self.last_probe_at is None:
+            return None
+        return round(time.time() - self.last_probe_at, 3)
+
+    async def _run(self):
+        while True:
+            try:
+                await self.probe_all()
+            except Exception as e:
+                logger.error(f"Health monitor loop error: {str(e)}")
+            await asyncio.sleep(self.interval)
+
+    def start(self):
+        if self._task is None:
+            self._task = asyncio.create_task(self._run())
+
+    async def stop(self):
+        if self._task is not None:
+            self._task.cancel()
+            try:
+                await self._task
+            except asyncio.CancelledError:
+                pass
+            self._task = None
+
+    def is_healthy(self, service: str) -> bool:
+        return self.state.get(service, {}).get("status") == "healthy"
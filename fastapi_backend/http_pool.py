@@ -0,0 +1,240 @@
+"""
+Pooled HTTP Clients for Gateway-to-Microservice Traffic
+One long-lived httpx.AsyncClient per service replica, with pool statistics
+and least-outstanding-requests / power-of-two-choices replica selection
+"""
+import random
+import time
+from typing import Dict, List, Optional, Tuple, Union
+
+import httpx
+
+UDS_PREFIX = "unix:"
+
+
+def split_endpoint(url: str) -> Tuple[str, Optional[str]]:
+    """Base URL and Unix socket path of a replica URL ("unix:/path.sock" or "http://host:port")"""
+    if url.startswith(UDS_PREFIX):
+        return "http://localhost", url[len(UDS_PREFIX):]
+    return url, None
+
+
+class _InstrumentedTransport(httpx.AsyncBaseTransport):
+    """Wrap an httpx transport to record in-flight requests and pool wait time"""
+
+    def __init__(self, transport: httpx.AsyncHTTPTransport):
+        self._transport = transport
+        self.healthy = True
+        self.active_requests = 0
+        self.total_requests = 0
+        self.total_wait_seconds = 0.0
+        self.max_wait_seconds = 0.0
+        self.status_counts: Dict[int, int] = {}
+        self.error_counts: Dict[str, int] = {}
+
+    async def handle_async_request(self, request: httpx.Request) -> httpx.Response:
+        started = time.perf_counter()
+        acquired = []
+        previous_trace = request.extensions.get("trace")
+
+        async def trace(event_name: str, info: dict):
+            # The first connection-level event marks the moment a pooled
+            # connection was handed to this request
+            if not acquired and event_name.endswith(".started"):
+                acquired.append(time.perf_counter())
+            if previous_trace is not None:
+                await previous_trace(event_name, info)
+
+        request.extensions["trace"] = trace
+        self.active_requests += 1
+        self.total_requests += 1
+        try:
+            response = await self._transport.handle_async_request(request)
+        except httpx.ConnectError as e:
+            # Refused or unreachable: out of rotation until a probe succeeds
+            self.healthy = False
+            self._count_error(e)
+            raise
+        except httpx.TransportError as e:
+            self._count_error(e)
+            raise
+        finally:
+            self.active_requests -= 1
+            if acquired:
+                waited = acquired[0] - started
+                self.total_wait_seconds += waited
+                self.max_wait_seconds = max(self.max_wait_seconds, waited)
+        self.status_counts[response.status_code] = self.status_counts.get(response.status_code, 0) + 1
+        return response
+
+    def _count_error(self, error: Exception):
+        name = type(error).__name__
+        self.error_counts[name] = self.error_counts.get(name, 0) + 1
+
+    async def aclose(self):
+        await self._transport.aclose()
+
+    def connection_counts(self) -> Dict[str, int]:
+        """Count pooled connections by state (best effort, httpcore internals)"""
+        pool = getattr(self._transport, "_pool", None)
+        connections = list(getattr(pool, "connections", []) or [])
+        idle = sum(1 for conn in connections if conn.is_idle())
+        return {
+            "open": len(connections),
+            "idle": idle,
+            "in_use": len(connections) - idle,
+        }
+
+
+class ServiceClientPool:
+    """Manage one keep-alive httpx.AsyncClient per microservice replica
+
+    client(service) picks a replica by its in-flight request count: the
+    least loaded healthy replica ("least_outstanding"), or the better of two
+    random healthy replicas ("p2c"). Replicas that refuse connections or fail
+    health probes leave the rotation until a probe succeeds again.
+    """
+
+    def __init__(
+        self,
+        services: Dict[str, Union[str, List[str]]],
+        max_connections: int = 100,
+        max_keepalive_connections: int = 20,
+        keepalive_expiry: float = 30.0,
+        timeout: float = 60.0,
+        connect_timeout: float = 5.0,
+        host_limits: Optional[Dict[str, int]] = None,
+        strategy: str = "least_outstanding",
+    ):
+        self.services: Dict[str, List[str]] = {
+            service: [urls] if isinstance(urls, str) else list(urls)
+            for service, urls in services.items()
+        }
+        self.max_connections = max_connections
+        self.max_keepalive_connections = max_keepalive_connections
+        self.keepalive_expiry = keepalive_expiry
+        self.timeout = timeout
+        self.connect_timeout = connect_timeout
+        self.host_limits = host_limits or {}
+        self.strategy = strategy
+        self._clients: Dict[str, List[httpx.AsyncClient]] = {}
+        self._transports: Dict[str, List[_InstrumentedTransport]] = {}
+
+    def _limits_for(self, service: str) -> httpx.Limits:
+        max_connections = self.host_limits.get(service, self.max_connections)
+        return httpx.Limits(
+            max_connections=max_connections,
+            max_keepalive_connections=min(self.max_keepalive_connections, max_connections),
+            keepalive_expiry=self.keepalive_expiry,
+        )
+
+    async def start(self):
+        """Create clients for every replica of every configured service"""
+        for service, urls in self.services.items():
+            if service in self._clients:
+                continue
+            self._transports[service] = []
+            self._clients[service] = []
+            for url in urls:
+                base_url, uds = split_endpoint(url)
+                transport = _InstrumentedTransport(
+                    httpx.AsyncHTTPTransport(limits=self._limits_for(service), uds=uds)
+                )
+                self._transports[service].append(transport)
+                self._clients[service].append(httpx.AsyncClient(
+                    base_url=base_url,
+                    transport=transport,
+                    timeout=httpx.Timeout(self.timeout, connect=self.connect_timeout),
+                ))
+
+    async def close(self):
+        """Close every client and drop pooled connections"""
+        for clients in self._clients.values():
+            for client in clients:
+                await client.aclose()
+        self._clients.clear()
+        self._transports.clear()
+
+    def _pick(self, service: str) -> int:
+        transports = self._transports[service]
+        if len(transports) == 1:
+            return 0
+        candidates = [i for i, t in enumerate(transports) if t.healthy] or list(range(len(transports)))
+        if self.strategy == "p2c" and len(candidates) > 2:
+            candidates = random.sample(candidates, 2)
+        least = min(transports[i].active_requests for i in candidates)
+        return random.choice([i for i in candidates if transports[i].active_requests == least])
+
+    def client(self, service: str) -> httpx.AsyncClient:
+        """Return the pooled client of the replica that should take the next request"""
+        clients = self._clients.get(service)
+        if not clients:
+            raise KeyError(f"No pooled client for service '{service}'")
+        return clients[self._pick(service)]
+
+    def replica_clients(self, service: str) -> List[httpx.AsyncClient]:
+        """Every replica's client, in configuration order (for health probes)"""
+        return self._clients.get(service, [])
+
+    def set_replica_health(self, service: str, index: int, healthy: bool):
+        self._transports[service][index].healthy = healthy
+
+    def healthy_replicas(self, service: str) -> int:
+        return sum(1 for t in self._transports.get(service, []) if t.healthy)
+
+    def response_counts(self) -> Dict[str, Dict[int, int]]:
+        """Upstream responses per service by HTTP status, summed over replicas"""
+        counts = {}
+        for service, transports in self._transports.items():
+            totals: Dict[int, int] = {}
+            for transport in transports:
+                for status, count in transport.status_counts.items():
+                    totals[status] = totals.get(status, 0) + count
+            counts[service] = totals
+        return counts
+
+    def error_counts(self) -> Dict[str, Dict[str, int]]:
+        """Upstream transport errors per service by exception type"""
+        counts = {}
+        for service, transports in self._transports.items():
+            totals: Dict[str, int] = {}
+            for transport in transports:
+                for error, count in transport.error_counts.items():
+                    totals[error] = totals.get(error, 0) + count
+            counts[service] = totals
+        return counts
+
+    def active_requests(self) -> Dict[str, int]:
+        return {service: sum(t.active_requests for t in transports) for service, transports in self._transports.items()}
+
+    def stats(self) -> Dict[str, dict]:
+        """Pool statistics per service (and replica) for sizing the limits"""
+        stats = {}
+        for service, transports in self._transports.items():
+            limits = self._limits_for(service)
+            replicas = []
+            for url, transport in zip(self.services[service], transports):
+                avg_wait = (
+                    transport.total_wait_seconds / transport.total_requests
+                    if transport.total_requests else 0.0
+                )
+                replicas.append({
+                    "url": url,
+                    "healthy": transport.healthy,
+                    "connections": transport.connection_counts(),
+                    "active_requests": transport.active_requests,
+                    "total_requests": transport.total_requests,
+                    "avg_wait_ms": round(avg_wait * 1000, 3),
+                    "max_wait_ms": round(transport.max_wait_seconds * 1000, 3),
+                })
+            stats[service] = {
+                "strategy": self.strategy,
+                "max_connections": limits.max_connections,
+                "max_keepalive_connections": limits.max_keepalive_connections,
+                "keepalive_expiry_s": limits.keepalive_expiry,
+                "active_requests": sum(r["active_requests"] for r in replicas),
+                "total_requests": sum(r["total_requests"] for r in replicas),
+                "healthy_replicas": sum(1 for r in replicas if r["healthy"]),
+                "replicas": replicas,
+            }
+        return stats
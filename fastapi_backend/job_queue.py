@@ -0,0 +1,286 @@
+"""
+Asynchronous Job Queue
+Bounded worker pool behind an asyncio queue for submit / poll / fetch tool jobs
+"""
+import asyncio
+import logging
+import sqlite3
+import time
+import uuid
+from collections import OrderedDict
+from typing import AsyncIterator, Awaitable, Callable, Optional
+
+from shared_state import SharedState
+
+logger = logging.getLogger(__name__)
+
+QUEUED = "queued"
+RUNNING = "running"
+SUCCEEDED = "succeeded"
+FAILED = "failed"
+
+
+class QueueFullError(Exception):
+    """Raised when the job queue cannot accept more work"""
+
+
+class Job:
+    """One submitted tool run and its lifecycle timestamps"""
+
+    def __init__(self, tool_name: str, payload: dict):
+        self.id = uuid.uuid4().hex
+        self.tool_name = tool_name
+        self.payload = payload
+        self.status = QUEUED
+        self.progress = 0
+        self.stage = "queued"
+        self.counters: dict = {}
+        self.result: Optional[dict] = None
+        self.error: Optional[str] = None
+        self.error_status: Optional[int] = None
+        self.created_at = time.time()
+        self.started_at: Optional[float] = None
+        self.finished_at: Optional[float] = None
+        self.on_change: Optional[Callable[["Job"], None]] = None
+        self.version = 0
+        self._changed = asyncio.Event()
+
+    @property
+    def finished(self) -> bool:
+        return self.status in (SUCCEEDED, FAILED)
+
+    def set_stage(self, stage: str, progress: int, counters: Optional[dict] = None):
+        self.stage = stage
+        self.progress = progress
+        if counters is not None:
+            self.counters = counters
+        self.changed()
+
+    def changed(self):
+        """Wake watchers and publish the record after any update"""
+        self.version += 1
+        self._changed.set()
+        self._changed = asyncio.Event()
+        if self.on_change is not None:
+            self.on_change(self)
+
+    async def wait_changed(self, version: int, timeout: float):
+        """Return once the job moved past version, or after timeout"""
+        if self.version != version:
+            return
+        try:
+            await asyncio.wait_for(self._changed.wait(), timeout)
+        except asyncio.TimeoutError:
+            pass
+
+    def to_dict(self) -> dict:
+        data = {
+            "jobId": self.id,
+            "toolId": self.tool_name,
+            "status": self.status,
+            "stage": self.stage,
+            "progress": self.progress,
+            **self.counters,
+            "createdAt": self.created_at,
+            "startedAt": self.started_at,
+            "finishedAt": self.finished_at,
+        }
+        if self.started_at is not None:
+            data["waitTimeMs"] = int((self.started_at - self.created_at) * 1000)
+        if self.finished_at is not None and self.started_at is not None:
+            data["runTimeMs"] = int((self.finished_at - self.started_at) * 1000)
+        if self.result is not None:
+            data["result"] = self.result
+            data["downloadUrl"] = self.result.get("downloadUrl") or self.result.get("download_url")
+        if self.error is not None:
+            data["error"] = {"status": self.error_status, "detail": self.error}
+        return data
+
+
+class JobQueue:
+    """Run jobs on a fixed number of workers with a bounded backlog
+
+    Jobs run in the gateway process that accepted them. With a SharedState
+    store their records are also published there, so any worker process
+    can answer a status poll.
+    """
+
+    def __init__(
+        self,
+        runner: Callable[[Job], Awaitable[dict]],
+        workers: int = 4,
+        max_queue: int = 100,
+        result_ttl: float = 3600,
+        max_jobs: int = 10_000,
+        store: Optional[SharedState] = None,
+    ):
+        self.runner = runner
+        self.workers = workers
+        self.max_queue = max_queue
+        self.result_ttl = result_ttl
+        self.max_jobs = max_jobs
+        self.store = store
+        self.jobs: "OrderedDict[str, Job]" = OrderedDict()
+        self.running = 0
+        self.submitted = 0
+        self.succeeded = 0
+        self.failed = 0
+        self.total_wait = 0.0
+        self.max_wait = 0.0
+        self.total_run = 0.0
+        self.max_run = 0.0
+        self._queue: Optional[asyncio.Queue] = None
+        self._tasks = []
+
+    async def start(self):
+        self._queue = asyncio.Queue(maxsize=self.max_queue)
+        self._tasks = [asyncio.create_task(self._worker(i)) for i in range(self.workers)]
+
+    async def stop(self):
+        for task in self._tasks:
+            task.cancel()
+        for task in self._tasks:
+            try:
+                await task
+            except asyncio.CancelledError:
+                pass
+        self._tasks = []
+
+    def is_full(self) -> bool:
+        return self._queue is None or self._queue.full()
+
+    def submit(self, job: Job) -> Job:
+        """Enqueue a job without waiting; raises QueueFullError when saturated"""
+        if self.is_full():
+            raise QueueFullError("Job queue is full")
+        self._prune()
+        self._queue.put_nowait(job)
+        self.jobs[job.id] = job
+        self.submitted += 1
+        if self.store is not None:
+            job.on_change = self._publish
+            self._publish(job)
+        return job
+
+    def get(self, job_id: str) -> Optional[Job]:
+        return self.jobs.get(job_id)
+
+    def lookup(self, job_id: str) -> Optional[dict]:
+        """Status of a job run by this process or, with a shared store, by any worker"""
+        job = self.jobs.get(job_id)
+        if job is not None:
+            return job.to_dict()
+        if self.store is not None:
+            return self.store.get_job(job_id)
+        return None
+
+    async def watch(self, job_id: str, poll_interval: float = 0.5,
+                    heartbeat: float = 15.0) -> AsyncIterator[Optional[dict]]:
+        """Yield a job's status whenever it changes, until it has finished
+
+        Jobs run by this process wake the watcher directly; jobs run by another
+        worker are polled from the shared store. Yields None after heartbeat
+        seconds without a change so idle connections can be kept alive.
+        """
+        last = None
+        idle_since = time.monotonic()
+        while True:
+            job = self.jobs.get(job_id)
+            version = job.version if job is not None else None
+            data = job.to_dict() if job is not None else self.lookup(job_id)
+            if data is None:
+                return
+            if data != last:
+                yield data
+                if data.get("finishedAt") is not None:
+                    return
+                last, idle_since = data, time.monotonic()
+            elif time.monotonic() - idle_since >= heartbeat:
+                yield None
+                idle_since = time.monotonic()
+
+            if job is not None:
+                await job.wait_changed(version, heartbeat)
+            else:
+                await asyncio.sleep(poll_interval)
+
+    def _publish(self, job: Job, attempt: int = 0):
+        # Unfinished records expire too, in case their worker process dies
+        try:
+            self.store.put_job(job.id, job.to_dict(), time.time() + self.result_ttl)
+        except sqlite3.OperationalError as e:
+            # Store busy: a running job republishes on its next change, a
+            # finished one has none left, so try it again shortly
+            logger.warning(f"Could not publish job {job.id}: {str(e)}")
+            if job.finished and attempt < 20:
+                asyncio.get_running_loop().call_later(0.1, self._publish, job, attempt + 1)
+
+    async def _worker(self, index: int):
+        while True:
+            job = await self._queue.get()
+            job.status = RUNNING
+            job.started_at = time.time()
+            job.set_stage("running", 10)
+            self.running += 1
+            waited = job.started_at - job.created_at
+            self.total_wait += waited
+            self.max_wait = max(self.max_wait, waited)
+            try:
+                job.result = await self.runner(job)
+                job.status = SUCCEEDED
+                job.set_stage("done", 100)
+                self.succeeded += 1
+            except asyncio.CancelledError:
+                job.status = FAILED
+                job.error = "Gateway shutting down"
+                raise
+            except Exception as e:
+                job.status = FAILED
+                job.error = str(getattr(e, "detail", e))
+                job.error_status = getattr(e, "status_code", 500)
+                job.set_stage("failed", 100)
+                self.failed += 1
+                logger.warning(f"Job {job.id} ({job.tool_name}) failed: {job.error}")
+            finally:
+                job.finished_at = time.time()
+                ran = job.finished_at - job.started_at
+                self.total_run += ran
+                self.max_run = max(self.max_run, ran)
+                self.running -= 1
+                self._queue.task_done()
+                job.changed()
+
+    def _prune(self):
+        """Forget finished jobs past their TTL, oldest first"""
+        now = time.time()
+        for job_id in list(self.jobs):
+            job = self.jobs[job_id]
+            expired = job.finished and now - job.finished_at > self.result_ttl
+            if not expired and len(self.jobs) < self.max_jobs:
+                break
+            if not job.finished:
+                break
+            del self.jobs[job_id]
+        if self.store is not None:
+            try:
+                self.store.sweep_jobs()
+            except sqlite3.OperationalError:
+                pass
+
+    def stats(self) -> dict:
+        started = self.succeeded + self.failed + self.running
+        finished = self.succeeded + self.failed
+        return {
+            "workers": self.workers,
+            "running": self.running,
+            "queue_depth": self._queue.qsize() if self._queue else 0,
+            "queue_capacity": self.max_queue,
+            "submitted": self.submitted,
+            "succeeded": self.succeeded,
+            "failed": self.failed,
+            "tracked_jobs": len(self.jobs),
+            "avg_wait_ms": round(self.total_wait / started * 1000, 2) if started else 0.0,
+            "max_wait_ms": round(self.max_wait * 1000, 2),
+            "avg_run_ms": round(self.total_run / finished * 1000, 2) if finished else 0.0,
+            "max_run_ms": round(self.max_run * 1000, 2),
+        }
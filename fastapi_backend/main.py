@@ -6,8 +6,9 @@ from fastapi import FastAPI, HTTPException, UploadFile, File, Form, Request
 from fastapi.middleware.cors import CORSMiddleware
 from fastapi.middleware.trustedhost import TrustedHostMiddleware
 from fastapi.staticfiles import StaticFiles
-from fastapi.responses import FileResponse, HTMLResponse
+from fastapi.responses import FileResponse, HTMLResponse, JSONResponse, Response, StreamingResponse
 from fastapi.security import HTTPBearer, HTTPAuthorizationCredentials
+from starlette.datastructures import Headers
 import httpx
 import os
 import uvicorn
@@ -17,14 +18,59 @@ import asyncio
 import logging
 from datetime import datetime
 import time
-from collections import defaultdict
 import hashlib
 import secrets
-from typing import Dict, List
+import tempfile
+from typing import Awaitable, Callable, Dict, List
 from pathlib import Path
+from urllib.parse import urlencode
+from contextlib import asynccontextmanager
+
+from config import settings, SERVICE_NAMES, get_admission_limits, get_lane_weights, get_pool_host_limits, get_proxy_timeout, get_service_urls, per_worker
+from admission import AdmissionController
+from compression import CompressionMiddleware, PrecompressedStaticFiles
+from artifact_index import ArtifactIndex
+from artifact_store import ArtifactStaticFiles, create_artifact_store
+from download_response import file_download_response
+from http_pool import ServiceClientPool
+from health_monitor import HealthMonitor
+from job_queue import Job, JobQueue, QueueFullError
+from progress import COUNTERS, NDJSON_MEDIA_TYPE, PROGRESS_HEADER, PROGRESS_STREAM, format_sse
+from metrics import HTTPMetrics, MetricsMiddleware, MetricsRegistry, tool_label_for
+from rate_limiter import RateLimiter, RateLimitRule, parse_rate
+from retry_budget import RetryBudget, RetryBudgets
+from security import SecurityMiddleware
+from shared_state import SharedState
+from staged_inputs import input_key
+from tool_registry import ToolSpec, registry as tool_registry
+from tracing import Trace, TraceMiddleware, activate, current_request_id, record, record_downstream, span, trace_exporter
+from upload_handoff import HANDOFF_HEADER, MultipartSpooler, ensure_handoff_dir, handoff_enabled, sweep_handoff_dir
+from upload_proxy import MULTIPART_OVERHEAD, MultipartInspector, check_content_length, get_boundary, inspected_body
+
+
+@asynccontextmanager
+async def lifespan(app: FastAPI):
+    """Create long-lived gateway resources on startup and release them on shutdown"""
+    await service_clients.start()
+    logger.info(f"HTTP pools ready for {len(MICROSERVICES)} microservices")
+    health_monitor.start()
+    await job_queue.start()
+    artifact_store.start(settings.ARTIFACT_SWEEP_SECONDS)
+    if HANDOFF_SERVICES:
+        ensure_handoff_dir()
+        removed = sweep_handoff_dir()
+        logger.info(f"Upload handoff to {sorted(HANDOFF_SERVICES)} via {settings.UPLOAD_HANDOFF_DIR} ({removed} stale files removed)")
+    try:
+        yield
+    finally:
+        await job_queue.stop()
+        await artifact_store.stop()
+        await health_monitor.stop()
+        await service_clients.close()
+        if shared_state is not None:
+            shared_state.close()
 
-
-app = FastAPI(title="Suntyn AI - Neural Intelligence Platform", version="2.0.0")
+app = FastAPI(title="Suntyn AI - Neural Intelligence Platform", version="2.0.0", lifespan=lifespan)
 
 # Configure logging for better error tracking
 logging.basicConfig(level=logging.INFO)
@@ -45,88 +91,200 @@ app.add_middleware(
     allowed_hosts=["*"]  # Configure with your actual domains in production
 )
 
-# Rate Limiting Storage
-rate_limit_storage: Dict[str, List[float]] = defaultdict(list)
-RATE_LIMIT_REQUESTS = 100  # requests per window
-RATE_LIMIT_WINDOW = 900   # 15 minutes in seconds
-
-def get_client_ip(request: Request) -> str:
-    """Get real client IP address"""
-    forwarded = request.headers.get("X-Forwarded-For")
-    if forwarded:
-        return forwarded.split(",")[0].strip()
-    return request.client.host if request.client else "unknown"
-
-def is_rate_limited(client_ip: str) -> bool:
-    """Check if client is rate limited"""
-    now = time.time()
-    window_start = now - RATE_LIMIT_WINDOW
-
-    # Clean old requests
-    rate_limit_storage[client_ip] = [
-        req_time for req_time in rate_limit_storage[client_ip] 
-        if req_time > window_start
-    ]
-
-    # Check if over limit
-    if len(rate_limit_storage[client_ip]) >= RATE_LIMIT_REQUESTS:
-        return True
-
-    # Add current request
-    rate_limit_storage[client_ip].append(now)
-    return False
-
-@app.middleware("http")
-async def security_headers_middleware(request: Request, call_next):
-    """Add security headers and rate limiting"""
-
-    # Rate limiting check
-    client_ip = get_client_ip(request)
-    if is_rate_limited(client_ip):
-        raise HTTPException(
-            status_code=429, 
-            detail="Rate limit exceeded. Try again later."
-        )
+# State all gateway workers must agree on (GATEWAY_WORKERS > 1)
+shared_state = SharedState(
+    settings.GATEWAY_STATE_FILE, busy_timeout=settings.GATEWAY_STATE_BUSY_TIMEOUT_MS / 1000
+) if settings.GATEWAY_SHARED_STATE else None
+
+# Static mounts are served without rate limiting
+STATIC_PREFIXES = ("/assets/", "/static/")
+
+# Rate Limiting: heavy tool calls and cheap file downloads get separate buckets
+rate_limiter = RateLimiter(
+    rules=[
+        RateLimitRule("assets", *parse_rate(settings.RATE_LIMIT_ASSETS),
+                      prefixes=("/api/tools/download/", "/api/download/"),
+                      max_clients=settings.RATE_LIMIT_MAX_CLIENTS, store=shared_state),
+        RateLimitRule("tools", *parse_rate(settings.RATE_LIMIT_TOOLS),
+                      prefixes=("/api/tools/", "/tools/"),
+                      max_clients=settings.RATE_LIMIT_MAX_CLIENTS, store=shared_state),
+    ],
+    default=RateLimitRule("default", *parse_rate(settings.RATE_LIMIT_DEFAULT),
+                          max_clients=settings.RATE_LIMIT_MAX_CLIENTS, store=shared_state),
+)
 
-    response = await call_next(request)
+# Security headers on every response; static mounts skip the rate limiter
+app.add_middleware(SecurityMiddleware, rate_limiter=rate_limiter, skip_prefixes=STATIC_PREFIXES)
 
-    # Security Headers
-    response.headers["X-Content-Type-Options"] = "nosniff"
-    response.headers["X-Frame-Options"] = "DENY"
-    response.headers["X-XSS-Protection"] = "1; mode=block"
-    response.headers["Strict-Transport-Security"] = "max-age=31536000; includeSubDomains"
-    response.headers["Referrer-Policy"] = "strict-origin-when-cross-origin"
-    response.headers["Content-Security-Policy"] = "default-src 'self'; script-src 'self' 'unsafe-inline' 'unsafe-eval'; style-src 'self' 'unsafe-inline'"
-    response.headers["Permissions-Policy"] = "geolocation=(), microphone=(), camera=()"
+# Negotiated gzip/brotli for compressible responses; wraps security, trusted-host and
+# CORS so it sees their headers, while tracing and metrics (added below) wrap it
+if settings.ENABLE_COMPRESSION:
+    app.add_middleware(CompressionMiddleware, minimum_size=settings.COMPRESSION_MIN_BYTES)
 
-    return response
+# X-Request-ID and a Server-Timing breakdown per request; the proxy helpers record the spans
+if settings.TRACE_ENABLED:
+    app.add_middleware(TraceMiddleware, service="gateway", exporter=trace_exporter())
 
 # Remove duplicate CORS - already configured above
 
 
-# Microservice URLs
-MICROSERVICES = {
-    "pdf": "http://localhost:8001",
-    "image": "http://localhost:8002", 
-    "media": "http://localhost:8003",
-    "government": "http://localhost:8004",
-    "developer": "http://localhost:8005"
-}
+# Microservice replica URLs (SERVICE_REPLICAS / SERVICE_ENDPOINTS)
+MICROSERVICES = {service: get_service_urls(service) for service in SERVICE_NAMES}
+
+# Client request headers passed through to microservices
+FORWARDED_HEADERS = ("x-skip-cache",)
+
+# Services on this host receive uploads as spooled files (UPLOAD_HANDOFF)
+HANDOFF_SERVICES = {service for service, urls in MICROSERVICES.items() if handoff_enabled(urls)}
+
+# Prometheus metrics served at /metrics; scrape-time collectors are registered below.
+# Each worker process has its own counters, so with several they carry a worker label
+metrics_registry = MetricsRegistry(
+    const_labels=(lambda: {"worker": str(os.getpid())}) if settings.GATEWAY_WORKERS > 1 else None
+)
+health_probe_seconds = metrics_registry.histogram(
+    "gateway_health_probe_duration_seconds", "Health probe latency per replica probe", ("service",))
+
+# One pooled keep-alive client per microservice replica, opened in lifespan()
+service_clients = ServiceClientPool(
+    MICROSERVICES,
+    max_connections=settings.HTTP_POOL_MAX_CONNECTIONS,
+    max_keepalive_connections=settings.HTTP_POOL_MAX_KEEPALIVE,
+    keepalive_expiry=settings.HTTP_POOL_KEEPALIVE_EXPIRY,
+    timeout=settings.HTTP_POOL_TIMEOUT,
+    connect_timeout=settings.HTTP_POOL_CONNECT_TIMEOUT,
+    host_limits=get_pool_host_limits(),
+    strategy=settings.LOAD_BALANCER_STRATEGY,
+)
+
+# Background health probes and per-service circuit breakers
+health_monitor = HealthMonitor(
+    service_clients,
+    interval=settings.HEALTH_PROBE_INTERVAL,
+    timeout=settings.HEALTH_PROBE_TIMEOUT,
+    failure_threshold=settings.CIRCUIT_FAILURE_THRESHOLD,
+    recovery_timeout=settings.CIRCUIT_RECOVERY_SECONDS,
+    probe_latency=lambda service, seconds: health_probe_seconds.labels(service).observe(seconds),
+)
+
+# Concurrency limits per service and tool (this worker's share); waiters queue in cost lanes
+admission = AdmissionController(
+    MICROSERVICES,
+    *get_admission_limits(),
+    default_limit=per_worker(settings.ADMISSION_DEFAULT_LIMIT),
+    max_queue=per_worker(settings.ADMISSION_QUEUE_SIZE),
+    queue_timeout=settings.ADMISSION_QUEUE_TIMEOUT,
+    lane_weights=get_lane_weights(),
+    fast_reserved=per_worker(settings.ADMISSION_FAST_LANE_RESERVED),
+    fast_max_bytes=settings.ADMISSION_FAST_LANE_MAX_KB * 1024,
+    bulk_min_bytes=settings.ADMISSION_BULK_LANE_MIN_MB * 1024 * 1024,
+)
+
+# Retries per service are capped at a share of recent traffic
+retry_budgets = RetryBudgets(
+    MICROSERVICES,
+    ratio=settings.RETRY_BUDGET_RATIO,
+    min_retries=settings.RETRY_BUDGET_MIN_RETRIES,
+    window_seconds=settings.RETRY_BUDGET_WINDOW_SECONDS,
+)
+
+# Asynchronous tool jobs; run_tool_job is defined with the proxy helpers below
+job_queue = JobQueue(
+    lambda job: run_tool_job(job),
+    workers=settings.JOB_WORKERS,
+    max_queue=settings.JOB_QUEUE_MAX,
+    result_ttl=settings.JOB_RESULT_TTL_SECONDS,
+    store=shared_state,
+)
+os.makedirs(settings.JOB_SPOOL_DIR, exist_ok=True)
+
+def admission_samples(read):
+    """(scope, name) samples of one admission limiter field, for the metrics callbacks"""
+    for scope, limiters in (("service", admission.services), ("tool", admission.tools)):
+        for name, limiter in limiters.items():
+            yield (scope, name), read(limiter)
+
+# Counters the gateway already keeps are read at scrape time, so the
+# request path only pays for the per-tool HTTP metrics
+metrics_registry.callback(
+    "gateway_upstream_responses_total", "Microservice responses by HTTP status", ("service", "status"),
+    lambda: (((service, str(status)), count)
+             for service, counts in service_clients.response_counts().items()
+             for status, count in counts.items()),
+    kind="counter")
+metrics_registry.callback(
+    "gateway_upstream_errors_total", "Microservice transport errors by exception type", ("service", "error"),
+    lambda: (((service, error), count)
+             for service, counts in service_clients.error_counts().items()
+             for error, count in counts.items()),
+    kind="counter")
+metrics_registry.callback(
+    "gateway_upstream_in_flight", "Requests in flight to each microservice", ("service",),
+    lambda: (((service,), active) for service, active in service_clients.active_requests().items()))
+metrics_registry.callback(
+    "gateway_retries_total", "Retries and hedged requests sent per service", ("service",),
+    lambda: (((service,), retry_budgets[service].spent) for service in MICROSERVICES),
+    kind="counter")
+metrics_registry.callback(
+    "gateway_retry_budget_rejections_total", "Retries refused by the retry budget", ("service",),
+    lambda: (((service,), retry_budgets[service].rejected) for service in MICROSERVICES),
+    kind="counter")
+metrics_registry.callback(
+    "gateway_rate_limit_rejections_total", "Requests rejected with 429 per rate-limit rule", ("rule",),
+    lambda: (((rule,), count) for rule, count in rate_limiter.rejections.items()),
+    kind="counter")
+metrics_registry.callback(
+    "gateway_admission_in_flight", "Requests holding an admission slot", ("scope", "name"),
+    lambda: admission_samples(lambda limiter: limiter.in_flight))
+metrics_registry.callback(
+    "gateway_admission_queued", "Requests waiting for an admission slot", ("scope", "name"),
+    lambda: admission_samples(lambda limiter: limiter.queued))
+metrics_registry.callback(
+    "gateway_admission_rejections_total", "Requests rejected with 503 by admission control", ("scope", "name"),
+    lambda: admission_samples(lambda limiter: limiter.rejected_full + limiter.rejected_timeout),
+    kind="counter")
+metrics_registry.callback(
+    "gateway_jobs_queued", "Jobs waiting for a worker", (),
+    lambda: [((), job_queue.stats()["queue_depth"])])
+metrics_registry.callback(
+    "gateway_jobs_running", "Jobs being run by a worker", (),
+    lambda: [((), job_queue.running)])
+
+# Per-tool latency, bytes and status counts (outermost: sees 429s and compressed sizes)
+app.add_middleware(
+    MetricsMiddleware,
+    metrics=HTTPMetrics(metrics_registry, "gateway"),
+    label_for=tool_label_for(
+        tool_registry.tools,
+        prefixes=("/api/tools/", "/tools/", "/api/jobs/"),
+        groups=("/api", "/api/health", "/api/gateway", "/api/tools", "/api/jobs", "/api/download",
+                "/assets", "/static"),
+        default="frontend",
+    ),
+)
 
 # Create uploads directory
 os.makedirs("fastapi_backend/uploads", exist_ok=True)
 os.makedirs("fastapi_backend/uploads/processed", exist_ok=True)
 
-# Serve static files for processed downloads
-static_dir = os.path.abspath("../static")
+# Processed downloads: hash-sharded store with TTL / quota eviction, served by name under /static
+artifact_store = create_artifact_store()
+# Spools of this worker's unfinished jobs are job inputs, not leftovers
+artifact_store.keep_temp = lambda: {job.payload["body_path"] for job in job_queue.jobs.values() if not job.finished}
+static_dir = artifact_store.root
 os.makedirs(static_dir, exist_ok=True)
-app.mount("/static", StaticFiles(directory=static_dir), name="static")
+app.mount("/static", ArtifactStaticFiles(artifact_store), name="static")
+
+# Outputs announced by microservices; downloads of pending ones wake on publish or a short re-check
+artifact_index = ArtifactIndex(static_dir, max_entries=settings.ARTIFACT_INDEX_MAX_ENTRIES,
+                               locate=artifact_store.resolve, poll_interval=settings.ARTIFACT_WAIT_POLL_MS / 1000)
 
 # Serve built React frontend (Fix path)
 frontend_dir = os.path.abspath("../dist/public")
 if os.path.exists(frontend_dir) and os.listdir(frontend_dir):
     # Mount static assets first
-    app.mount("/assets", StaticFiles(directory=os.path.join(frontend_dir, "assets")), name="assets")
+    app.mount("/assets", PrecompressedStaticFiles(directory=os.path.join(frontend_dir, "assets"),
+                                                  immutable=settings.CACHE_STATIC_FILES), name="assets")
     print(f"✅ Frontend assets served from: {frontend_dir}/assets")
 else:
     print("⚠️  Frontend build not found, serving API only")
@@ -180,105 +338,118 @@ async def api_endpoint():
     return {"message": "Suntyn AI API Gateway", "status": "active", "endpoints": ["/api/health", "/api/process"]}
 
 @app.get("/api/health")
-async def health_check():
-    """Check health of all microservices with enhanced monitoring"""
-    health_status = {}
-    overall_status = "healthy"
+async def health_check(mode: str = "live"):
+    """Check health of all microservices with enhanced monitoring
+
+    mode=live probes every service concurrently under HEALTH_CHECK_DEADLINE;
+    mode=cached answers from the background monitor's last known state.
+    """
     timestamp = datetime.now().isoformat()
+    if mode == "cached":
+        health_status = health_monitor.cached()
+    else:
+        health_status = await health_monitor.probe_all(deadline=settings.HEALTH_CHECK_DEADLINE)
 
-    async with httpx.AsyncClient() as client:
-        for service, url in MICROSERVICES.items():
-            try:
-                start_time = datetime.now()
-                response = await client.get(f"{url}/health", timeout=10.0)
-                response_time = (datetime.now() - start_time).total_seconds()
-
-                if response.status_code == 200:
-                    health_status[service] = {
-                        "status": "healthy",
-                        "response_time_ms": round(response_time * 1000, 2),
-                        "url": url
-                    }
-                else:
-                    health_status[service] = {
-                        "status": "unhealthy",
-                        "status_code": response.status_code,
-                        "url": url
-                    }
-                    overall_status = "degraded"
-
-            except httpx.TimeoutException:
-                health_status[service] = {
-                    "status": "timeout",
-                    "error": "Service response timeout",
-                    "url": url
-                }
-                overall_status = "degraded"
-            except httpx.NetworkError as e:
-                health_status[service] = {
-                    "status": "down",
-                    "error": f"Network error: {str(e)}",
-                    "url": url
-                }
-                overall_status = "degraded"
-            except Exception as e:
-                health_status[service] = {
-                    "status": "error",
-                    "error": f"Unknown error: {str(e)}",
-                    "url": url
-                }
-                overall_status = "degraded"
-                logger.error(f"Health check error for {service}: {str(e)}")
+    health_status = {
+        service: {**result, "circuit": health_monitor.breaker(service).snapshot()}
+        for service, result in health_status.items()
+    }
+    healthy = len([s for s in health_status.values() if s.get("status") == "healthy"])
 
     return {
-        "status": overall_status,
+        "status": "healthy" if healthy == len(MICROSERVICES) else "degraded",
         "timestamp": timestamp,
+        "mode": "cached" if mode == "cached" else "live",
+        "staleness_seconds": health_monitor.staleness(),
         "microservices": health_status,
         "total_services": len(MICROSERVICES),
-        "healthy_services": len([s for s in health_status.values() if s.get("status") == "healthy"])
+        "healthy_services": healthy
+    }
+
+@app.get("/api/tools")
+async def tool_catalog(request: Request):
+    """Tool catalog built once from the registry at startup"""
+    headers = {"ETag": tool_registry.catalog_etag, "Cache-Control": "public, max-age=300"}
+    if request.headers.get("if-none-match") == tool_registry.catalog_etag:
+        return Response(status_code=304, headers=headers)
+    return Response(content=tool_registry.catalog_json, media_type="application/json", headers=headers)
+
+@app.get("/api/gateway/pool")
+async def gateway_pool_stats():
+    """Connection pool statistics for sizing HTTP_POOL_* settings"""
+    return {
+        "timestamp": datetime.now().isoformat(),
+        "pools": service_clients.stats()
+    }
+
+@app.get("/api/gateway/artifacts")
+async def gateway_artifact_stats():
+    """Artifact readiness index (known, pending and missed downloads) and the output store"""
+    return {
+        "timestamp": datetime.now().isoformat(),
+        "artifacts": artifact_index.stats(),
+        "store": artifact_store.stats()
+    }
+
+@app.get("/api/gateway/admission")
+async def gateway_admission_stats():
+    """In-flight and queued requests per service and tool, for tuning ADMISSION_* limits
+
+    Limits are this worker's share of the host-wide ADMISSION_* settings.
+    """
+    return {
+        "timestamp": datetime.now().isoformat(),
+        "worker_pid": os.getpid(),
+        "gateway_workers": settings.GATEWAY_WORKERS,
+        **admission.stats()
+    }
+
+@app.get("/api/gateway/retries")
+async def gateway_retry_budget_stats():
+    """Requests, retries and budget rejections per service"""
+    return {
+        "timestamp": datetime.now().isoformat(),
+        "services": retry_budgets.stats()
     }
 
+@app.get("/api/gateway/rate-limits")
+async def gateway_rate_limit_stats():
+    """Tracked clients and rejections per rate-limit rule"""
+    return {
+        "timestamp": datetime.now().isoformat(),
+        "worker_pid": os.getpid(),
+        "shared_state": shared_state.stats() if shared_state is not None else None,
+        "rules": rate_limiter.stats()
+    }
+
+@app.get("/metrics")
+async def prometheus_metrics():
+    """Gateway metrics in the Prometheus text format"""
+    return metrics_registry.response()
+
 # PDF Tools Endpoints
 @app.post("/api/tools/pdf-{tool_name}")
-async def process_pdf_tool(
-    tool_name: str,
-    files: List[UploadFile] = File([]),
-    metadata: Optional[str] = Form(None)
-):
+async def process_pdf_tool(tool_name: str, request: Request):
     """Route PDF tools to PDF microservice"""
-    return await route_to_microservice("pdf", f"pdf-{tool_name}", files, metadata)
+    return await process_tool_routing(f"pdf-{tool_name}", request)
 
 @app.get("/api/tools/download/{filename}")
-async def download_processed_file(filename: str):
+async def download_processed_file(filename: str, request: Request):
     """Download processed files from any microservice"""
     # Security validation
     if '..' in filename or '/' in filename or '\\' in filename:
         raise HTTPException(status_code=400, detail="Invalid filename")
 
-    static_dir = os.path.abspath("../static")
-    file_path = os.path.join(static_dir, filename)
-
-    print(f"🔍 Searching for file: {file_path}")
-
     try:
-        if not os.path.exists(file_path):
-            # Check if file is being processed (wait up to 5 seconds)
-            for i in range(10):
-                if os.path.exists(file_path):
-                    break
-                await asyncio.sleep(0.5)
-
-            if not os.path.exists(file_path):
-                print(f"❌ File not found: {file_path}")
-                available_files = os.listdir(static_dir) if os.path.exists(static_dir) else []
-                print(f"📁 Files in static directory: {available_files}")
-                raise HTTPException(
-                    status_code=404, 
-                    detail=f"File not found: {filename}. Available files: {len(available_files)}"
-                )
+        # Known outputs answer at once; pending ones wait on their readiness event
+        artifact = await artifact_index.wait_ready(filename, settings.ARTIFACT_WAIT_SECONDS)
+        if artifact is None:
+            print(f"❌ File not found: {filename}")
+            raise HTTPException(status_code=404, detail=f"File not found: {filename}")
+        file_path = artifact_index.path_for(filename)
 
         # Validate file is not corrupted
-        file_size = os.path.getsize(file_path)
+        file_size = artifact["size"]
         if file_size == 0:
             raise HTTPException(status_code=422, detail="File is empty or corrupted")
 
@@ -301,24 +472,18 @@ async def download_processed_file(filename: str):
         media_type = media_types.get(file_ext, 'application/octet-stream')
 
         print(f"✅ Serving file: {filename} ({file_size} bytes) as {media_type}")
+        artifact_store.touch(filename)
 
-        # Additional security headers
+        # Outputs are immutable: strong ETag, conditional GET and Range support
         headers = {
             "Content-Disposition": f"attachment; filename={filename}",
-            "Content-Length": str(file_size),
-            "Cache-Control": "no-cache, no-store, must-revalidate",
-            "Pragma": "no-cache",
-            "Expires": "0",
             "X-Content-Type-Options": "nosniff"
         }
 
-        return FileResponse(
-            path=file_path,
-            media_type=media_type,
-            filename=filename,
-            headers=headers
-        )
+        return file_download_response(request, file_path, artifact["stat"], media_type, filename, headers)
 
+    except HTTPException:
+        raise
     except PermissionError:
         raise HTTPException(status_code=403, detail="Permission denied accessing file")
     except OSError as e:
@@ -329,60 +494,220 @@ async def download_processed_file(filename: str):
 
 # All Tools Endpoints (Fixed routing)
 @app.post("/tools/{tool_name}")
-async def route_tool_request(
-    tool_name: str,
-    files: List[UploadFile] = File([]),
-    metadata: Optional[str] = Form(None)
-):
+async def route_tool_request(tool_name: str, request: Request):
     """Route tool requests to appropriate microservice"""
-    return await process_tool_routing(tool_name, files, metadata)
+    return await process_tool_routing(tool_name, request)
 
 @app.post("/api/tools/{tool_name}")
-async def process_tool_routing(
-    tool_name: str,
-    files: List[UploadFile] = File([]),
-    metadata: Optional[str] = Form(None)
-):
-    """Route image tools to Image microservice"""
-    image_tools = ["bg-remover", "image-resizer", "image-compressor", "image-converter", 
-                   "image-flipper", "image-rotator", "image-cropper", "image-filter",
-                   "image-blur", "image-sharpen", "image-brightness", "image-contrast",
-                   "image-saturation", "image-watermark", "image-border", "image-frames",
-                   "meme-generator", "image-collage", "image-metadata-extractor", "image-optimizer"]
-
-    if tool_name in image_tools:
-        return await route_to_microservice("image", tool_name, files, metadata)
-
-    # Check other categories
-    media_tools = ["audio-converter", "video-converter", "audio-trimmer", "video-trimmer",
-                   "audio-extractor", "video-extractor", "audio-merger", "video-merger",
-                   "volume-changer", "speed-changer", "pitch-changer", "audio-reverser",
-                   "video-reverser", "noise-reducer", "echo-remover", "audio-normalizer",
-                   "video-resizer", "video-cropper", "subtitle-extractor", "gif-maker",
-                   "vocal-remover", "audio-compressor", "video-compressor", "gif-to-video",
-                   "video-to-gif", "video-stabilizer", "audio-enhancer"]
-
-    if tool_name in media_tools:
-        return await route_to_microservice("media", tool_name, files, metadata)
-
-    government_tools = ["pan-validator", "gst-validator", "aadhaar-validator", "aadhaar-masker",
-                       "pan-masker", "bank-validator", "ifsc-validator", "pincode-validator",
-                       "voter-id-validator", "passport-validator", "driving-license-validator",
-                       "income-certificate", "caste-certificate", "domicile-certificate", 
-                       "character-certificate", "birth-certificate", "death-certificate",
-                       "ration-card-status", "shop-act-licence-validator"]
-
-    if tool_name in government_tools:
-        return await route_to_microservice("government", tool_name, files, metadata)
-
-    developer_tools = ["json-formatter", "base64-encoder", "hash-generator", "password-generator",
-                      "qr-generator", "color-picker", "lorem-ipsum", "url-encoder",
-                      "timestamp-converter", "regex-tester", "markdown-to-html", "css-minifier", "js-minifier"]
-
-    if tool_name in developer_tools:
-        return await route_to_microservice("developer", tool_name, files, metadata)
-
-    raise HTTPException(status_code=404, detail=f"Tool {tool_name} not found")
+async def process_tool_routing(tool_name: str, request: Request):
+    """Route a tool request to its microservice via the tool registry"""
+    spec = tool_registry.get(tool_name)
+    if spec is None:
+        raise HTTPException(status_code=404, detail=f"Tool {tool_name} not found")
+    if "text/event-stream" in request.headers.get("accept", ""):
+        return await stream_tool_events(spec, request)
+    return await proxy_tool_request(spec, request)
+
+async def stream_tool_events(spec: ToolSpec, request: Request):
+    """Run a tool request and answer with Server-Sent Events (clients sending Accept: text/event-stream)
+
+    "progress" events carry the service's stage, percent and byte/page
+    counters as it reports them; the last event is "done" with the tool
+    result or "error" with status and detail. The response starts with the
+    first event, once the upload has been read, so errors before any
+    progress (size limits, admission, rate limits) keep their HTTP status.
+    """
+    events: asyncio.Queue = asyncio.Queue()
+
+    def relay(event: dict):
+        events.put_nowait(("progress", {key: value for key, value in event.items() if key != "event"}))
+
+    async def run():
+        try:
+            events.put_nowait(("done", await proxy_tool_request(spec, request, on_progress=relay)))
+        except HTTPException as e:
+            events.put_nowait(("error", e))
+        except Exception as e:
+            logger.error(f"Tool event stream for {spec.name} failed: {str(e)}")
+            events.put_nowait(("error", HTTPException(status_code=500, detail="An unexpected error occurred during processing")))
+
+    task = asyncio.create_task(run())
+    try:
+        first = await events.get()
+    except asyncio.CancelledError:
+        task.cancel()
+        raise
+    if first[0] == "error":
+        raise first[1]
+
+    async def stream():
+        kind, data = first
+        try:
+            while True:
+                if kind == "error":
+                    yield format_sse("error", {"status": data.status_code, "detail": data.detail})
+                    return
+                yield format_sse(kind, data)
+                if kind == "done":
+                    return
+                kind, data = await events.get()
+        finally:
+            # Client gone before the result: stop the proxied request too
+            if not task.done():
+                task.cancel()
+
+    return StreamingResponse(
+        stream(),
+        media_type="text/event-stream",
+        headers={"Cache-Control": "no-cache", "X-Accel-Buffering": "no"},
+    )
+
+# Asynchronous Job Endpoints
+@app.post("/api/jobs/{tool_name}", status_code=202)
+async def submit_tool_job(tool_name: str, request: Request):
+    """Accept a tool upload, spool it to disk and return a job id immediately"""
+    spec = tool_registry.get(tool_name)
+    if spec is None:
+        raise HTTPException(status_code=404, detail=f"Unknown tool: {tool_name}")
+    check_content_length(request, spec.max_total_size + MULTIPART_OVERHEAD)
+    if job_queue.is_full():
+        raise HTTPException(
+            status_code=503,
+            detail="Job queue is full. Please try again later.",
+            headers={"Retry-After": "5"}
+        )
+
+    with span("upload"):
+        body_path = await spool_request_body(spec, request)
+    content_type = request.headers.get("content-type", "")
+    headers = {"Content-Type": content_type, **forwarded_headers(request)}
+    if current_request_id():
+        headers["X-Request-ID"] = current_request_id()
+    job = Job(tool_name, {"body_path": body_path, "headers": headers})
+    try:
+        job_queue.submit(job)
+    except QueueFullError:
+        os.remove(body_path)
+        raise HTTPException(
+            status_code=503,
+            detail="Job queue is full. Please try again later.",
+            headers={"Retry-After": "5"}
+        )
+
+    logger.info(f"Job {job.id} queued for {tool_name} ({os.path.getsize(body_path)} bytes)")
+    return {
+        "jobId": job.id,
+        "status": job.status,
+        "statusUrl": f"/api/jobs/{job.id}",
+        "eventsUrl": f"/api/jobs/{job.id}/events",
+    }
+
+@app.get("/api/jobs")
+async def job_queue_stats():
+    """Queue depth, worker usage and wait/run times for the job API"""
+    return {
+        "timestamp": datetime.now().isoformat(),
+        "queue": job_queue.stats()
+    }
+
+@app.get("/api/jobs/{job_id}")
+async def get_job_status(job_id: str):
+    """Poll a job; finished jobs carry the tool result and download URL"""
+    job = job_queue.lookup(job_id)
+    if job is None:
+        raise HTTPException(status_code=404, detail="Job not found or expired")
+    return job
+
+@app.get("/api/jobs/{job_id}/events")
+async def stream_job_events(job_id: str):
+    """Server-Sent Events for a job: stage, progress and byte/page counters as the service reports them
+
+    Sends a "progress" event on every change and a final "done" event with
+    the finished job (result or error), then closes.
+    """
+    if job_queue.lookup(job_id) is None:
+        raise HTTPException(status_code=404, detail="Job not found or expired")
+
+    async def events():
+        async for data in job_queue.watch(job_id):
+            if data is None:
+                yield ": keepalive\n\n"
+            else:
+                yield format_sse("done" if data.get("finishedAt") is not None else "progress", data)
+
+    return StreamingResponse(
+        events(),
+        media_type="text/event-stream",
+        headers={"Cache-Control": "no-cache", "X-Accel-Buffering": "no"},
+    )
+
+async def spool_request_body(spec: ToolSpec, request: Request) -> str:
+    """Write the raw request body to JOB_SPOOL_DIR, validating multipart uploads on the way"""
+    max_body_size = spec.max_total_size + MULTIPART_OVERHEAD
+    boundary = get_boundary(request.headers.get("content-type", ""))
+    if boundary:
+        inspector = MultipartInspector(
+            boundary,
+            validate_file_security,
+            max_file_size=spec.max_file_size,
+            max_total_size=spec.max_total_size,
+        )
+        chunks = inspected_body(request, inspector, max_body_size)
+    else:
+        chunks = request.stream()
+
+    fd, body_path = tempfile.mkstemp(prefix="job_", suffix=".body", dir=settings.JOB_SPOOL_DIR)
+    received = 0
+    try:
+        with os.fdopen(fd, "wb") as f:
+            async for chunk in chunks:
+                received += len(chunk)
+                if received > max_body_size:
+                    raise HTTPException(status_code=413, detail="Request body too large")
+                f.write(chunk)
+    except BaseException:
+        os.remove(body_path)
+        raise
+    return body_path
+
+async def read_spooled_body(path: str, chunk_size: int = 1024 * 1024):
+    with open(path, "rb") as f:
+        while chunk := f.read(chunk_size):
+            yield chunk
+
+async def run_tool_job(job: Job) -> dict:
+    """Job worker body: forward the spooled upload and remove it afterwards"""
+    spec = tool_registry.get(job.tool_name)
+    body_path = job.payload["body_path"]
+    request_id = job.payload["headers"].get("X-Request-ID") or f"job_{job.id[:12]}_{spec.name}"
+    trace = Trace(request_id, "gateway", f"job {spec.name}")
+    try:
+        size = os.path.getsize(body_path)
+        headers = {**job.payload["headers"], "X-Request-ID": request_id, "Content-Length": str(size)}
+        # Job workers already bound the backlog; wait for a slot as long as the job may run
+        with activate(trace):
+            async with admission.admit(spec, size, timeout=settings.JOB_TIMEOUT_SECONDS):
+                job.set_stage("processing", 30)
+                return await post_body_to_microservice(
+                    spec, request_id, read_spooled_body(body_path), headers,
+                    timeout=settings.JOB_TIMEOUT_SECONDS,
+                    on_progress=lambda event: report_job_progress(job, event),
+                )
+    finally:
+        try:
+            os.remove(body_path)
+        except OSError:
+            pass
+        if trace_exporter() is not None:
+            trace_exporter().export(trace)
+
+def report_job_progress(job: Job, event: dict):
+    """Map a service progress line onto the job: service work spans 30-95%"""
+    job.set_stage(
+        event.get("stage", "processing"),
+        30 + int(event.get("percent", 0)) * 65 // 100,
+        {name: event[name] for name in COUNTERS if name in event},
+    )
 
 def validate_file_security(filename: str, content: bytes) -> bool:
     """Validate file for security threats"""
@@ -411,17 +736,287 @@ def validate_file_security(filename: str, content: bytes) -> bool:
 
     return True
 
-async def route_to_microservice(service: str, tool_name: str, files: List[UploadFile], metadata: Optional[str]):
+async def proxy_tool_request(spec: ToolSpec, request: Request, on_progress: Optional[Callable[[dict], None]] = None):
+    """Forward a tool upload, streaming multipart bodies when enabled
+
+    With on_progress the service is asked for progress lines, passed on as they arrive.
+    """
+    check_content_length(request, spec.max_total_size + MULTIPART_OVERHEAD)
+
+    content_length = request.headers.get("content-length", "")
+    size = int(content_length) if content_length.isdigit() else 0
+    async with admission.admit(spec, size):
+        content_type = request.headers.get("content-type", "")
+        if spec.service in HANDOFF_SERVICES and get_boundary(content_type):
+            return await handoff_to_microservice(spec, request, on_progress)
+        if settings.GATEWAY_STREAM_UPLOADS and get_boundary(content_type):
+            return await stream_to_microservice(spec, request, on_progress)
+
+        with span("upload"):
+            form = await request.form()
+        files = [item for item in form.getlist("files") if not isinstance(item, str)]
+        metadata = form.get("metadata")
+        return await route_to_microservice(
+            spec, files, metadata if isinstance(metadata, str) else None, forwarded_headers(request), on_progress
+        )
+
+def record_artifact(result):
+    """Register the output file named in a microservice result with the artifact index"""
+    if isinstance(result, dict):
+        url = result.get("downloadUrl") or result.get("download_url") or ""
+        for prefix in ("/static/", "/api/tools/download/"):
+            if url.startswith(prefix):
+                artifact_index.publish(url[len(prefix):])
+                break
+    return result
+
+def forwarded_headers(request: Request) -> Dict[str, str]:
+    """Client headers that microservices act on (e.g. X-Skip-Cache)"""
+    return {name: request.headers[name] for name in FORWARDED_HEADERS if name in request.headers}
+
+def is_job_time_limit(response: httpx.Response) -> bool:
+    """A service's own 504: the job ran past its time limit
+
+    The service answered, so this is not a failure for the circuit breaker,
+    and the same input would only time out again, so it is not retried.
+    """
+    return response.status_code == 504
+
+def raise_for_service_error(request_id: str, response: httpx.Response):
+    """Translate a non-retryable error response from a microservice"""
+    if response.status_code == 400:
+        error_detail = "Invalid request parameters"
+        try:
+            error_data = response.json()
+            error_detail = error_data.get("detail", error_detail)
+        except:
+            pass
+        logger.warning(f"[{request_id}] Bad request: {error_detail}")
+        raise HTTPException(status_code=400, detail=error_detail)
+
+    elif response.status_code == 413:
+        logger.warning(f"[{request_id}] File too large")
+        raise HTTPException(status_code=413, detail="File size exceeds service limits")
+
+    elif response.status_code == 415:
+        logger.warning(f"[{request_id}] Unsupported media type")
+        raise HTTPException(status_code=415, detail="Unsupported file type for this tool")
+
+    elif response.status_code == 409:
+        # Handed-off or staged input the service cannot see; callers fall back to uploading it
+        logger.warning(f"[{request_id}] Service could not find the referenced input")
+        raise HTTPException(status_code=409, detail="Input not found by the processing service")
+
+    elif response.status_code == 403:
+        # Handoff signature the service does not accept (UPLOAD_HANDOFF_SECRET differs); fall back like 409
+        logger.error(f"[{request_id}] Service rejected the input handoff signature")
+        raise HTTPException(status_code=409, detail="Input not found by the processing service")
+
+    elif response.status_code == 504:
+        error_detail = "Processing timeout - file might be too large or complex"
+        try:
+            error_detail = response.json().get("detail", error_detail)
+        except:
+            pass
+        logger.warning(f"[{request_id}] Processing time limit exceeded: {error_detail}")
+        raise HTTPException(status_code=504, detail=error_detail)
+
+    elif response.status_code == 422:
+        error_detail = "Invalid input parameters"
+        try:
+            error_data = response.json()
+            error_detail = error_data.get("detail", error_detail)
+        except:
+            pass
+        logger.warning(f"[{request_id}] Validation error: {error_detail}")
+        raise HTTPException(status_code=422, detail=error_detail)
+
+    response_text = response.text[:200] if response.text else "No response text"
+    logger.error(f"[{request_id}] Unexpected status {response.status_code}: {response_text}")
+    raise HTTPException(
+        status_code=response.status_code, 
+        detail=f"Service returned unexpected status: {response.status_code}"
+    )
+
+async def stream_to_microservice(spec: ToolSpec, request: Request, on_progress: Optional[Callable[[dict], None]] = None):
+    """Stream a multipart upload to a microservice without buffering it
+
+    Each chunk is inspected (size limits, security sniff of the first bytes of
+    every file, metadata JSON) before it is forwarded. The body can only be
+    sent once, so this path does not retry.
+    """
+    request_id = current_request_id() or f"{spec.service}_{spec.name}_{datetime.now().strftime('%Y%m%d_%H%M%S')}"
+    logger.info(f"[{request_id}] Streaming request for {spec.name} via {spec.service} service")
+
+    content_type = request.headers["content-type"]
+    inspector = MultipartInspector(
+        get_boundary(content_type),
+        validate_file_security,
+        max_file_size=spec.max_file_size,
+        max_total_size=spec.max_total_size,
+    )
+    headers = {"Content-Type": content_type, "X-Request-ID": request_id, **forwarded_headers(request)}
+    if request.headers.get("content-length"):
+        headers["Content-Length"] = request.headers["content-length"]
+
+    try:
+        result = await post_body_to_microservice(
+            spec, request_id,
+            inspected_body(request, inspector, spec.max_total_size + MULTIPART_OVERHEAD),
+            headers,
+            on_progress=on_progress,
+        )
+    except HTTPException as e:
+        if e.status_code in (400, 413):
+            logger.warning(f"[{request_id}] Upload rejected while streaming: {e.detail}")
+        raise
+
+    for i, info in enumerate(inspector.files):
+        logger.info(f"[{request_id}] File {i+1}: {info['filename']} ({info['size']} bytes, {info['content_type']})")
+    return result
+
+async def handoff_to_microservice(spec: ToolSpec, request: Request, on_progress: Optional[Callable[[dict], None]] = None):
+    """Spool a multipart upload once into UPLOAD_HANDOFF_DIR and send the service only its paths
+
+    The upload is validated while it is written, so services read exactly the
+    bytes the gateway checked. A service that cannot see the spool directory
+    answers 409 and gets the files as a regular upload instead.
+    """
+    request_id = current_request_id() or f"{spec.service}_{spec.name}_{datetime.now().strftime('%Y%m%d_%H%M%S')}"
+    logger.info(f"[{request_id}] Handing off request for {spec.name} to {spec.service} service")
+
+    spooler = MultipartSpooler(
+        get_boundary(request.headers["content-type"]),
+        validate_file_security,
+        settings.UPLOAD_HANDOFF_DIR,
+        max_file_size=spec.max_file_size,
+        max_total_size=spec.max_total_size,
+    )
+    try:
+        try:
+            with span("upload"):
+                async for _ in inspected_body(request, spooler, spec.max_total_size + MULTIPART_OVERHEAD):
+                    pass
+        except OSError as e:
+            logger.error(f"[{request_id}] Could not spool upload for handoff: {str(e)}")
+            raise HTTPException(status_code=503, detail="Upload storage is temporarily unavailable")
+
+        for i, info in enumerate(spooler.files):
+            logger.info(f"[{request_id}] File {i+1}: {info['filename']} ({info['size']} bytes, {info['content_type']})")
+
+        metadata = spooler.fields.get("metadata")
+        body = urlencode({"metadata": metadata} if metadata is not None else {}).encode()
+        headers = {
+            "Content-Type": "application/x-www-form-urlencoded",
+            "X-Request-ID": request_id,
+            HANDOFF_HEADER: spooler.manifest(),
+            **forwarded_headers(request),
+        }
+        # Every attempt resends only the manifest; the spooled files stay until cleanup()
+        try:
+            return await send_with_retries(
+                spec, request_id,
+                lambda client, attempt: post_tool(client, spec.name, headers, get_proxy_timeout(spec.service),
+                                                  on_progress, content=body),
+                sum(info["size"] for info in spooler.files),
+                hedge=on_progress is None,
+            )
+        except HTTPException as e:
+            if e.status_code != 409:
+                raise
+            logger.warning(f"[{request_id}] {spec.service} service cannot read handoff files, uploading them instead")
+
+        files = [
+            UploadFile(
+                file=open(info["path"], "rb"),
+                size=info["size"],
+                filename=info["filename"],
+                headers=Headers({"content-type": info["content_type"] or "application/octet-stream"}),
+            )
+            for info in spooler.files
+        ]
+        try:
+            return await route_to_microservice(spec, files, metadata, forwarded_headers(request), on_progress)
+        finally:
+            for file in files:
+                file.file.close()
+    finally:
+        spooler.cleanup()
+
+async def post_body_to_microservice(spec: ToolSpec, request_id: str, body, headers: Dict[str, str], timeout: Optional[float] = None,
+                                    on_progress: Optional[Callable[[dict], None]] = None):
+    """Send a raw (possibly streamed) request body to /process/{tool} exactly once
+
+    Shared by the streaming proxy and the job workers; maps transport errors
+    and service statuses to gateway errors and feeds the circuit breaker.
+    With on_progress the service is asked for progress lines, which are
+    passed on as they arrive.
+    """
+    service, tool_name = spec.service, spec.name
+    if service not in MICROSERVICES:
+        logger.error(f"[{request_id}] Service {service} not found in MICROSERVICES")
+        raise HTTPException(status_code=503, detail=f"Service {service} is currently unavailable. Please start all microservices first.")
+    if timeout is None:
+        timeout = get_proxy_timeout(service)
+
+    breaker = health_monitor.breaker(service)
+    if not breaker.allow_request():
+        retry_after = max(1, int(breaker.retry_after() + 0.999))
+        logger.warning(f"[{request_id}] Circuit open for {service}, failing fast")
+        raise HTTPException(
+            status_code=503,
+            detail=f"Service {service} is temporarily unavailable. Please try again later.",
+            headers={"Retry-After": str(retry_after)}
+        )
+
+    try:
+        start_time = datetime.now()
+        with span("proxy"):
+            response = await post_tool(
+                service_clients.client(service), tool_name, headers, timeout, on_progress, content=body
+            )
+        processing_time = (datetime.now() - start_time).total_seconds()
+        record_downstream(response.headers.get("server-timing"), service)
+    except httpx.TimeoutException:
+        breaker.record_failure()
+        logger.error(f"[{request_id}] Request timeout")
+        raise HTTPException(status_code=504, detail="Processing timeout - file might be too large or complex")
+    except httpx.NetworkError as e:
+        breaker.record_failure()
+        logger.error(f"[{request_id}] Network error: {str(e)}")
+        raise HTTPException(status_code=502, detail="Network error connecting to processing service")
+
+    logger.info(f"[{request_id}] Response received: {response.status_code} ({processing_time:.2f}s)")
+
+    if response.status_code >= 500 and not is_job_time_limit(response):
+        breaker.record_failure()
+        logger.error(f"[{request_id}] Server error {response.status_code}")
+        raise HTTPException(status_code=502, detail="Processing service encountered an error")
+    breaker.record_success()
+
+    if response.status_code == 200:
+        try:
+            return record_artifact(response.json())
+        except json.JSONDecodeError as e:
+            logger.error(f"[{request_id}] Invalid JSON response: {str(e)}")
+            raise HTTPException(status_code=502, detail="Invalid response format from processing service")
+    if response.status_code == 429:
+        raise HTTPException(status_code=429, detail="Service is busy, please try again later")
+    raise_for_service_error(request_id, response)
+
+async def route_to_microservice(spec: ToolSpec, files: List[UploadFile], metadata: Optional[str], headers: Optional[Dict[str, str]] = None,
+                               on_progress: Optional[Callable[[dict], None]] = None):
     """Route request to appropriate microservice with enhanced error handling"""
-    request_id = f"{service}_{tool_name}_{datetime.now().strftime('%Y%m%d_%H%M%S')}"
+    service, tool_name = spec.service, spec.name
+    request_id = current_request_id() or f"{service}_{tool_name}_{datetime.now().strftime('%Y%m%d_%H%M%S')}"
     logger.info(f"[{request_id}] Processing request for {tool_name} via {service} service")
 
-    service_url = MICROSERVICES.get(service)
-    if not service_url:
+    if service not in MICROSERVICES:
         logger.error(f"[{request_id}] Service {service} not found in MICROSERVICES")
         raise HTTPException(status_code=503, detail=f"Service {service} is currently unavailable. Please start all microservices first.")
 
     # Enhanced file validation with detailed logging
+    validate_start = time.perf_counter()
     total_size = 0
     files_data = []
 
@@ -439,17 +1034,17 @@ async def route_to_microservice(service: str, tool_name: str, files: List[Upload
             logger.info(f"[{request_id}] File {i+1}: {file.filename} ({file_size} bytes, {file.content_type})")
 
             # Individual file size check
-            if file_size > 50 * 1024 * 1024:  # 50MB limit
+            if file_size > spec.max_file_size:
                 raise HTTPException(
                     status_code=413, 
-                    detail=f"File '{file.filename}' is too large ({file_size/1024/1024:.1f}MB). Maximum allowed: 50MB"
+                    detail=f"File '{file.filename}' is too large ({file_size/1024/1024:.1f}MB). Maximum allowed: {spec.max_file_size // (1024 * 1024)}MB"
                 )
 
             # Total size check
-            if total_size > 100 * 1024 * 1024:  # 100MB total limit
+            if total_size > spec.max_total_size:
                 raise HTTPException(
                     status_code=413, 
-                    detail=f"Total file size ({total_size/1024/1024:.1f}MB) exceeds 100MB limit"
+                    detail=f"Total file size ({total_size/1024/1024:.1f}MB) exceeds {spec.max_total_size // (1024 * 1024)}MB limit"
                 )
 
             # Validate file content (basic checks for common issues)
@@ -480,157 +1075,227 @@ async def route_to_microservice(service: str, tool_name: str, files: List[Upload
         except json.JSONDecodeError as e:
             logger.error(f"[{request_id}] Invalid metadata JSON: {str(e)}")
             raise HTTPException(status_code=400, detail=f"Invalid metadata format: {str(e)}")
+    record("validate", validate_start)
+
+    # The service stages the upload under this key; retries send only the key
+    headers = dict(headers or {})
+    headers["X-Request-ID"] = request_id
+    if files_data:
+        headers["X-Input-Key"] = input_key(files_data)
+
+    # Hedged copies would report interleaved progress; progress callers are not hedged
+    return await send_with_retries(
+        spec, request_id,
+        lambda client, attempt: post_buffered(client, tool_name, files_data, form_data, headers,
+                                              get_proxy_timeout(service),
+                                              staged=attempt > 0, on_progress=on_progress),
+        total_size,
+        hedge=on_progress is None,
+    )
 
-    # Enhanced service health check
-    async with httpx.AsyncClient(timeout=60.0) as client:
-        try:
-            start_time = datetime.now()
-            health_response = await client.get(f"{service_url}/health", timeout=10.0)
-            health_time = (datetime.now() - start_time).total_seconds()
+async def send_with_retries(spec: ToolSpec, request_id: str,
+                            send: Callable[[httpx.AsyncClient, int], Awaitable[httpx.Response]], size: int,
+                            hedge: bool = True):
+    """Send a tool request with backoff retries under the service's retry budget
 
-            if health_response.status_code != 200:
-                logger.warning(f"[{request_id}] Service {service} health check failed: {health_response.status_code}")
-                raise HTTPException(
-                    status_code=503, 
-                    detail=f"Service {service} is unhealthy (status: {health_response.status_code})"
-                )
-
-            logger.info(f"[{request_id}] Service {service} health check passed ({health_time:.2f}s)")
+    send(client, attempt) posts one attempt to the given replica; light tools
+    with small inputs are hedged on the first attempt unless hedge is False.
+    """
+    service, tool_name = spec.service, spec.name
 
-        except httpx.TimeoutException:
-            logger.error(f"[{request_id}] Service {service} health check timeout")
-            raise HTTPException(status_code=503, detail=f"Service {service} health check timeout")
-        except httpx.NetworkError as e:
-            logger.error(f"[{request_id}] Service {service} network error: {str(e)}")
-            raise HTTPException(status_code=503, detail=f"Service {service} is not responding")
-        except HTTPException:
-            raise
-        except Exception as e:
-            logger.error(f"[{request_id}] Service {service} health check error: {str(e)}")
-            raise HTTPException(status_code=503, detail=f"Service {service} health check failed")
+    # Fail fast when the circuit for this service is open; a healthy
+    # service costs no extra round trip (probing runs in the background)
+    breaker = health_monitor.breaker(service)
+    budget = retry_budgets[service]
+    budget.record_request()
+    hedge = hedge and settings.HEDGE_ENABLED and spec.cost == "light" and size <= settings.HEDGE_MAX_KB * 1024
 
-        # Enhanced processing with retries and detailed error handling
-        max_retries = 3
-        base_delay = 1.0
+    # Enhanced processing with retries and detailed error handling
+    max_retries = 3
+    base_delay = 1.0
 
-        for attempt in range(max_retries + 1):
-            try:
-                logger.info(f"[{request_id}] Attempt {attempt + 1}/{max_retries + 1} - Sending to {service_url}/process/{tool_name}")
-
-                start_time = datetime.now()
-                response = await client.post(
-                    f"{service_url}/process/{tool_name}",
-                    files=files_data,
-                    data=form_data,
-                    timeout=60.0  # Increased timeout for complex processing
+    for attempt in range(max_retries + 1):
+        try:
+            if not breaker.allow_request():
+                retry_after = max(1, int(breaker.retry_after() + 0.999))
+                logger.warning(f"[{request_id}] Circuit open for {service}, failing fast")
+                raise HTTPException(
+                    status_code=503,
+                    detail=f"Service {service} is temporarily unavailable. Please try again later.",
+                    headers={"Retry-After": str(retry_after)}
                 )
-                processing_time = (datetime.now() - start_time).total_seconds()
-
-                logger.info(f"[{request_id}] Response received: {response.status_code} ({processing_time:.2f}s)")
-
-                if response.status_code == 200:
-                    try:
-                        result = response.json()
-                        logger.info(f"[{request_id}] Processing successful")
-                        return result
-                    except json.JSONDecodeError as e:
-                        logger.error(f"[{request_id}] Invalid JSON response: {str(e)}")
-                        raise HTTPException(status_code=502, detail="Invalid response format from processing service")
-
-                elif response.status_code == 400:
-                    error_detail = "Invalid request parameters"
-                    try:
-                        error_data = response.json()
-                        error_detail = error_data.get("detail", error_detail)
-                    except:
-                        pass
-                    logger.warning(f"[{request_id}] Bad request: {error_detail}")
-                    raise HTTPException(status_code=400, detail=error_detail)
-
-                elif response.status_code == 413:
-                    logger.warning(f"[{request_id}] File too large")
-                    raise HTTPException(status_code=413, detail="File size exceeds service limits")
-
-                elif response.status_code == 415:
-                    logger.warning(f"[{request_id}] Unsupported media type")
-                    raise HTTPException(status_code=415, detail="Unsupported file type for this tool")
-
-                elif response.status_code == 422:
-                    error_detail = "Invalid input parameters"
-                    try:
-                        error_data = response.json()
-                        error_detail = error_data.get("detail", error_detail)
-                    except:
-                        pass
-                    logger.warning(f"[{request_id}] Validation error: {error_detail}")
-                    raise HTTPException(status_code=422, detail=error_detail)
-
-                elif response.status_code == 429:
-                    if attempt < max_retries:
-                        delay = base_delay * (2 ** attempt)  # Exponential backoff
-                        logger.warning(f"[{request_id}] Rate limited, retrying in {delay}s")
-                        await asyncio.sleep(delay)
-                        continue
-                    logger.error(f"[{request_id}] Rate limit exceeded after retries")
-                    raise HTTPException(status_code=429, detail="Service is busy, please try again later")
-
-                elif response.status_code >= 500:
-                    if attempt < max_retries:
-                        delay = base_delay * (2 ** attempt)
-                        logger.warning(f"[{request_id}] Server error {response.status_code}, retrying in {delay}s")
-                        await asyncio.sleep(delay)
-                        continue
-                    logger.error(f"[{request_id}] Server error {response.status_code} after retries")
-                    raise HTTPException(status_code=502, detail="Processing service encountered an error")
-                else:
-                    response_text = response.text[:200] if response.text else "No response text"
-                    logger.error(f"[{request_id}] Unexpected status {response.status_code}: {response_text}")
-                    raise HTTPException(
-                        status_code=response.status_code, 
-                        detail=f"Service returned unexpected status: {response.status_code}"
-                    )
 
-            except httpx.TimeoutException:
-                if attempt < max_retries:
-                    delay = base_delay * (2 ** attempt)
-                    logger.warning(f"[{request_id}] Request timeout, retrying in {delay}s")
+            # Every attempt (and hedge) picks the least loaded healthy replica
+            client = service_clients.client(service)
+            logger.info(f"[{request_id}] Attempt {attempt + 1}/{max_retries + 1} - Sending to {client.base_url}process/{tool_name}")
+
+            start_time = datetime.now()
+            with span("proxy", attempt=attempt + 1):
+                if attempt == 0 and hedge:
+                    response = await hedged_post(
+                        lambda: send(service_clients.client(service), 0),
+                        settings.HEDGE_DELAY_MS / 1000,
+                        budget,
+                    )
+                else:
+                    response = await send(client, attempt)
+            processing_time = (datetime.now() - start_time).total_seconds()
+            record_downstream(response.headers.get("server-timing"), service)
+
+            logger.info(f"[{request_id}] Response received: {response.status_code} ({processing_time:.2f}s)")
+
+            if response.status_code >= 500 and not is_job_time_limit(response):
+                breaker.record_failure()
+            else:
+                breaker.record_success()
+
+            if response.status_code == 200:
+                try:
+                    result = record_artifact(response.json())
+                    logger.info(f"[{request_id}] Processing successful")
+                    return result
+                except json.JSONDecodeError as e:
+                    logger.error(f"[{request_id}] Invalid JSON response: {str(e)}")
+                    raise HTTPException(status_code=502, detail="Invalid response format from processing service")
+
+            elif response.status_code == 429:
+                if attempt < max_retries and budget.try_spend():
+                    delay = base_delay * (2 ** attempt)  # Exponential backoff
+                    logger.warning(f"[{request_id}] Rate limited, retrying in {delay}s")
                     await asyncio.sleep(delay)
                     continue
-                logger.error(f"[{request_id}] Final timeout after {max_retries} retries")
-                raise HTTPException(
-                    status_code=504, 
-                    detail="Processing timeout - file might be too large or complex"
-                )
+                logger.error(f"[{request_id}] Rate limit exceeded after retries")
+                raise HTTPException(status_code=429, detail="Service is busy, please try again later")
 
-            except httpx.NetworkError as e:
-                if attempt < max_retries:
+            elif response.status_code >= 500 and not is_job_time_limit(response):
+                if attempt < max_retries and budget.try_spend():
                     delay = base_delay * (2 ** attempt)
-                    logger.warning(f"[{request_id}] Network error, retrying in {delay}s: {str(e)}")
+                    logger.warning(f"[{request_id}] Server error {response.status_code}, retrying in {delay}s")
                     await asyncio.sleep(delay)
                     continue
-                logger.error(f"[{request_id}] Network error after retries: {str(e)}")
-                raise HTTPException(
-                    status_code=502, 
-                    detail=f"Network error connecting to processing service"
-                )
+                logger.error(f"[{request_id}] Server error {response.status_code} after retries")
+                raise HTTPException(status_code=502, detail="Processing service encountered an error")
+            else:
+                raise_for_service_error(request_id, response)
 
-            except HTTPException:
-                raise
+        except httpx.TimeoutException:
+            breaker.record_failure()
+            if attempt < max_retries and budget.try_spend():
+                delay = base_delay * (2 ** attempt)
+                logger.warning(f"[{request_id}] Request timeout, retrying in {delay}s")
+                await asyncio.sleep(delay)
+                continue
+            logger.error(f"[{request_id}] Final timeout after {max_retries} retries")
+            raise HTTPException(
+                status_code=504, 
+                detail="Processing timeout - file might be too large or complex"
+            )
 
-            except Exception as e:
-                if attempt < max_retries:
-                    delay = base_delay * (2 ** attempt)
-                    logger.warning(f"[{request_id}] Unexpected error, retrying in {delay}s: {str(e)}")
-                    await asyncio.sleep(delay)
-                    continue
-                logger.error(f"[{request_id}] Unexpected error after retries: {str(e)}")
-                raise HTTPException(status_code=500, detail="An unexpected error occurred during processing")
+        except httpx.NetworkError as e:
+            breaker.record_failure()
+            if attempt < max_retries and budget.try_spend():
+                delay = base_delay * (2 ** attempt)
+                logger.warning(f"[{request_id}] Network error, retrying in {delay}s: {str(e)}")
+                await asyncio.sleep(delay)
+                continue
+            logger.error(f"[{request_id}] Network error after retries: {str(e)}")
+            raise HTTPException(
+                status_code=502, 
+                detail=f"Network error connecting to processing service"
+            )
+
+        except HTTPException:
+            raise
+
+        except Exception as e:
+            breaker.record_failure()
+            if attempt < max_retries and budget.try_spend():
+                delay = base_delay * (2 ** attempt)
+                logger.warning(f"[{request_id}] Unexpected error, retrying in {delay}s: {str(e)}")
+                await asyncio.sleep(delay)
+                continue
+            logger.error(f"[{request_id}] Unexpected error after retries: {str(e)}")
+            raise HTTPException(status_code=500, detail="An unexpected error occurred during processing")
+
+async def post_buffered(client: httpx.AsyncClient, tool_name: str, files_data: list, form_data: dict,
+                        headers: Dict[str, str], timeout: float, staged: bool = False,
+                        on_progress: Optional[Callable[[dict], None]] = None) -> httpx.Response:
+    """POST a buffered upload; staged retries refer to the input by X-Input-Key"""
+    if staged and files_data:
+        response = await post_tool(client, tool_name, headers, timeout, on_progress, data=form_data)
+        if response.status_code != 409:
+            return response
+        logger.info(f"Staged input for {tool_name} is gone, sending the files again")
+    return await post_tool(
+        client, tool_name, headers, timeout, on_progress, files=files_data, data=form_data,
+    )
+
+async def post_tool(client: httpx.AsyncClient, tool_name: str, headers: Dict[str, str], timeout: float,
+                    on_progress: Optional[Callable[[dict], None]] = None, **body) -> httpx.Response:
+    """POST to /process/{tool}; body is content= or files=/data= as for httpx"""
+    if on_progress is None:
+        return await client.post(f"/process/{tool_name}", headers=headers, timeout=timeout, **body)
+    return await post_with_progress(client, tool_name, headers, timeout, on_progress, **body)
+
+async def post_with_progress(client: httpx.AsyncClient, tool_name: str, headers: Dict[str, str],
+                             timeout: float, on_progress: Callable[[dict], None], **body) -> httpx.Response:
+    """POST asking for NDJSON progress; returns the final result or error line as a plain response
+
+    Services that do not stream progress answer normally and are returned as is.
+    """
+    request = client.build_request(
+        "POST", f"/process/{tool_name}",
+        headers={**headers, PROGRESS_HEADER: PROGRESS_STREAM}, timeout=timeout, **body,
+    )
+    response = await client.send(request, stream=True)
+    try:
+        if response.status_code != 200 or not response.headers.get("content-type", "").startswith(NDJSON_MEDIA_TYPE):
+            await response.aread()
+            return response
+        async for line in response.aiter_lines():
+            if not line.strip():
+                continue
+            try:
+                event = json.loads(line)
+            except json.JSONDecodeError:
+                return httpx.Response(502, text=f"Invalid progress line: {line[:200]}")
+            if event.get("event") == "progress":
+                on_progress(event)
+            elif event.get("event") == "result":
+                return httpx.Response(200, json=event.get("result"))
+            else:
+                return httpx.Response(event.get("status", 500), json={"detail": event.get("detail")})
+        # Stream ended without a result: the service died mid-run
+        return httpx.Response(502, text="Progress stream ended without a result")
+    finally:
+        await response.aclose()
+
+async def hedged_post(send, delay: float, budget: RetryBudget) -> httpx.Response:
+    """Send a second copy of a request that has not answered after delay; first good answer wins"""
+    first = asyncio.create_task(send())
+    done, _ = await asyncio.wait({first}, timeout=delay)
+    if done or not budget.try_spend():
+        return await first
+
+    logger.info(f"Hedging request after {delay * 1000:.0f}ms")
+    pending = {first, asyncio.create_task(send())}
+    try:
+        while pending:
+            done, pending = await asyncio.wait(pending, return_when=asyncio.FIRST_COMPLETED)
+            for task in done:
+                if task.exception() is None and task.result().status_code < 500:
+                    return task.result()
+        return first.result()
+    finally:
+        for task in pending:
+            task.cancel()
 
 # Static files and frontend serving
 dist_path = Path("../dist/public")
 if dist_path.exists():
-    app.mount("/assets", StaticFiles(directory=str(dist_path / "assets")), name="assets")
-    app.mount("/static", StaticFiles(directory=str(dist_path)), name="static")
+    app.mount("/assets", PrecompressedStaticFiles(directory=str(dist_path / "assets"),
+                                                  immutable=settings.CACHE_STATIC_FILES), name="assets")
+    app.mount("/static", PrecompressedStaticFiles(directory=str(dist_path)), name="static")
 
 # Serve the frontend index.html for SPA routing
 @app.get("/{full_path:path}")
@@ -656,9 +1321,10 @@ async def serve_frontend(full_path: str):
 @app.get("/api/download/{filename}")
 async def download_file(filename: str):
     """Download processed files"""
-    file_path = f"../static/{filename}"
-    if not os.path.exists(file_path):
+    file_path = artifact_store.locate(filename)
+    if file_path is None:
         raise HTTPException(status_code=404, detail="File not found")
+    artifact_store.touch(filename)
 
     return FileResponse(
         path=file_path,
@@ -710,7 +1376,7 @@ if __name__ == "__main__":
             reload=False,  # Disable reload to prevent crashes
             log_level="info",
             access_log=True,
-            workers=1
+            workers=settings.GATEWAY_WORKERS
         )
     except OSError as e:
         if "Address already in use" in str(e):
@@ -721,7 +1387,8 @@ if __name__ == "__main__":
                     host="0.0.0.0",
                     port=5001,
                     reload=False,
-                    log_level="info"
+                    log_level="info",
+                    workers=settings.GATEWAY_WORKERS
                 )
             except Exception as fallback_error:
                 print(f"❌ Fallback port also failed: {fallback_error}")
@@ -0,0 +1,321 @@
+"""
+Prometheus Metrics
+Dependency-free counters, gauges and histograms rendered in the Prometheus
+text format, plus a pure ASGI middleware for per-tool HTTP metrics
+"""
+import time
+from bisect import bisect_left
+from typing import Callable, Dict, Iterable, List, Optional, Sequence, Tuple
+
+from starlette.responses import Response
+from starlette.types import ASGIApp, Message, Receive, Scope, Send
+
+CONTENT_TYPE = "text/plain; version=0.0.4; charset=utf-8"
+MAX_CACHED_PATHS = 4096
+LATENCY_BUCKETS = (0.005, 0.01, 0.025, 0.05, 0.1, 0.25, 0.5, 1.0, 2.5, 5.0, 10.0, 30.0, 60.0, 120.0)
+
+
+def _escape(value: str) -> str:
+    return str(value).replace("\\", "\\\\").replace("\n", "\\n").replace('"', '\\"')
+
+
+def _format_labels(names: Sequence[str], values: Sequence[str], *extra: str) -> str:
+    pairs = [f'{name}="{_escape(value)}"' for name, value in zip(names, values)]
+    pairs.extend(label for label in extra if label)
+    return "{" + ",".join(pairs) + "}" if pairs else ""
+
+
+def _format_value(value: float) -> str:
+    if value == float("inf"):
+        return "+Inf"
+    if float(value).is_integer():
+        return str(int(value))
+    return repr(float(value))
+
+
+class _CounterChild:
+    __slots__ = ("value",)
+
+    def __init__(self):
+        self.value = 0.0
+
+    def inc(self, amount: float = 1.0):
+        self.value += amount
+
+
+class _GaugeChild(_CounterChild):
+    __slots__ = ()
+
+    def dec(self, amount: float = 1.0):
+        self.value -= amount
+
+    def set(self, value: float):
+        self.value = value
+
+
+class _HistogramChild:
+    __slots__ = ("buckets", "counts", "sum")
+
+    def __init__(self, buckets: Tuple[float, ...]):
+        self.buckets = buckets
+        self.counts = [0] * (len(buckets) + 1)
+        self.sum = 0.0
+
+    def observe(self, value: float):
+        self.counts[bisect_left(self.buckets, value)] += 1
+        self.sum += value
+
+
+class _Metric:
+    kind = "untyped"
+
+    def __init__(self, name: str, documentation: str, labelnames: Sequence[str] = ()):
+        self.name = name
+        self.documentation = documentation
+        self.labelnames = tuple(labelnames)
+
+    def _header(self) -> List[str]:
+        return [f"# HELP {self.name} {self.documentation}", f"# TYPE {self.name} {self.kind}"]
+
+
+class _LabeledMetric(_Metric):
+    """Metric holding one child_type instance per label combination"""
+
+    def __init__(self, name: str, documentation: str, labelnames: Sequence[str] = ()):
+        super().__init__(name, documentation, labelnames)
+        self._children: Dict[Tuple[str, ...], object] = {}
+
+    def _new_child(self):
+        return self.child_type()
+
+    def labels(self, *values: str):
+        """Child for one label combination (cached, so hot paths pay a dict lookup)"""
+        child = self._children.get(values)
+        if child is None:
+            child = self._children[values] = self._new_child()
+        return child
+
+    def render(self, const: str = "") -> List[str]:
+        lines = self._header()
+        for values, child in self._children.items():
+            lines.append(f"{self.name}{_format_labels(self.labelnames, values, const)} {_format_value(child.value)}")
+        return lines
+
+
+class Counter(_LabeledMetric):
+    kind = "counter"
+    child_type = _CounterChild
+
+
+class Gauge(_LabeledMetric):
+    kind = "gauge"
+    child_type = _GaugeChild
+
+
+class Histogram(_LabeledMetric):
+    kind = "histogram"
+
+    def __init__(self, name: str, documentation: str, labelnames: Sequence[str] = (),
+                 buckets: Sequence[float] = LATENCY_BUCKETS):
+        super().__init__(name, documentation, labelnames)
+        self.buckets = tuple(sorted(buckets))
+
+    def _new_child(self):
+        return _HistogramChild(self.buckets)
+
+    def render(self, const: str = "") -> List[str]:
+        lines = self._header()
+        for values, child in self._children.items():
+            cumulative = 0
+            for bound, count in zip(self.buckets + (float("inf"),), child.counts):
+                cumulative += count
+                le = 'le="' + _format_value(bound) + '"'
+                lines.append(f"{self.name}_bucket{_format_labels(self.labelnames, values, const, le)} {cumulative}")
+            labels = _format_labels(self.labelnames, values, const)
+            lines.append(f"{self.name}_sum{labels} {_format_value(child.sum)}")
+            lines.append(f"{self.name}_count{labels} {cumulative}")
+        return lines
+
+
+class CallbackMetric(_Metric):
+    """Counter or gauge whose samples are read from existing state at scrape time"""
+
+    def __init__(self, name: str, documentation: str, labelnames: Sequence[str],
+                 collect: Callable[[], Iterable[Tuple[Sequence[str], float]]], kind: str = "gauge"):
+        super().__init__(name, documentation, labelnames)
+        self.kind = kind
+        self.collect = collect
+
+    def render(self, const: str = "") -> List[str]:
+        lines = self._header()
+        for values, value in self.collect():
+            lines.append(f"{self.name}{_format_labels(self.labelnames, values, const)} {_format_value(value)}")
+        return lines
+
+
+class MetricsRegistry:
+    """Metrics of one process; const_labels() adds labels to every sample at scrape time
+
+    With several gateway workers each one keeps its own counters, so a
+    worker label (its pid) keeps every scrape's series monotonic and lets
+    Prometheus sum them across workers.
+    """
+
+    def __init__(self, const_labels: Optional[Callable[[], Dict[str, str]]] = None):
+        self.metrics: List[_Metric] = []
+        self.const_labels = const_labels
+
+    def register(self, metric: _Metric) -> _Metric:
+        self.metrics.append(metric)
+        return metric
+
+    def counter(self, name: str, documentation: str, labelnames: Sequence[str] = ()) -> Counter:
+        return self.register(Counter(name, documentation, labelnames))
+
+    def gauge(self, name: str, documentation: str, labelnames: Sequence[str] = ()) -> Gauge:
+        return self.register(Gauge(name, documentation, labelnames))
+
+    def histogram(self, name: str, documentation: str, labelnames: Sequence[str] = (),
+                  buckets: Sequence[float] = LATENCY_BUCKETS) -> Histogram:
+        return self.register(Histogram(name, documentation, labelnames, buckets))
+
+    def callback(self, name: str, documentation: str, labelnames: Sequence[str],
+                 collect: Callable[[], Iterable[Tuple[Sequence[str], float]]], kind: str = "gauge") -> CallbackMetric:
+        return self.register(CallbackMetric(name, documentation, labelnames, collect, kind))
+
+    def render(self) -> str:
+        const = ""
+        if self.const_labels is not None:
+            labels = self.const_labels()
+            const = _format_labels(tuple(labels), tuple(labels.values()))[1:-1]
+        lines = []
+        for metric in self.metrics:
+            lines.extend(metric.render(const))
+        return "\n".join(lines) + "\n"
+
+    def response(self) -> Response:
+        return Response(self.render(), media_type=CONTENT_TYPE)
+
+
+class HTTPMetrics:
+    """Request count, latency, bytes and in-flight gauges labelled by tool"""
+
+    def __init__(self, registry: MetricsRegistry, service: str):
+        self.service = service
+        self.requests = registry.counter(
+            "http_requests_total", "HTTP requests by tool, method and status", ("service", "tool", "method", "status"))
+        self.latency = registry.histogram(
+            "http_request_duration_seconds", "HTTP request latency by tool", ("service", "tool"))
+        self.bytes_in = registry.counter(
+            "http_request_bytes_total", "Request body bytes received by tool", ("service", "tool"))
+        self.bytes_out = registry.counter(
+            "http_response_bytes_total", "Response body bytes sent by tool", ("service", "tool"))
+        self.in_flight = registry.gauge(
+            "http_requests_in_flight", "Requests currently being handled", ("service",)).labels(service)
+
+
+class MetricsMiddleware:
+    """Pure ASGI middleware feeding HTTPMetrics; label_for maps a path to a bounded tool label"""
+
+    def __init__(self, app: ASGIApp, metrics: HTTPMetrics, label_for: Callable[[str], str],
+                 skip_paths: Sequence[str] = ("/metrics",)):
+        self.app = app
+        self.metrics = metrics
+        self.label_for = label_for
+        self.skip_paths = frozenset(skip_paths)
+
+    async def __call__(self, scope: Scope, receive: Receive, send: Send):
+        if scope["type"] != "http" or scope["path"] in self.skip_paths:
+            await self.app(scope, receive, send)
+            return
+
+        metrics = self.metrics
+        tool = self.label_for(scope["path"])
+        status = 500
+        bytes_in = 0
+        bytes_out = 0
+
+        async def receive_wrapper() -> Message:
+            nonlocal bytes_in
+            message = await receive()
+            if message["type"] == "http.request":
+                bytes_in += len(message.get("body", b""))
+            return message
+
+        async def send_wrapper(message: Message):
+            nonlocal status, bytes_out
+            if message["type"] == "http.response.start":
+                status = message["status"]
+            elif message["type"] == "http.response.body":
+                bytes_out += len(message.get("body", b""))
+            await send(message)
+
+        metrics.in_flight.inc()
+        start = time.perf_counter()
+        try:
+            await self.app(scope, receive_wrapper, send_wrapper)
+        finally:
+            metrics.in_flight.dec()
+            service = metrics.service
+            metrics.latency.labels(service, tool).observe(time.perf_counter() - start)
+            metrics.requests.labels(service, tool, scope["method"], str(status)).inc()
+            if bytes_in:
+                metrics.bytes_in.labels(service, tool).inc(bytes_in)
+            if bytes_out:
+                metrics.bytes_out.labels(service, tool).inc(bytes_out)
+
+
+def tool_label_for(known_tools: Iterable[str], prefixes: Sequence[str], groups: Iterable[str] = (),
+                   default: str = "other") -> Callable[[str], str]:
+    """Label function: the tool name for tool paths, else the matching group prefix
+
+    Anything else (unknown tools, scanner noise) collapses to `default`, so
+    label cardinality stays bounded whatever paths clients send.
+    """
+    known = frozenset(known_tools)
+    groups = sorted(groups, key=len, reverse=True)
+    cache: Dict[str, str] = {}
+
+    def classify(path: str) -> str:
+        for prefix in prefixes:
+            if path.startswith(prefix):
+                name = path[len(prefix):].split("/", 1)[0]
+                if name in known:
+                    return name
+        for group in groups:
+            if path == group or path.startswith(group + "/"):
+                return group
+        return default
+
+    def label_for(path: str) -> str:
+        label = cache.get(path)
+        if label is None:
+            label = classify(path)
+            if len(cache) < MAX_CACHED_PATHS:
+                cache[path] = label
+        return label
+
+    return label_for
+
+
+def instrument_service(app, service: str) -> MetricsRegistry:
+    """Add MetricsMiddleware to a microservice app; serve the returned registry at /metrics
+
+    Tools come from /process/{tool_name}; other paths are grouped by the
+    first segment of the app's own routes, read on the first request.
+    """
+    from tool_registry import registry as tool_registry
+
+    registry = MetricsRegistry()
+    label_for: Optional[Callable[[str], str]] = None
+
+    def service_label_for(path: str) -> str:
+        nonlocal label_for
+        if label_for is None:
+            segments = {route.path.split("/")[1] for route in app.routes if route.path.startswith("/")}
+            groups = ["/" + segment for segment in segments if segment and "{" not in segment]
+            label_for = tool_label_for((spec.name for spec in tool_registry.tools_for(service)), ("/process/",), groups)
+        return label_for(path)
+
+    app.add_middleware(MetricsMiddleware, metrics=HTTPMetrics(registry, service), label_for=service_label_for)
+    return registry
@@ -0,0 +1,323 @@
+"""
+Process Pool Execution Engine
+CPU-bound tool work in worker processes with per-job time and memory limits,
+so a service's event loop stays responsive and throughput scales with cores
+"""
+import asyncio
+import logging
+import multiprocessing
+import signal
+import time
+from typing import Any, Callable, List, Optional
+
+try:
+    import resource
+except ImportError:  # not available on Windows
+    resource = None
+
+from config import settings
+from tracing import record
+
+logger = logging.getLogger(__name__)
+
+
+class PoolJobError(Exception):
+    """The pool could not finish a job: time or memory limit, or the worker died"""
+
+
+class JobTimeoutError(PoolJobError):
+    pass
+
+
+class JobMemoryError(PoolJobError):
+    pass
+
+
+class WorkerCrashedError(PoolJobError):
+    pass
+
+
+class JobFailedError(Exception):
+    """The job's own code raised; carries the worker's exception text"""
+
+
+# Inside a worker process: the pipe back to the service, used for progress
+_worker_conn = None
+_last_progress = 0.0
+_pending_progress: dict = {}
+# Pool disabled: progress callback of the job running inline
+_inline_progress: Optional[Callable[..., None]] = None
+
+PROGRESS_INTERVAL = 0.05
+
+
+def report_progress(stage: Optional[str] = None, **counters):
+    """Progress from inside a pool job, passed on to the request that submitted it
+
+    Counter-only updates are sent at most every PROGRESS_INTERVAL seconds;
+    the latest held-back counters go out before the next stage change.
+    """
+    global _last_progress
+    if _worker_conn is not None:
+        now = time.monotonic()
+        if stage is None and now - _last_progress < PROGRESS_INTERVAL:
+            _pending_progress.update(counters)
+            return
+        if stage is not None and _pending_progress:
+            _worker_conn.send(("progress", dict(_pending_progress)))
+        _pending_progress.clear()
+        _last_progress = now
+        _worker_conn.send(("progress", {"stage": stage, **counters}))
+    elif _inline_progress is not None:
+        _inline_progress(stage, **counters)
+
+
+def _worker_main(conn, max_memory_bytes: int):
+    global _worker_conn
+    _worker_conn = conn
+    # The service stops its workers itself; Ctrl-C should not also hit them
+    signal.signal(signal.SIGINT, signal.SIG_IGN)
+    if max_memory_bytes and resource is not None:
+        resource.setrlimit(resource.RLIMIT_AS, (max_memory_bytes, max_memory_bytes))
+    while True:
+        try:
+            job = conn.recv()
+        except (EOFError, OSError):
+            return
+        if job is None:
+            return
+        fn, args = job
+        _pending_progress.clear()
+        try:
+            reply = ("ok", fn(*args))
+        except MemoryError:
+            reply = ("memory", None)
+        except Exception as e:
+            reply = ("error", f"{type(e).__name__}: {e}")
+        if _pending_progress:
+            conn.send(("progress", dict(_pending_progress)))
+        conn.send(reply)
+
+
+class _StageSpans:
+    """Progress callback wrapper recording each stage a job reports as a span of the current request"""
+
+    def __init__(self, on_progress: Optional[Callable[..., None]]):
+        self.on_progress = on_progress
+        self.stage: Optional[str] = None
+        self.start = 0.0
+
+    def __call__(self, stage: Optional[str] = None, **counters):
+        if stage is not None and stage != self.stage:
+            self.finish()
+            self.stage, self.start = stage, time.perf_counter()
+        if self.on_progress is not None:
+            self.on_progress(stage, **counters)
+
+    def finish(self):
+        if self.stage is not None:
+            record(self.stage, self.start)
+            self.stage = None
+
+
+class _Worker:
+    def __init__(self, context, max_memory_bytes: int):
+        self.conn, child_conn = context.Pipe()
+        self.process = context.Process(target=_worker_main, args=(child_conn, max_memory_bytes), daemon=True)
+        self.process.start()
+        child_conn.close()
+
+    def kill(self):
+        if self.process.is_alive():
+            self.process.kill()
+        self.process.join(timeout=1)
+        self.conn.close()
+
+
+class ProcessPool:
+    """Fixed set of worker processes, one job each at a time
+
+    Jobs are module-level functions with picklable arguments. A job that
+    runs past its timeout, is cancelled (e.g. the client disconnected) or
+    exceeds the memory limit (RLIMIT_AS of its worker) has its worker
+    killed and replaced; the next job starts on a fresh process. With
+    workers=0 jobs run inline on the event loop, as before the pool.
+    """
+
+    def __init__(self, workers: int, timeout: float = 120.0, max_memory_mb: int = 1024,
+                 start_method: str = "spawn"):
+        self.workers = workers
+        self.timeout = timeout
+        self.max_memory_bytes = max_memory_mb * 1024 * 1024
+        self.start_method = start_method
+        self.busy = 0
+        self.completed = 0
+        self.failed = 0
+        self.timed_out = 0
+        self.memory_exceeded = 0
+        self.cancelled = 0
+        self.crashed = 0
+        self.restarts = 0
+        self._context = None
+        self._idle: Optional[asyncio.Queue] = None
+        self._all: List[_Worker] = []
+
+    @property
+    def enabled(self) -> bool:
+        return self.workers > 0
+
+    def start(self):
+        if not self.enabled or self._idle is not None:
+            return
+        self._context = multiprocessing.get_context(self.start_method)
+        self._idle = asyncio.Queue()
+        for _ in range(self.workers):
+            self._idle.put_nowait(self._spawn())
+        logger.info(f"Process pool started with {self.workers} workers")
+
+    async def stop(self):
+        if self._idle is None:
+            return
+        for worker in self._all:
+            try:
+                worker.conn.send(None)
+            except OSError:
+                pass
+        for worker in list(self._all):
+            await asyncio.to_thread(worker.process.join, 2)
+            worker.kill()
+        self._all = []
+        self._idle = None
+
+    def _spawn(self) -> _Worker:
+        worker = _Worker(self._context, self.max_memory_bytes)
+        self._all.append(worker)
+        return worker
+
+    def _replace(self, worker: _Worker) -> _Worker:
+        worker.kill()
+        if worker in self._all:
+            self._all.remove(worker)
+        self.restarts += 1
+        return self._spawn()
+
+    async def run(self, fn: Callable, *args, on_progress: Optional[Callable[..., None]] = None,
+                  timeout: Optional[float] = None) -> Any:
+        """Run fn(*args) on a free worker and return its result
+
+        Raises JobTimeoutError, JobMemoryError or WorkerCrashedError when the
+        pool gave up on the job and JobFailedError when fn raised. Each stage
+        the job reports is also recorded as a span of the current request.
+        """
+        spans = _StageSpans(on_progress)
+        try:
+            return await self._run(fn, args, spans, timeout)
+        finally:
+            spans.finish()
+
+    async def _run(self, fn: Callable, args: tuple, on_progress: _StageSpans, timeout: Optional[float]) -> Any:
+        if not self.enabled:
+            return self._run_inline(fn, args, on_progress)
+
+        timeout = self.timeout if timeout is None else timeout
+        worker = await self._idle.get()
+        if not worker.process.is_alive():
+            worker = self._replace(worker)
+        self.busy += 1
+        reusable = False
+        try:
+            try:
+                kind, value = await asyncio.wait_for(self._call(worker, fn, args, on_progress), timeout)
+            except asyncio.TimeoutError:
+                self.timed_out += 1
+                raise JobTimeoutError(f"Processing exceeded the {timeout:.0f}s time limit")
+            except asyncio.CancelledError:
+                self.cancelled += 1
+                raise
+
+            if kind == "crashed":
+                self.crashed += 1
+                raise WorkerCrashedError("Processing worker exited unexpectedly")
+            if kind == "memory":
+                self.memory_exceeded += 1
+                raise JobMemoryError(f"Processing exceeded the {self.max_memory_bytes // (1024 * 1024)}MB memory limit")
+            reusable = True
+            if kind == "error":
+                self.failed += 1
+                raise JobFailedError(value)
+            self.completed += 1
+            return value
+        finally:
+            self.busy -= 1
+            if self._idle is None:
+                # Pool stopped while the job ran
+                worker.kill()
+            else:
+                if not reusable:
+                    worker = self._replace(worker)
+                self._idle.put_nowait(worker)
+
+    async def _call(self, worker: _Worker, fn: Callable, args: tuple, on_progress):
+        loop = asyncio.get_running_loop()
+        replies: asyncio.Queue = asyncio.Queue()
+
+        def readable():
+            try:
+                while worker.conn.poll():
+                    replies.put_nowait(worker.conn.recv())
+            except (EOFError, OSError):
+                replies.put_nowait(("crashed", None))
+
+        # Inputs can be large; the pipe write must not stall the event loop
+        await asyncio.to_thread(worker.conn.send, (fn, args))
+        fd = worker.conn.fileno()
+        loop.add_reader(fd, readable)
+        try:
+            while True:
+                kind, value = await replies.get()
+                if kind != "progress":
+                    return kind, value
+                on_progress(**value)
+        finally:
+            loop.remove_reader(fd)
+
+    def _run_inline(self, fn: Callable, args: tuple, on_progress):
+        global _inline_progress
+        _inline_progress = on_progress
+        try:
+            value = fn(*args)
+        except MemoryError:
+            self.memory_exceeded += 1
+            raise JobMemoryError("Processing ran out of memory")
+        except Exception as e:
+            self.failed += 1
+            raise JobFailedError(f"{type(e).__name__}: {e}")
+        finally:
+            _inline_progress = None
+        self.completed += 1
+        return value
+
+    def stats(self) -> dict:
+        return {
+            "workers": self.workers,
+            "busy": self.busy,
+            "idle": self._idle.qsize() if self._idle is not None else 0,
+            "timeout_seconds": self.timeout,
+            "max_memory_mb": self.max_memory_bytes // (1024 * 1024),
+            "completed": self.completed,
+            "failed": self.failed,
+            "timed_out": self.timed_out,
+            "memory_exceeded": self.memory_exceeded,
+            "cancelled": self.cancelled,
+            "crashed": self.crashed,
+            "restarts": self.restarts,
+        }
+
+
+def create_pdf_pool() -> ProcessPool:
+    """ProcessPool for the PDF service's PyPDF2 / ReportLab work, from settings"""
+    return ProcessPool(
+        settings.PDF_POOL_WORKERS,
+        timeout=settings.PDF_JOB_TIMEOUT_SECONDS,
+        max_memory_mb=settings.PDF_JOB_MAX_MEMORY_MB,
+    )
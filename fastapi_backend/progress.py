@@ -0,0 +1,179 @@
+"""
+Processing Progress
+Real stage, byte and page counters reported by the services while a tool
+runs, streamed to the gateway as NDJSON and on to clients as Server-Sent Events
+"""
+import asyncio
+import json
+import logging
+import time
+from contextvars import ContextVar
+from typing import Any, Awaitable, Callable, Optional
+
+from fastapi import HTTPException, Request
+from fastapi.responses import Response, StreamingResponse
+
+logger = logging.getLogger(__name__)
+
+# Sent by the gateway when it wants progress lines ahead of the result
+PROGRESS_HEADER = "X-Progress"
+PROGRESS_STREAM = "ndjson"
+NDJSON_MEDIA_TYPE = "application/x-ndjson"
+
+STAGES = ("decode", "transform", "encode", "write")
+COUNTERS = ("bytesDone", "bytesTotal", "pagesDone", "pagesTotal")
+
+_current_progress: ContextVar[Optional["Progress"]] = ContextVar("current_progress", default=None)
+
+
+class Progress:
+    """Stage and counters of one running tool request
+
+    Stage changes are emitted immediately; counter-only updates at most
+    every min_interval seconds so large inputs do not flood the stream.
+    """
+
+    def __init__(self, emit: Callable[[dict], None], min_interval: float = 0.1):
+        self.emit = emit
+        self.min_interval = min_interval
+        self.stage = "queued"
+        self.bytes_done = 0
+        self.bytes_total = 0
+        self.pages_done = 0
+        self.pages_total = 0
+        self._stage_unit: Optional[str] = None
+        self._last_emit = 0.0
+
+    def update(self, stage: Optional[str] = None, bytes_done: Optional[int] = None,
+               bytes_total: Optional[int] = None, pages_done: Optional[int] = None,
+               pages_total: Optional[int] = None):
+        changed_stage = stage is not None and stage != self.stage
+        if changed_stage:
+            self.stage = stage
+            self._stage_unit = None
+        if bytes_done is not None:
+            self.bytes_done = bytes_done
+        if bytes_total is not None:
+            self.bytes_total = bytes_total
+        if pages_done is not None:
+            self.pages_done = pages_done
+        if pages_total is not None:
+            self.pages_total = pages_total
+        # The current stage's share is measured in whatever it last counted
+        if pages_done is not None and self.pages_total:
+            self._stage_unit = "pages"
+        elif bytes_done is not None or bytes_total is not None:
+            self._stage_unit = "bytes"
+
+        now = time.monotonic()
+        if changed_stage or now - self._last_emit >= self.min_interval:
+            self._last_emit = now
+            self.emit(self.to_dict())
+
+    def percent(self) -> int:
+        """Share of the service's work done: whole stages plus the current stage's counters"""
+        if self.stage not in STAGES:
+            return 0
+        if self._stage_unit == "pages" and self.pages_total:
+            fraction = self.pages_done / self.pages_total
+        elif self._stage_unit == "bytes" and self.bytes_total:
+            fraction = self.bytes_done / self.bytes_total
+        else:
+            fraction = 0.0
+        return int((STAGES.index(self.stage) + min(1.0, fraction)) / len(STAGES) * 100)
+
+    def to_dict(self) -> dict:
+        return {
+            "event": "progress",
+            "stage": self.stage,
+            "percent": self.percent(),
+            "bytesDone": self.bytes_done,
+            "bytesTotal": self.bytes_total,
+            "pagesDone": self.pages_done,
+            "pagesTotal": self.pages_total,
+        }
+
+
+async def report(stage: Optional[str] = None, **counters):
+    """Report progress of the current request, if its caller asked for it
+
+    Yields to the event loop so the streamed line goes out before the next
+    blocking step starts.
+    """
+    progress = _current_progress.get()
+    if progress is not None:
+        progress.update(stage, **counters)
+        await asyncio.sleep(0)
+
+
+def progress_callback() -> Optional[Callable[..., None]]:
+    """Progress.update of the current request, for work reporting from elsewhere (pool workers)"""
+    progress = _current_progress.get()
+    return progress.update if progress is not None else None
+
+
+async def run_until_disconnect(request: Request, run: Callable[[], Awaitable[Any]]):
+    """Await run(), cancelling it if the client disconnects first (answered with 499)"""
+    work = asyncio.create_task(run())
+
+    async def disconnected():
+        while (await request.receive())["type"] != "http.disconnect":
+            pass
+
+    watcher = asyncio.create_task(disconnected())
+    try:
+        await asyncio.wait({work, watcher}, return_when=asyncio.FIRST_COMPLETED)
+    finally:
+        watcher.cancel()
+        if not work.done():
+            work.cancel()
+            await asyncio.gather(work, return_exceptions=True)
+    if work.cancelled():
+        logger.info("Client disconnected, tool run cancelled")
+        return Response(status_code=499)
+    return work.result()
+
+
+async def progress_response(request: Request, run: Callable[[], Awaitable[Any]]):
+    """Run a tool request; with X-Progress: ndjson stream progress lines before its result
+
+    The last line is {"event": "result", "result": ...} or {"event": "error",
+    "status": ..., "detail": ...}. Without the header the result is returned
+    as a normal response and errors raise as usual. Either way the run is
+    cancelled when the client goes away.
+    """
+    if request.headers.get(PROGRESS_HEADER, "").lower() != PROGRESS_STREAM:
+        return await run_until_disconnect(request, run)
+
+    queue: asyncio.Queue = asyncio.Queue()
+
+    async def execute():
+        _current_progress.set(Progress(queue.put_nowait))
+        try:
+            queue.put_nowait({"event": "result", "result": await run()})
+        except HTTPException as e:
+            queue.put_nowait({"event": "error", "status": e.status_code, "detail": e.detail})
+        except Exception as e:
+            logger.error(f"Tool run failed: {str(e)}")
+            queue.put_nowait({"event": "error", "status": 500, "detail": str(e)})
+
+    # Started here so it runs in the request's context (trace, request id)
+    task = asyncio.create_task(execute())
+
+    async def lines():
+        try:
+            while True:
+                event = await queue.get()
+                yield json.dumps(event, default=str) + "\n"
+                if event["event"] != "progress":
+                    break
+        finally:
+            # Client gone before the result: stop the work too
+            if not task.done():
+                task.cancel()
+
+    return StreamingResponse(lines(), media_type=NDJSON_MEDIA_TYPE)
+
+
+def format_sse(event: str, data: dict) -> str:
+    return f"event: {event}\ndata: {json.dumps(data, default=str)}\n\n"
@@ -0,0 +1,166 @@
+"""
+Rate Limiting Engine
+Constant-time token buckets per client and route class with bounded memory,
+in process or shared between gateway workers
+"""
+import logging
+import sqlite3
+import time
+from collections import OrderedDict
+from typing import List, Optional, Tuple
+
+from shared_state import SharedState
+
+logger = logging.getLogger(__name__)
+
+
+def parse_rate(value: str) -> Tuple[int, float]:
+    """Parse a "requests/seconds" setting such as "100/900" """
+    requests, _, seconds = value.partition("/")
+    return int(requests), float(seconds or 1)
+
+
+class TokenBucketLimiter:
+    """Token bucket per key, stored in an LRU so idle clients age out
+
+    Every check is O(1): one dict lookup, one move_to_end and a little
+    arithmetic. A bucket left idle for a full window has refilled completely,
+    so dropping it cannot change any decision; max_clients is a hard cap on
+    top of that for floods of distinct addresses.
+    """
+
+    def __init__(self, capacity: int, window_seconds: float, max_clients: int = 100_000):
+        self.capacity = float(capacity)
+        self.window_seconds = window_seconds
+        self.refill_rate = capacity / window_seconds  # tokens per second
+        self.max_clients = max_clients
+        self._buckets: "OrderedDict[str, list]" = OrderedDict()
+
+    def hit(self, key: str, now: Optional[float] = None) -> Tuple[bool, float]:
+        """Consume one token; return (allowed, retry_after_seconds)"""
+        if now is None:
+            now = time.monotonic()
+        buckets = self._buckets
+        bucket = buckets.get(key)
+        if bucket is None:
+            self._evict(now)
+            buckets[key] = [self.capacity - 1.0, now]
+            return True, 0.0
+
+        buckets.move_to_end(key)
+        tokens = min(self.capacity, bucket[0] + (now - bucket[1]) * self.refill_rate)
+        bucket[1] = now
+        if tokens >= 1.0:
+            bucket[0] = tokens - 1.0
+            return True, 0.0
+        bucket[0] = tokens
+        return False, (1.0 - tokens) / self.refill_rate
+
+    def _evict(self, now: float):
+        buckets = self._buckets
+        idle_before = now - self.window_seconds
+        # Least recently used entries sit at the front of the OrderedDict
+        while buckets:
+            oldest = next(iter(buckets.values()))
+            if oldest[1] > idle_before and len(buckets) < self.max_clients:
+                break
+            buckets.popitem(last=False)
+
+    def __len__(self) -> int:
+        return len(self._buckets)
+
+
+class SharedTokenBucketLimiter:
+    """TokenBucketLimiter whose buckets live in a SharedState store
+
+    Every worker process sees the same buckets, so a client gets one limit
+    no matter how many workers serve it. Each check is a single SQLite
+    upsert; idle buckets are swept every sweep_every checks per process.
+    A check that cannot get the write lock within the store's busy timeout
+    fails open: the request is allowed and counted in store_errors.
+    """
+
+    def __init__(self, store: SharedState, name: str, capacity: int, window_seconds: float,
+                 max_clients: int = 100_000, sweep_every: int = 1000):
+        self.store = store
+        self.name = name
+        self.capacity = float(capacity)
+        self.window_seconds = window_seconds
+        self.refill_rate = capacity / window_seconds
+        self.max_clients = max_clients
+        self.sweep_every = sweep_every
+        self.store_errors = 0
+        self._checks = 0
+
+    def hit(self, key: str, now: Optional[float] = None) -> Tuple[bool, float]:
+        """Consume one token; return (allowed, retry_after_seconds)"""
+        if now is None:
+            now = time.time()
+        self._checks += 1
+        try:
+            if self._checks % self.sweep_every == 0:
+                self.store.sweep_buckets(self.name, now - self.window_seconds, self.max_clients)
+            allowed, tokens = self.store.bucket_hit(self.name, key, self.capacity, self.refill_rate, now)
+        except sqlite3.OperationalError as e:
+            self.store_errors += 1
+            if self.store_errors == 1 or self.store_errors % 1000 == 0:
+                logger.warning(f"Rate limit store unavailable for {self.name}, allowing request ({self.store_errors} so far): {str(e)}")
+            return True, 0.0
+        if allowed:
+            return True, 0.0
+        return False, (1.0 - tokens) / self.refill_rate
+
+    def __len__(self) -> int:
+        return self.store.count_buckets(self.name)
+
+
+class RateLimitRule:
+    """A named limit applied to requests whose path matches one of the prefixes
+
+    With a SharedState store the buckets are shared by all gateway workers.
+    """
+
+    def __init__(self, name: str, requests: int, window_seconds: float, prefixes: Tuple[str, ...] = (),
+                 max_clients: int = 100_000, store: Optional[SharedState] = None):
+        self.name = name
+        self.prefixes = prefixes
+        self.requests = requests
+        self.window_seconds = window_seconds
+        if store is not None:
+            self.limiter = SharedTokenBucketLimiter(store, name, requests, window_seconds, max_clients)
+        else:
+            self.limiter = TokenBucketLimiter(requests, window_seconds, max_clients)
+
+
+class RateLimiter:
+    """Route-aware rate limiter: first matching rule wins, else the default"""
+
+    def __init__(self, rules: List[RateLimitRule], default: RateLimitRule):
+        self.rules = rules
+        self.default = default
+        self.rejections = {rule.name: 0 for rule in rules + [default]}
+
+    def rule_for(self, path: str) -> RateLimitRule:
+        for rule in self.rules:
+            if path.startswith(rule.prefixes):
+                return rule
+        return self.default
+
+    def check(self, client_ip: str, path: str) -> Tuple[bool, float, RateLimitRule]:
+        """Return (allowed, retry_after_seconds, rule) for one request"""
+        rule = self.rule_for(path)
+        allowed, retry_after = rule.limiter.hit(client_ip)
+        if not allowed:
+            self.rejections[rule.name] += 1
+        return allowed, retry_after, rule
+
+    def stats(self) -> dict:
+        return {
+            rule.name: {
+                "limit": f"{rule.requests}/{int(rule.window_seconds)}s",
+                "tracked_clients": len(rule.limiter),
+                "rejections": self.rejections[rule.name],
+                "store_errors": getattr(rule.limiter, "store_errors", 0),
+            }
+            for rule in self.rules + [self.default]
+        }
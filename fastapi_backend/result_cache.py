@@ -0,0 +1,134 @@
+"""
+Content-Addressed Result Cache
+Maps hash(tool, normalized metadata, input digests) to an output already in
+the static directory so repeated requests skip the processing entirely
+"""
+import hashlib
+import json
+import os
+import time
+from collections import OrderedDict
+from typing import List, Optional
+
+from fastapi import Request, UploadFile
+
+from config import settings
+from upload_handoff import HandoffFile
+
+DIGEST_CHUNK_SIZE = 1024 * 1024
+
+
+async def digest_upload(file: UploadFile) -> str:
+    """SHA-256 of an uploaded file, read in chunks and rewound for the handler"""
+    if isinstance(file, HandoffFile):
+        return file.digest
+    digest = hashlib.sha256()
+    await file.seek(0)
+    while chunk := await file.read(DIGEST_CHUNK_SIZE):
+        digest.update(chunk)
+    await file.seek(0)
+    return digest.hexdigest()
+
+
+def should_skip_cache(request: Request) -> bool:
+    """Clients opt out per request with an X-Skip-Cache header"""
+    return request.headers.get("x-skip-cache", "").lower() in ("1", "true", "yes")
+
+
+class ResultCache:
+    """LRU result cache with TTL and total-output-size eviction
+
+    Eviction only forgets the mapping; the output file itself stays in the
+    static directory and a hit is only served if that file still exists.
+    """
+
+    def __init__(self, max_entries: int = 1024, max_bytes: int = 1024 * 1024 * 1024, ttl_seconds: float = 3600):
+        self.enabled = max_entries > 0
+        self.max_entries = max_entries
+        self.max_bytes = max_bytes
+        self.ttl_seconds = ttl_seconds
+        self.total_bytes = 0
+        self.hits = 0
+        self.misses = 0
+        self.evictions = 0
+        self._entries: "OrderedDict[str, dict]" = OrderedDict()
+
+    @staticmethod
+    def make_key(tool_name: str, metadata: dict, digests: List[str]) -> str:
+        normalized = json.dumps(
+            {"tool": tool_name, "metadata": metadata, "inputs": digests},
+            sort_keys=True,
+            separators=(",", ":"),
+            default=str,
+        )
+        return hashlib.sha256(normalized.encode()).hexdigest()
+
+    async def key_for(self, tool_name: str, metadata: dict, files: List[UploadFile]) -> str:
+        digests = [await digest_upload(file) for file in files]
+        return self.make_key(tool_name, metadata, digests)
+
+    def get(self, key: str) -> Optional[dict]:
+        """Return the stored response payload, or None on a miss"""
+        entry = self._entries.get(key)
+        if entry is None:
+            self.misses += 1
+            return None
+        if time.time() - entry["created"] > self.ttl_seconds or not os.path.exists(entry["path"]):
+            self._remove(key)
+            self.misses += 1
+            return None
+        self._entries.move_to_end(key)
+        self.hits += 1
+        return {**entry["payload"], "cached": True}
+
+    def put(self, key: str, payload: dict, output_path: str, size: int):
+        if not self.enabled:
+            return
+        if key in self._entries:
+            self._remove(key)
+        self._entries[key] = {
+            "payload": payload,
+            "path": output_path,
+            "size": size,
+            "created": time.time(),
+        }
+        self.total_bytes += size
+        self._evict()
+
+    def _remove(self, key: str):
+        entry = self._entries.pop(key)
+        self.total_bytes -= entry["size"]
+
+    def _evict(self):
+        now = time.time()
+        while self._entries:
+            key, oldest = next(iter(self._entries.items()))
+            over_capacity = len(self._entries) > self.max_entries or self.total_bytes > self.max_bytes
+            if not over_capacity and now - oldest["created"] <= self.ttl_seconds:
+                break
+            self._remove(key)
+            self.evictions += 1
+
+    def stats(self) -> dict:
+        lookups = self.hits + self.misses
+        return {
+            "enabled": self.enabled,
+            "entries": len(self._entries),
+            "bytes": self.total_bytes,
+            "max_entries": self.max_entries,
+            "max_bytes": self.max_bytes,
+            "ttl_seconds": self.ttl_seconds,
+            "hits": self.hits,
+            "misses": self.misses,
+            "evictions": self.evictions,
+            "hit_ratio": round(self.hits / lookups, 4) if lookups else 0.0,
+        }
+
+
+def create_result_cache() -> ResultCache:
+    """Build a ResultCache from the RESULT_CACHE_* settings"""
+    return ResultCache(
+        max_entries=settings.RESULT_CACHE_MAX_ENTRIES,
+        max_bytes=settings.RESULT_CACHE_MAX_MB * 1024 * 1024,
+        ttl_seconds=settings.RESULT_CACHE_TTL_SECONDS,
+    )
@@ -0,0 +1,80 @@
+"""
+Per-Service Retry Budget
+Caps retries (and hedged requests) at a fraction of recent traffic so a
+struggling service is not hit with a multiple of its normal load
+"""
+import time
+from typing import Dict, Iterable, List
+
+
+class RetryBudget:
+    """Sliding window of one-second buckets counting requests and retries
+
+    A retry is allowed while retries in the window stay below
+    max(min_retries, ratio * requests).
+    """
+
+    def __init__(self, ratio: float = 0.1, min_retries: int = 3, window_seconds: int = 10):
+        self.ratio = ratio
+        self.min_retries = min_retries
+        self.window_seconds = window_seconds
+        self.rejected = 0
+        self.spent = 0
+        self._requests: List[int] = [0] * window_seconds
+        self._retries: List[int] = [0] * window_seconds
+        self._epoch = int(time.monotonic())
+
+    def _advance(self) -> int:
+        now = int(time.monotonic())
+        elapsed = now - self._epoch
+        if elapsed > 0:
+            for tick in range(self._epoch + 1, self._epoch + 1 + min(elapsed, self.window_seconds)):
+                slot = tick % self.window_seconds
+                self._requests[slot] = 0
+                self._retries[slot] = 0
+            self._epoch = now
+        return now % self.window_seconds
+
+    def record_request(self):
+        self._requests[self._advance()] += 1
+
+    def allowance(self) -> int:
+        self._advance()
+        return max(self.min_retries, int(sum(self._requests) * self.ratio))
+
+    def try_spend(self) -> bool:
+        """Take one retry from the budget; False means the caller must not retry"""
+        slot = self._advance()
+        if sum(self._retries) >= max(self.min_retries, int(sum(self._requests) * self.ratio)):
+            self.rejected += 1
+            return False
+        self._retries[slot] += 1
+        self.spent += 1
+        return True
+
+    def stats(self) -> dict:
+        self._advance()
+        return {
+            "window_seconds": self.window_seconds,
+            "ratio": self.ratio,
+            "requests": sum(self._requests),
+            "retries": sum(self._retries),
+            "allowance": self.allowance(),
+            "spent": self.spent,
+            "rejected": self.rejected,
+        }
+
+
+class RetryBudgets:
+    """One RetryBudget per microservice"""
+
+    def __init__(self, services: Iterable[str], ratio: float = 0.1, min_retries: int = 3, window_seconds: int = 10):
+        self.budgets: Dict[str, RetryBudget] = {
+            service: RetryBudget(ratio, min_retries, window_seconds) for service in services
+        }
+
+    def __getitem__(self, service: str) -> RetryBudget:
+        return self.budgets[service]
+
+    def stats(self) -> Dict[str, dict]:
+        return {service: budget.stats() for service, budget in self.budgets.items()}
@@ -10,6 +10,7 @@ import cloudinary.uploader
 import cloudinary.api
 from cloudinary.utils import cloudinary_url
 import os
+import sys
 import tempfile
 import asyncio
 from typing import Optional, List, Dict, Any
@@ -18,6 +19,10 @@ import uuid
 from datetime import datetime
 import logging
 
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+from metrics import instrument_service
+from tracing import trace_service
+
 # Configure logging
 logging.basicConfig(level=logging.INFO)
 logger = logging.getLogger(__name__)
@@ -32,6 +37,12 @@ app.add_middleware(
     allow_methods=["*"],
 )
 
+# Per-route request metrics, scraped from /metrics
+metrics_registry = instrument_service(app, "cloudinary")
+
+# Adopt the gateway's X-Request-ID and report timings in Server-Timing
+trace_service(app, "cloudinary")
+
 # Configure Cloudinary
 cloudinary.config(
     cloud_name=os.getenv("CLOUDINARY_CLOUD_NAME", "dimyd0tdl"),
@@ -71,6 +82,10 @@ async def health_check():
             "error": str(e)
         }
 
+@app.get("/metrics")
+async def prometheus_metrics():
+    return metrics_registry.response()
+
 @app.post("/upload")
 async def upload_file(
     file: UploadFile = File(...),
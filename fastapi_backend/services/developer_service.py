@@ -2,17 +2,26 @@
 Developer Tools Microservice
 Handles all developer tools like JSON formatter, XML validator, etc.
 """
-from fastapi import FastAPI, UploadFile, File, Form, HTTPException
+from fastapi import FastAPI, UploadFile, File, Form, HTTPException, Request
 from fastapi.middleware.cors import CORSMiddleware
 from fastapi.responses import JSONResponse
 from typing import List, Optional
 import uvicorn
 import os
+import sys
 import tempfile
 from datetime import datetime
 import json
 import asyncio
 
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+from tool_registry import registry as tool_registry
+from artifact_store import output_stamp
+from staged_inputs import close_inputs, create_input_stage, resolve_inputs
+from metrics import instrument_service
+from config import settings
+from tracing import mark, span, trace_service
+
 app = FastAPI(title="Developer Tools Microservice", version="1.0.0")
 
 app.add_middleware(
@@ -23,6 +32,17 @@ app.add_middleware(
     allow_methods=["*"],
 )
 
+OUTPUT_PREFIXES = {"json": "formatted", "xml": "formatted", "js": "minified"}
+
+# Uploads kept under the gateway's X-Input-Key so retries need not resend them
+input_stage = create_input_stage("developer")
+
+# Per-tool request metrics, scraped from /metrics
+metrics_registry = instrument_service(app, "developer")
+
+# Adopt the gateway's X-Request-ID and report stage timings in Server-Timing
+trace_service(app, "developer")
+
 @app.get("/")
 async def root():
     return {"service": "Developer Tools Microservice", "status": "active", "version": "1.0.0"}
@@ -31,16 +51,25 @@ async def root():
 async def health_check():
     return {"status": "healthy", "service": "developer-tools", "microservice": "FastAPI"}
 
+@app.get("/metrics")
+async def prometheus_metrics():
+    return metrics_registry.response()
+
 @app.post("/process/{tool_name}")
 async def process_developer_tool(
     tool_name: str,
+    request: Request,
     files: List[UploadFile] = File([]),
     metadata: Optional[str] = Form(None)
 ):
     """Process developer tool request"""
     
     start_time = datetime.now()
+    mark("decode")
+    files = await resolve_inputs(request, files, input_stage)
     print(f"👨‍💻 Developer Service: Processing {tool_name} with {len(files)} files")
+    # Only counted here; release staged or handed-off inputs right away
+    close_inputs(files)
     
     # Parse metadata
     meta_data = {}
@@ -50,24 +79,15 @@ async def process_developer_tool(
         except:
             meta_data = {"text": metadata}
     
-    # Simulate processing
-    await asyncio.sleep(0.8)
-    
-    # Generate output filename
-    timestamp = int(datetime.now().timestamp() * 1000)
+    # Artificial pacing only when fast mode is explicitly turned off
+    if not settings.ENABLE_FAST_MODE:
+        with span("simulate"):
+            await asyncio.sleep(0.8)
     
-    if 'json' in tool_name:
-        output_filename = f"formatted_{tool_name}_{timestamp}.json"
-        ext = "json"
-    elif 'xml' in tool_name:
-        output_filename = f"formatted_{tool_name}_{timestamp}.xml"
-        ext = "xml"
-    elif 'code' in tool_name:
-        output_filename = f"minified_{tool_name}_{timestamp}.js"
-        ext = "js"
-    else:
-        output_filename = f"processed_{tool_name}_{timestamp}.txt"
-        ext = "txt"
+    # Generate output filename from the registry output format
+    timestamp = output_stamp()
+    ext = tool_registry.for_service("developer", tool_name).output
+    output_filename = f"{OUTPUT_PREFIXES.get(ext, 'processed')}_{tool_name}_{timestamp}.{ext}"
     
     processing_time = (datetime.now() - start_time).total_seconds()
     
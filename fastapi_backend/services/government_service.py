@@ -2,17 +2,26 @@
 Government Document Tools Microservice
 Handles all government document validation and processing
 """
-from fastapi import FastAPI, UploadFile, File, Form, HTTPException
+from fastapi import FastAPI, UploadFile, File, Form, HTTPException, Request
 from fastapi.middleware.cors import CORSMiddleware
 from fastapi.responses import JSONResponse
 from typing import List, Optional
 import uvicorn
 import os
+import sys
 import tempfile
 from datetime import datetime
 import json
 import asyncio
 
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+from tool_registry import registry as tool_registry
+from artifact_store import output_stamp
+from staged_inputs import close_inputs, create_input_stage, resolve_inputs
+from metrics import instrument_service
+from config import settings
+from tracing import mark, span, trace_service
+
 app = FastAPI(title="Government Tools Microservice", version="1.0.0")
 
 app.add_middleware(
@@ -23,6 +32,15 @@ app.add_middleware(
     allow_methods=["*"],
 )
 
+# Uploads kept under the gateway's X-Input-Key so retries need not resend them
+input_stage = create_input_stage("government")
+
+# Per-tool request metrics, scraped from /metrics
+metrics_registry = instrument_service(app, "government")
+
+# Adopt the gateway's X-Request-ID and report stage timings in Server-Timing
+trace_service(app, "government")
+
 @app.get("/")
 async def root():
     return {"service": "Government Document Processing Microservice", "status": "active", "version": "1.0.0"}
@@ -31,16 +49,25 @@ async def root():
 async def health_check():
     return {"status": "healthy", "service": "government-tools", "microservice": "FastAPI"}
 
+@app.get("/metrics")
+async def prometheus_metrics():
+    return metrics_registry.response()
+
 @app.post("/process/{tool_name}")
 async def process_government_tool(
     tool_name: str,
+    request: Request,
     files: List[UploadFile] = File([]),
     metadata: Optional[str] = Form(None)
 ):
     """Process government document tool request"""
     
     start_time = datetime.now()
+    mark("decode")
+    files = await resolve_inputs(request, files, input_stage)
     print(f"🏛️ Government Service: Processing {tool_name} with {len(files)} files")
+    # Only counted here; release staged or handed-off inputs right away
+    close_inputs(files)
     
     # Parse metadata
     meta_data = {}
@@ -50,12 +77,15 @@ async def process_government_tool(
         except:
             meta_data = {"text": metadata}
     
-    # Simulate processing
-    await asyncio.sleep(1.5)
+    # Artificial pacing only when fast mode is explicitly turned off
+    if not settings.ENABLE_FAST_MODE:
+        with span("simulate"):
+            await asyncio.sleep(1.5)
     
     # Generate output filename
-    timestamp = int(datetime.now().timestamp() * 1000)
-    output_filename = f"validated_{tool_name}_{timestamp}.pdf"
+    timestamp = output_stamp()
+    ext = tool_registry.for_service("government", tool_name).output
+    output_filename = f"validated_{tool_name}_{timestamp}.{ext}"
     
     processing_time = (datetime.now() - start_time).total_seconds()
     
@@ -2,12 +2,13 @@
 Fixed Image Tools Microservice - Real File Processing
 Handles all image processing operations with actual file generation
 """
-from fastapi import FastAPI, UploadFile, File, Form, HTTPException
+from fastapi import FastAPI, UploadFile, File, Form, HTTPException, Request
 from fastapi.middleware.cors import CORSMiddleware
 from fastapi.responses import JSONResponse
 from typing import List, Optional
 import uvicorn
 import os
+import sys
 import io
 import tempfile
 from datetime import datetime
@@ -15,6 +16,17 @@ import json
 from PIL import Image, ImageFilter, ImageEnhance, ImageDraw
 import asyncio
 
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+from tool_registry import registry as tool_registry
+from staged_inputs import close_inputs, create_input_stage, resolve_inputs
+from metrics import instrument_service
+from tracing import mark, span, trace_service
+from result_cache import create_result_cache, should_skip_cache
+from upload_handoff import input_stream
+from artifact_store import create_artifact_store, output_stamp
+from config import settings
+from progress import progress_response, report
+
 app = FastAPI(title="Image Tools Microservice - Fixed", version="2.0.0")
 
 app.add_middleware(
@@ -25,8 +37,20 @@ app.add_middleware(
     allow_methods=["*"],
 )
 
-# Ensure directories exist
-os.makedirs("../../static", exist_ok=True)
+# Outputs go to the shared hash-sharded store, which expires and evicts them
+artifact_store = create_artifact_store()
+
+# Repeated (tool, metadata, inputs) requests reuse the existing output
+result_cache = create_result_cache()
+
+# Uploads kept under the gateway's X-Input-Key so retries need not resend them
+input_stage = create_input_stage("image")
+
+# Per-tool request metrics, scraped from /metrics
+metrics_registry = instrument_service(app, "image")
+
+# Adopt the gateway's X-Request-ID and report stage timings in Server-Timing
+trace_service(app, "image")
 
 @app.get("/")
 async def root():
@@ -36,16 +60,40 @@ async def root():
 async def health_check():
     return {"status": "healthy", "service": "image-tools-fixed", "microservice": "FastAPI"}
 
+@app.get("/metrics")
+async def prometheus_metrics():
+    return metrics_registry.response()
+
+@app.get("/cache/stats")
+async def cache_stats():
+    return result_cache.stats()
+
 @app.post("/process/{tool_name}")
 async def process_image_tool(
     tool_name: str,
+    request: Request,
     files: List[UploadFile] = File([]),
     metadata: Optional[str] = Form(None)
 ):
-    """Process image tool request with REAL image processing like TinyWow"""
+    """Process image tool request with REAL image processing like TinyWow
 
+    Callers sending X-Progress: ndjson get progress lines before the result.
+    """
+    return await progress_response(request, lambda: run_image_tool(tool_name, request, files, metadata))
+
+async def run_image_tool(tool_name: str, request: Request, files: List[UploadFile], metadata: Optional[str]) -> dict:
     start_time = datetime.now()
+    mark("decode")
+    files = await resolve_inputs(request, files, input_stage)
+    try:
+        return await process_image_inputs(tool_name, request, files, metadata, start_time)
+    finally:
+        close_inputs(files)
+
+async def process_image_inputs(tool_name: str, request: Request, files: List[UploadFile], metadata: Optional[str],
+                               start_time: datetime) -> dict:
     print(f"🖼️ Fixed Image Service: Processing {tool_name} with {len(files)} files")
+    await report("decode", bytes_total=sum(file.size or 0 for file in files))
 
     # Parse metadata
     meta_data = {}
@@ -55,26 +103,35 @@ async def process_image_tool(
         except:
             meta_data = {"text": metadata}
 
-    # Heavy processing simulation like TinyWow
-    await simulate_heavy_processing(tool_name, len(files))
-
-    # Generate REAL image output based on tool type
+    cache_key = None
+    if result_cache.enabled and not should_skip_cache(request):
+        with span("cache"):
+            cache_key = await result_cache.key_for(tool_name, meta_data, files)
+        cached = result_cache.get(cache_key)
+        if cached is not None:
+            print(f"⚡ Image Service: Cache hit for {tool_name} -> {cached['filename']}")
+            # Handing the URL out again counts as use, so eviction does not remove it right away
+            artifact_store.touch(cached["filename"])
+            return cached
+
+    # Artificial pacing only when fast mode is explicitly turned off
+    if not settings.ENABLE_FAST_MODE:
+        with span("simulate"):
+            await simulate_heavy_processing(tool_name, len(files))
+
+    # Generate REAL image output based on the registry handler for this tool
     try:
-        if tool_name == "bg-remover" and len(files) >= 1:
-            output_filename, file_size = await remove_background_simple(files[0])
-        elif tool_name == "image-resizer" and len(files) >= 1:
-            output_filename, file_size = await resize_image_simple(files[0], meta_data)
-        elif tool_name == "image-compressor" and len(files) >= 1:
-            output_filename, file_size = await compress_image_simple(files[0], meta_data)
-        elif tool_name == "image-converter" and len(files) >= 1:
-            output_filename, file_size = await convert_image_simple(files[0], meta_data)
-        else:
-            # For other tools, generate a processed image
-            output_filename, file_size = await generate_processed_image(tool_name, files, meta_data)
+        spec = tool_registry.for_service("image", tool_name)
+        handler = IMAGE_HANDLERS.get(spec.handler, generate_processed_image)
+        if len(files) < spec.min_files:
+            handler = generate_processed_image
+        with span("process"):
+            output_filename, file_size = await handler(tool_name, files, meta_data)
+        artifact_store.register(output_filename, file_size)
 
         processing_time = (datetime.now() - start_time).total_seconds()
 
-        return {
+        content = {
             "success": True,
             "filename": output_filename,
             "download_url": f"/static/{output_filename}",
@@ -89,6 +146,9 @@ async def process_image_tool(
                 "timestamp": datetime.now().isoformat()
             }
         }
+        if cache_key:
+            result_cache.put(cache_key, content, artifact_store.shard_path(output_filename), file_size)
+        return content
 
     except Exception as e:
         print(f"❌ Error processing image: {e}")
@@ -111,19 +171,31 @@ async def simulate_heavy_processing(tool_name: str, file_count: int):
     print(f"🔥 Heavy processing simulation: {total_time:.1f}s for {tool_name}")
     await asyncio.sleep(total_time)
 
+def save_image(image: Image.Image, output_path: str, format: str, **params):
+    """Encode in memory (the "encode" span), then write the output file (the "write" span)"""
+    output = io.BytesIO()
+    with span("encode"):
+        image.save(output, format, **params)
+    with span("write"):
+        with open(output_path, "wb") as f:
+            f.write(output.getbuffer())
+
 async def remove_background_simple(file: UploadFile) -> tuple[str, int]:
     """Simple but effective background removal"""
     print("🖼️ Removing background using simple edge detection...")
 
     try:
-        content = await file.read()
-        image = Image.open(io.BytesIO(content))
+        with input_stream(file) as stream:
+            image = Image.open(stream)
+            image.load()
+        await report("decode", bytes_done=file.size or 0)
 
         # Convert to RGBA if not already
         if image.mode != 'RGBA':
             image = image.convert('RGBA')
 
         # Simple background removal - make corners transparent
+        await report("transform")
         # This is a simplified version for demo purposes
         width, height = image.size
         pixels = image.load()
@@ -152,11 +224,13 @@ async def remove_background_simple(file: UploadFile) -> tuple[str, int]:
                 if diff < tolerance:
                     pixels[x, y] = (r, g, b, 0)  # Make transparent
 
-        output_filename = f"bg-removed-{datetime.now().strftime('%Y%m%d_%H%M%S')}.png"
-        output_path = f"../../static/{output_filename}"
+        output_filename = f"bg-removed-{output_stamp()}.png"
+        output_path = artifact_store.path_for(output_filename)
 
-        image.save(output_path, "PNG")
+        await report("encode")
+        save_image(image, output_path, "PNG")
         file_size = os.path.getsize(output_path)
+        await report("write", bytes_done=file_size, bytes_total=file_size)
 
         print(f"✅ Background removed: {output_filename} ({file_size} bytes)")
         return output_filename, file_size
@@ -170,8 +244,10 @@ async def resize_image_simple(file: UploadFile, metadata: dict) -> tuple[str, in
     print("📐 Resizing image with high quality...")
 
     try:
-        content = await file.read()
-        image = Image.open(io.BytesIO(content))
+        with input_stream(file) as stream:
+            image = Image.open(stream)
+            image.load()
+        await report("decode", bytes_done=file.size or 0)
 
         # Get target dimensions from metadata
         width = metadata.get('width', 800)
@@ -184,21 +260,24 @@ async def resize_image_simple(file: UploadFile, metadata: dict) -> tuple[str, in
             width, height = 800, 600
 
         # Resize with high quality
+        await report("transform")
         resized_image = image.resize((width, height), Image.LANCZOS)
 
-        output_filename = f"resized-{width}x{height}-{datetime.now().strftime('%Y%m%d_%H%M%S')}.png"
-        output_path = f"../../static/{output_filename}"
+        output_filename = f"resized-{width}x{height}-{output_stamp()}.png"
+        output_path = artifact_store.path_for(output_filename)
 
         # Preserve format or convert to PNG
+        await report("encode")
         if image.format == 'JPEG':
             resized_image = resized_image.convert('RGB')
             output_filename = output_filename.replace('.png', '.jpg')
             output_path = output_path.replace('.png', '.jpg')
-            resized_image.save(output_path, "JPEG", quality=95)
+            save_image(resized_image, output_path, "JPEG", quality=95)
         else:
-            resized_image.save(output_path, "PNG")
+            save_image(resized_image, output_path, "PNG")
 
         file_size = os.path.getsize(output_path)
+        await report("write", bytes_done=file_size, bytes_total=file_size)
 
         print(f"✅ Image resized: {output_filename} ({file_size} bytes)")
         return output_filename, file_size
@@ -212,8 +291,10 @@ async def compress_image_simple(file: UploadFile, metadata: dict) -> tuple[str,
     print("🗜️ Compressing image...")
 
     try:
-        content = await file.read()
-        image = Image.open(io.BytesIO(content))
+        with input_stream(file) as stream:
+            image = Image.open(stream)
+            image.load()
+        await report("decode", bytes_done=file.size or 0)
 
         # Get compression quality from metadata
         quality = metadata.get('quality', 80)
@@ -223,10 +304,11 @@ async def compress_image_simple(file: UploadFile, metadata: dict) -> tuple[str,
         except:
             quality = 80
 
-        output_filename = f"compressed-{datetime.now().strftime('%Y%m%d_%H%M%S')}.jpg"
-        output_path = f"../../static/{output_filename}"
+        output_filename = f"compressed-{output_stamp()}.jpg"
+        output_path = artifact_store.path_for(output_filename)
 
         # Convert to RGB if needed and compress
+        await report("transform")
         if image.mode in ('RGBA', 'LA', 'P'):
             # Create white background for transparency
             background = Image.new('RGB', image.size, (255, 255, 255))
@@ -235,8 +317,10 @@ async def compress_image_simple(file: UploadFile, metadata: dict) -> tuple[str,
             background.paste(image, mask=image.split()[-1] if image.mode == 'RGBA' else None)
             image = background
 
-        image.save(output_path, "JPEG", quality=quality, optimize=True)
+        await report("encode")
+        save_image(image, output_path, "JPEG", quality=quality, optimize=True)
         file_size = os.path.getsize(output_path)
+        await report("write", bytes_done=file_size, bytes_total=file_size)
 
         print(f"✅ Image compressed: {output_filename} ({file_size} bytes, Q={quality})")
         return output_filename, file_size
@@ -250,8 +334,10 @@ async def convert_image_simple(file: UploadFile, metadata: dict) -> tuple[str, i
     print("🔄 Converting image format...")
 
     try:
-        content = await file.read()
-        image = Image.open(io.BytesIO(content))
+        with input_stream(file) as stream:
+            image = Image.open(stream)
+            image.load()
+        await report("decode", bytes_done=file.size or 0)
 
         # Get target format from metadata
         target_format = metadata.get('format', 'PNG').upper()
@@ -261,10 +347,11 @@ async def convert_image_simple(file: UploadFile, metadata: dict) -> tuple[str, i
         ext_map = {'PNG': '.png', 'JPEG': '.jpg', 'WEBP': '.webp', 'BMP': '.bmp', 'TIFF': '.tiff'}
         extension = ext_map[target_format]
 
-        output_filename = f"converted-{datetime.now().strftime('%Y%m%d_%H%M%S')}{extension}"
-        output_path = f"../../static/{output_filename}"
+        output_filename = f"converted-{output_stamp()}{extension}"
+        output_path = artifact_store.path_for(output_filename)
 
         # Handle format-specific requirements
+        await report("transform")
         if target_format == 'JPEG':
             if image.mode in ('RGBA', 'LA', 'P'):
                 # Convert transparency to white background
@@ -273,11 +360,14 @@ async def convert_image_simple(file: UploadFile, metadata: dict) -> tuple[str, i
                     image = image.convert('RGBA')
                 background.paste(image, mask=image.split()[-1] if image.mode == 'RGBA' else None)
                 image = background
-            image.save(output_path, target_format, quality=95)
+            await report("encode")
+            save_image(image, output_path, target_format, quality=95)
         else:
-            image.save(output_path, target_format)
+            await report("encode")
+            save_image(image, output_path, target_format)
 
         file_size = os.path.getsize(output_path)
+        await report("write", bytes_done=file_size, bytes_total=file_size)
 
         print(f"✅ Image converted: {output_filename} ({file_size} bytes, {target_format})")
         return output_filename, file_size
@@ -291,10 +381,11 @@ async def generate_processed_image(tool_name: str, files: List[UploadFile], meta
 
     if not files or len(files) == 0:
         # Create a professional sample image if no files provided
-        output_filename = f"processed-{tool_name}-{datetime.now().strftime('%Y%m%d_%H%M%S')}.png"
-        output_path = f"../../static/{output_filename}"
+        output_filename = f"processed-{tool_name}-{output_stamp()}.png"
+        output_path = artifact_store.path_for(output_filename)
 
         image = Image.new('RGB', (800, 600), (245, 245, 250))
+        await report("transform")
         draw = ImageDraw.Draw(image)
 
         # Professional design
@@ -306,33 +397,25 @@ async def generate_processed_image(tool_name: str, files: List[UploadFile], meta
         draw.text((50, 200), f"📅 {datetime.now().strftime('%Y-%m-%d %H:%M:%S')}", fill=(107, 114, 128))
         draw.text((50, 250), "🚀 Powered by FastAPI Microservices", fill=(107, 114, 128))
 
-        image.save(output_path, "PNG", quality=95)
+        await report("encode")
+        save_image(image, output_path, "PNG", quality=95)
         file_size = os.path.getsize(output_path)
+        await report("write", bytes_done=file_size, bytes_total=file_size)
         return output_filename, file_size
 
     # Process the first uploaded file
     try:
         file = files[0]
-        content = await file.read()
-        original_image = Image.open(io.BytesIO(content))
-
-        # Apply real processing based on tool
-        if "blur" in tool_name:
-            processed_image = original_image.filter(ImageFilter.GaussianBlur(radius=2))
-        elif "sharpen" in tool_name:
-            processed_image = original_image.filter(ImageFilter.SHARPEN)
-        elif "enhance" in tool_name or "brightness" in tool_name:
-            enhancer = ImageEnhance.Brightness(original_image)
-            processed_image = enhancer.enhance(1.3)
-        elif "contrast" in tool_name:
-            enhancer = ImageEnhance.Contrast(original_image)
-            processed_image = enhancer.enhance(1.2)
-        elif "flipper" in tool_name:
-            processed_image = original_image.transpose(Image.FLIP_LEFT_RIGHT)
-        elif "rotator" in tool_name:
-            processed_image = original_image.rotate(90, expand=True)
-        elif "grayscale" in tool_name or "filter" in tool_name:
-            processed_image = original_image.convert('L').convert('RGB')
+        with input_stream(file) as stream:
+            original_image = Image.open(stream)
+            original_image.load()
+        await report("decode", bytes_done=file.size or 0)
+
+        # Apply real processing based on the registry handler for this tool
+        await report("transform")
+        operation = IMAGE_OPERATIONS.get(tool_registry.for_service("image", tool_name).handler)
+        if operation is not None:
+            processed_image = operation(original_image)
         else:
             # Default: apply subtle enhancement
             if original_image.mode != 'RGB':
@@ -345,16 +428,18 @@ async def generate_processed_image(tool_name: str, files: List[UploadFile], meta
             width, height = processed_image.size
             draw.rectangle([0, 0, width-1, height-1], outline=(59, 130, 246), width=3)
 
-        output_filename = f"processed-{tool_name}-{datetime.now().strftime('%Y%m%d_%H%M%S')}.png"
-        output_path = f"../../static/{output_filename}"
+        output_filename = f"processed-{tool_name}-{output_stamp()}.png"
+        output_path = artifact_store.path_for(output_filename)
 
         # Save with high quality
+        await report("encode")
         if processed_image.mode == 'RGBA':
-            processed_image.save(output_path, "PNG", optimize=True)
+            save_image(processed_image, output_path, "PNG", optimize=True)
         else:
-            processed_image.save(output_path, "JPEG", quality=95, optimize=True)
+            save_image(processed_image, output_path, "JPEG", quality=95, optimize=True)
 
         file_size = os.path.getsize(output_path)
+        await report("write", bytes_done=file_size, bytes_total=file_size)
         print(f"✅ Real processed image created: {output_filename} ({file_size} bytes)")
         return output_filename, file_size
 
@@ -363,6 +448,26 @@ async def generate_processed_image(tool_name: str, files: List[UploadFile], meta
         # Fallback to professional sample
         return await generate_processed_image(tool_name, [], metadata)
 
+# Single-image operations applied by generate_processed_image
+IMAGE_OPERATIONS = {
+    "blur": lambda image: image.filter(ImageFilter.GaussianBlur(radius=2)),
+    "sharpen": lambda image: image.filter(ImageFilter.SHARPEN),
+    "brighten": lambda image: ImageEnhance.Brightness(image).enhance(1.3),
+    "contrast": lambda image: ImageEnhance.Contrast(image).enhance(1.2),
+    "flip": lambda image: image.transpose(Image.FLIP_LEFT_RIGHT),
+    "rotate": lambda image: image.rotate(90, expand=True),
+    "grayscale": lambda image: image.convert('L').convert('RGB'),
+}
+
+# Registry handler name -> coroutine(tool_name, files, metadata)
+IMAGE_HANDLERS = {
+    "remove_background": lambda tool_name, files, metadata: remove_background_simple(files[0]),
+    "resize": lambda tool_name, files, metadata: resize_image_simple(files[0], metadata),
+    "compress": lambda tool_name, files, metadata: compress_image_simple(files[0], metadata),
+    "convert": lambda tool_name, files, metadata: convert_image_simple(files[0], metadata),
+    "generate": generate_processed_image,
+}
+
 if __name__ == "__main__":
     import uvicorn
     port = int(os.environ.get("PORT", 8002))
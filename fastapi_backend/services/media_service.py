@@ -2,17 +2,26 @@
 Media Tools Microservice
 Handles all video and audio processing operations
 """
-from fastapi import FastAPI, UploadFile, File, Form, HTTPException
+from fastapi import FastAPI, UploadFile, File, Form, HTTPException, Request
 from fastapi.middleware.cors import CORSMiddleware
 from fastapi.responses import JSONResponse
 from typing import List, Optional
 import uvicorn
 import os
+import sys
 import tempfile
 from datetime import datetime
 import json
 import asyncio
 
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+from tool_registry import registry as tool_registry
+from artifact_store import output_stamp
+from staged_inputs import close_inputs, create_input_stage, resolve_inputs
+from metrics import instrument_service
+from config import settings
+from tracing import mark, span, trace_service
+
 app = FastAPI(title="Media Tools Microservice", version="1.0.0")
 
 app.add_middleware(
@@ -23,6 +32,15 @@ app.add_middleware(
     allow_methods=["*"],
 )
 
+# Uploads kept under the gateway's X-Input-Key so retries need not resend them
+input_stage = create_input_stage("media")
+
+# Per-tool request metrics, scraped from /metrics
+metrics_registry = instrument_service(app, "media")
+
+# Adopt the gateway's X-Request-ID and report stage timings in Server-Timing
+trace_service(app, "media")
+
 @app.get("/")
 async def root():
     return {"service": "Media Processing Microservice", "status": "active", "version": "1.0.0"}
@@ -31,16 +49,25 @@ async def root():
 async def health_check():
     return {"status": "healthy", "service": "media-tools", "microservice": "FastAPI"}
 
+@app.get("/metrics")
+async def prometheus_metrics():
+    return metrics_registry.response()
+
 @app.post("/process/{tool_name}")
 async def process_media_tool(
     tool_name: str,
+    request: Request,
     files: List[UploadFile] = File([]),
     metadata: Optional[str] = Form(None)
 ):
     """Process media tool request"""
     
     start_time = datetime.now()
+    mark("decode")
+    files = await resolve_inputs(request, files, input_stage)
     print(f"🎬 Media Service: Processing {tool_name} with {len(files)} files")
+    # Only counted here; release staged or handed-off inputs right away
+    close_inputs(files)
     
     # Parse metadata
     meta_data = {}
@@ -50,19 +77,21 @@ async def process_media_tool(
         except:
             meta_data = {"text": metadata}
     
-    # Simulate processing
-    await asyncio.sleep(1)
+    # Artificial pacing only when fast mode is explicitly turned off
+    if not settings.ENABLE_FAST_MODE:
+        with span("simulate"):
+            await asyncio.sleep(1)
     
-    # Generate output filename
-    timestamp = int(datetime.now().timestamp() * 1000)
+    # Generate output filename from the registry output format
+    spec = tool_registry.for_service("media", tool_name)
+    timestamp = output_stamp()
+    output_filename = f"processed_{tool_name}_{timestamp}.{spec.output}"
+    # Size estimate and outputFormat keep their original name-based values
     if tool_name.startswith('video'):
-        output_filename = f"processed_{tool_name}_{timestamp}.mp4"
         file_size = "15.2MB"
     elif tool_name.startswith('audio'):
-        output_filename = f"processed_{tool_name}_{timestamp}.mp3"
         file_size = "3.8MB"
     else:
-        output_filename = f"processed_{tool_name}_{timestamp}.mp4"
         file_size = "8.5MB"
     
     processing_time = (datetime.now() - start_time).total_seconds()
@@ -2,23 +2,45 @@
 PDF Tools Microservice
 Handles all PDF processing operations with real PDF generation like TinyWow
 """
-from fastapi import FastAPI, UploadFile, File, Form, HTTPException
+from fastapi import FastAPI, UploadFile, File, Form, HTTPException, Request
 from fastapi.middleware.cors import CORSMiddleware
 from fastapi.responses import StreamingResponse, JSONResponse, FileResponse
 from typing import List, Optional
 import uvicorn
 import os
+import sys
 import io
-import tempfile
-import shutil
 from datetime import datetime
 import json
-from PyPDF2 import PdfMerger, PdfReader, PdfWriter
-from reportlab.pdfgen import canvas
-from reportlab.lib.pagesizes import letter
 import asyncio
+from contextlib import asynccontextmanager
 
-app = FastAPI(title="PDF Tools Microservice", version="1.0.0")
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+from tool_registry import registry as tool_registry
+from staged_inputs import close_inputs, create_input_stage, resolve_inputs
+from metrics import instrument_service
+from tracing import mark, span, trace_service
+from result_cache import create_result_cache, should_skip_cache
+from upload_handoff import HandoffFile
+from artifact_store import create_artifact_store, output_stamp
+from config import settings
+from progress import progress_callback, progress_response, report
+from process_pool import JobMemoryError, JobTimeoutError, PoolJobError, create_pdf_pool
+import pdf_operations
+
+# PyPDF2 / ReportLab work runs in worker processes so the event loop (and
+# /health) stays responsive and throughput scales with cores
+pdf_pool = create_pdf_pool()
+
+@asynccontextmanager
+async def lifespan(app: FastAPI):
+    pdf_pool.start()
+    try:
+        yield
+    finally:
+        await pdf_pool.stop()
+
+app = FastAPI(title="PDF Tools Microservice", version="1.0.0", lifespan=lifespan)
 
 app.add_middleware(
     CORSMiddleware,
@@ -28,9 +50,20 @@ app.add_middleware(
     allow_methods=["*"],
 )
 
-# Ensure directories exist
-os.makedirs("../../static", exist_ok=True)
-os.makedirs("../../static", exist_ok=True)
+# Outputs go to the shared hash-sharded store, which expires and evicts them
+artifact_store = create_artifact_store()
+
+# Repeated (tool, metadata, inputs) requests reuse the existing output
+result_cache = create_result_cache()
+
+# Uploads kept under the gateway's X-Input-Key so retries need not resend them
+input_stage = create_input_stage("pdf")
+
+# Per-tool request metrics, scraped from /metrics
+metrics_registry = instrument_service(app, "pdf")
+
+# Adopt the gateway's X-Request-ID and report stage timings in Server-Timing
+trace_service(app, "pdf")
 
 @app.get("/")
 async def root():
@@ -40,16 +73,44 @@ async def root():
 async def health_check():
     return {"status": "healthy", "service": "pdf-tools", "microservice": "FastAPI"}
 
+@app.get("/metrics")
+async def prometheus_metrics():
+    return metrics_registry.response()
+
+@app.get("/cache/stats")
+async def cache_stats():
+    return result_cache.stats()
+
+@app.get("/pool/stats")
+async def pool_stats():
+    return pdf_pool.stats()
+
 @app.post("/process/{tool_name}")
 async def process_pdf_tool(
     tool_name: str,
+    request: Request,
     files: List[UploadFile] = File([]),
     metadata: Optional[str] = Form(None)
 ):
-    """Process PDF tool request with real PDF generation like TinyWow"""
+    """Process PDF tool request with real PDF generation like TinyWow
 
+    Callers sending X-Progress: ndjson get progress lines before the result.
+    """
+    return await progress_response(request, lambda: run_pdf_tool(tool_name, request, files, metadata))
+
+async def run_pdf_tool(tool_name: str, request: Request, files: List[UploadFile], metadata: Optional[str]) -> dict:
     start_time = datetime.now()
+    mark("decode")
+    files = await resolve_inputs(request, files, input_stage)
+    try:
+        return await process_pdf_inputs(tool_name, request, files, metadata, start_time)
+    finally:
+        close_inputs(files)
+
+async def process_pdf_inputs(tool_name: str, request: Request, files: List[UploadFile], metadata: Optional[str],
+                             start_time: datetime) -> dict:
     print(f"🔥 PDF Service: Processing {tool_name} with {len(files)} files")
+    await report("decode", bytes_total=sum(file.size or 0 for file in files))
 
     # Parse metadata
     meta_data = {}
@@ -59,23 +120,42 @@ async def process_pdf_tool(
         except:
             meta_data = {"text": metadata}
 
-    # Heavy processing simulation like TinyWow
-    await simulate_heavy_processing(tool_name, len(files))
+    cache_key = None
+    if result_cache.enabled and not should_skip_cache(request):
+        with span("cache"):
+            cache_key = await result_cache.key_for(tool_name, meta_data, files)
+        cached = result_cache.get(cache_key)
+        if cached is not None:
+            print(f"⚡ PDF Service: Cache hit for {tool_name} -> {cached['filename']}")
+            # Handing the URL out again counts as use, so eviction does not remove it right away
+            artifact_store.touch(cached["filename"])
+            return cached
 
-    # Generate REAL PDF output based on tool type
-    if tool_name == "pdf-merger" and len(files) >= 2:
-        output_filename, file_size = await merge_pdfs_real(files)
-    elif tool_name == "pdf-splitter" and len(files) >= 1:
-        output_filename, file_size = await split_pdf_real(files[0], meta_data)
-    elif tool_name == "pdf-compressor" and len(files) >= 1:
-        output_filename, file_size = await compress_pdf_real(files[0])
-    else:
-        # For other tools, generate a professional processed PDF
-        output_filename, file_size = await generate_processed_pdf(tool_name, files, meta_data)
+    # Artificial pacing only when fast mode is explicitly turned off
+    if not settings.ENABLE_FAST_MODE:
+        with span("simulate"):
+            await simulate_heavy_processing(tool_name, len(files))
+
+    # Generate REAL PDF output based on the registry handler for this tool
+    spec = tool_registry.for_service("pdf", tool_name)
+    handler = PDF_HANDLERS.get(spec.handler, generate_processed_pdf)
+    if len(files) < spec.min_files:
+        # Not enough input for the real operation: generate a professional processed PDF
+        handler = generate_processed_pdf
+    try:
+        with span("process"):
+            output_filename, file_size = await handler(tool_name, files, meta_data)
+    except JobTimeoutError as e:
+        raise HTTPException(status_code=504, detail=str(e))
+    except JobMemoryError:
+        raise HTTPException(status_code=413, detail="File needs more memory than a PDF job may use")
+    except PoolJobError as e:
+        raise HTTPException(status_code=500, detail=str(e))
+    artifact_store.register(output_filename, file_size)
 
     processing_time = (datetime.now() - start_time).total_seconds() * 1000
 
-    return JSONResponse(content={
+    content = {
         "success": True,
         "message": f"{tool_name.replace('-', ' ').title()} completed successfully",
         "downloadUrl": f"/static/{output_filename}",
@@ -91,13 +171,17 @@ async def process_pdf_tool(
             "realFile": True,
             **meta_data
         }
-    })
+    }
+    if cache_key:
+        result_cache.put(cache_key, content, artifact_store.shard_path(output_filename), file_size)
+    return content
 
 @app.get("/download/{filename}")
 async def download_file(filename: str):
     """Download processed file"""
-    file_path = f"../../static/{filename}"
-    if os.path.exists(file_path):
+    file_path = artifact_store.locate(filename)
+    if file_path is not None:
+        artifact_store.touch(filename)
         return FileResponse(
             path=file_path,
             media_type='application/pdf',
@@ -125,65 +209,43 @@ async def simulate_heavy_processing(tool_name: str, file_count: int):
         print(f"📊 {step}")
         await asyncio.sleep(processing_time / len(steps))
 
+def input_source(file: UploadFile):
+    """What a pool worker reads an input from: its path when it has one, else its bytes"""
+    path = file.path if isinstance(file, HandoffFile) else getattr(file.file, "name", None)
+    if isinstance(path, str) and os.path.isfile(path):
+        return path
+    file.file.seek(0)
+    return file.file.read()
+
 async def merge_pdfs_real(files: List[UploadFile]) -> tuple[str, int]:
     """Merge PDFs like TinyWow - returns actual merged PDF"""
     print("🔥 Merging PDFs with PyPDF2...")
     
-    merger = PdfMerger()
-    temp_files = []
-    
     try:
-        # Ensure static directory exists
-        static_dir = os.path.abspath("../../static")
-        os.makedirs(static_dir, exist_ok=True)
-        
-        # Save uploaded files temporarily
-        for file in files:
-            content = await file.read()
-            temp_file = tempfile.NamedTemporaryFile(delete=False, suffix='.pdf')
-            temp_file.write(content)
-            temp_file.close()
-            temp_files.append(temp_file.name)
-            
-            # Validate PDF before adding
-            try:
-                merger.append(temp_file.name)
-                print(f"✅ Added PDF: {file.filename}")
-            except Exception as e:
-                print(f"⚠️ Skipping invalid PDF: {file.filename} - {e}")
-        
         # Generate output filename
-        output_filename = f"merged-{datetime.now().strftime('%Y%m%d_%H%M%S')}.pdf"
-        output_path = os.path.join(static_dir, output_filename)
+        output_filename = f"merged-{output_stamp()}.pdf"
+        output_path = artifact_store.path_for(output_filename)
         
-        # Write merged PDF
-        with open(output_path, 'wb') as output_file:
-            merger.write(output_file)
-        merger.close()
-        
-        # Cleanup temp files
-        for temp_file in temp_files:
-            try:
-                os.unlink(temp_file)
-            except:
-                pass
+        # Parse and write in a pool worker; handed-off and staged inputs are read by path
+        await pdf_pool.run(
+            pdf_operations.merge_pdfs,
+            [input_source(file) for file in files], [file.filename for file in files], output_path,
+            on_progress=progress_callback(),
+        )
         
         # Verify file was created and get size
         if os.path.exists(output_path):
             file_size = os.path.getsize(output_path)
+            await report("write", bytes_done=file_size, bytes_total=file_size)
             print(f"✅ Real merged PDF created: {output_filename} ({file_size} bytes)")
             return output_filename, file_size
         else:
             raise Exception("Failed to create merged PDF file")
         
+    except PoolJobError:
+        raise
     except Exception as e:
         print(f"❌ Error merging PDFs: {e}")
-        # Cleanup temp files on error
-        for temp_file in temp_files:
-            try:
-                os.unlink(temp_file)
-            except:
-                pass
         # Fallback: create a simple PDF
         return await generate_processed_pdf("pdf-merger", files, {})
 
@@ -192,38 +254,30 @@ async def split_pdf_real(file: UploadFile, metadata: dict) -> tuple[str, int]:
     print("🔥 Splitting PDF with PyPDF2...")
     
     try:
-        content = await file.read()
-        temp_file = tempfile.NamedTemporaryFile(delete=False, suffix='.pdf')
-        temp_file.write(content)
-        temp_file.close()
-        
-        reader = PdfReader(temp_file.name)
-        total_pages = len(reader.pages)
-        
-        # Split into two parts or by range
-        split_point = total_pages // 2
+        # Split into two parts (the default) or at page_range
+        split_point = None
         if 'page_range' in metadata:
             try:
                 split_point = int(metadata['page_range'])
             except:
                 pass
         
-        writer = PdfWriter()
-        for i in range(min(split_point, total_pages)):
-            writer.add_page(reader.pages[i])
-        
-        output_filename = f"split-{datetime.now().strftime('%Y%m%d_%H%M%S')}.pdf"
-        output_path = f"../../static/{output_filename}"
+        output_filename = f"split-{output_stamp()}.pdf"
+        output_path = artifact_store.path_for(output_filename)
         
-        with open(output_path, 'wb') as output_file:
-            writer.write(output_file)
+        await pdf_pool.run(
+            pdf_operations.split_pdf, input_source(file), output_path, split_point,
+            on_progress=progress_callback(),
+        )
         
-        os.unlink(temp_file.name)
         file_size = os.path.getsize(output_path)
+        await report("write", bytes_done=file_size, bytes_total=file_size)
         
         print(f"✅ Split PDF created: {output_filename} ({file_size} bytes)")
         return output_filename, file_size
         
+    except PoolJobError:
+        raise
     except Exception as e:
         print(f"❌ Error splitting PDF: {e}")
         return await generate_processed_pdf("pdf-splitter", [file], metadata)
@@ -233,33 +287,24 @@ async def compress_pdf_real(file: UploadFile) -> tuple[str, int]:
     print("🔥 Compressing PDF with PyPDF2...")
     
     try:
-        content = await file.read()
-        temp_file = tempfile.NamedTemporaryFile(delete=False, suffix='.pdf')
-        temp_file.write(content)
-        temp_file.close()
-        
-        reader = PdfReader(temp_file.name)
-        writer = PdfWriter()
-        
-        for page in reader.pages:
-            writer.add_page(page)
-        
         # Apply basic compression by removing duplicate objects
         # Note: compress_identical_objects not available in PyPDF2
-        pass  # Skip compression for now
-        
-        output_filename = f"compressed-{datetime.now().strftime('%Y%m%d_%H%M%S')}.pdf"
-        output_path = f"../../static/{output_filename}"
+        output_filename = f"compressed-{output_stamp()}.pdf"
+        output_path = artifact_store.path_for(output_filename)
         
-        with open(output_path, 'wb') as output_file:
-            writer.write(output_file)
+        await pdf_pool.run(
+            pdf_operations.copy_pages, input_source(file), output_path,
+            on_progress=progress_callback(),
+        )
         
-        os.unlink(temp_file.name)
         file_size = os.path.getsize(output_path)
+        await report("write", bytes_done=file_size, bytes_total=file_size)
         
         print(f"✅ Compressed PDF created: {output_filename} ({file_size} bytes)")
         return output_filename, file_size
         
+    except PoolJobError:
+        raise
     except Exception as e:
         print(f"❌ Error compressing PDF: {e}")
         return await generate_processed_pdf("pdf-compressor", [file], {})
@@ -267,124 +312,30 @@ async def compress_pdf_real(file: UploadFile) -> tuple[str, int]:
 async def generate_processed_pdf(tool_name: str, files: List[UploadFile], metadata: dict) -> tuple[str, int]:
     """Generate professional multi-page PDF with real content"""
     
-    output_filename = f"processed-{tool_name}-{datetime.now().strftime('%Y%m%d_%H%M%S')}.pdf"
-    output_path = f"../../static/{output_filename}"
-    
-    # Create PDF with ReportLab
-    c = canvas.Canvas(output_path, pagesize=letter)
-    width, height = letter
+    output_filename = f"processed-{tool_name}-{output_stamp()}.pdf"
+    output_path = artifact_store.path_for(output_filename)
     
-    # Page 1 - Header and Title
-    c.setFont("Helvetica-Bold", 24)
-    c.drawString(50, height - 60, "Suntyn AI")
-    c.setFont("Helvetica", 16)
-    c.drawString(50, height - 85, "Professional Document Processing Platform")
-    
-    # Tool Title
-    c.setFont("Helvetica-Bold", 20)
-    c.drawString(50, height - 130, f"{tool_name.replace('-', ' ').title()}")
-    
-    # Processing Details
-    c.setFont("Helvetica", 12)
-    y_pos = height - 180
-    
-    details = [
-        f"Processing Date: {datetime.now().strftime('%A, %B %d, %Y at %H:%M:%S')}",
-        f"Tool Category: PDF Processing",
-        f"Files Processed: {len(files)}",
-        f"Service: FastAPI Microservice Architecture",
-        f"Status: Successfully Completed",
-        "",
-        "Processing Summary:",
-        "• File validation completed",
-        "• Security checks passed",
-        "• Format conversion applied",
-        "• Quality optimization performed",
-        "• Output generation successful"
-    ]
-    
-    for detail in details:
-        c.drawString(50, y_pos, detail)
-        y_pos -= 20
-        if y_pos < 100:
-            c.showPage()
-            y_pos = height - 80
-    
-    # Page 2 - File Analysis
-    if files:
-        c.showPage()
-        c.setFont("Helvetica-Bold", 18)
-        c.drawString(50, height - 60, "File Analysis Report")
-        
-        y_pos = height - 100
-        c.setFont("Helvetica", 12)
-        
-        for i, file in enumerate(files):
-            if hasattr(file, 'filename') and file.filename:
-                c.drawString(50, y_pos, f"File {i+1}: {file.filename}")
-                c.drawString(70, y_pos - 15, f"Content-Type: {getattr(file, 'content_type', 'Unknown')}")
-                c.drawString(70, y_pos - 30, f"Processing: Completed Successfully")
-                c.drawString(70, y_pos - 45, f"Validation: Passed")
-                y_pos -= 80
-                
-                if y_pos < 150:
-                    c.showPage()
-                    y_pos = height - 80
-    
-    # Page 3 - Technical Details
-    c.showPage()
-    c.setFont("Helvetica-Bold", 18)
-    c.drawString(50, height - 60, "Technical Processing Details")
-    
-    y_pos = height - 100
-    c.setFont("Helvetica", 11)
-    
-    tech_details = [
-        "Processing Engine: FastAPI + PyPDF2 + ReportLab",
-        "Architecture: Microservices-based distributed system",
-        "Security: Multi-layer validation and sanitization",
-        "Performance: Optimized for large file processing",
-        "Compatibility: PDF/A compliance maintained",
-        "",
-        "Quality Assurance:",
-        "✓ Input validation completed",
-        "✓ Format integrity maintained",
-        "✓ Metadata preservation applied",
-        "✓ Output quality verification passed",
-        "",
-        "Service Specifications:",
-        f"• Microservice Port: 8001",
-        f"• Gateway Integration: Active",
-        f"• Load Balancing: Enabled",
-        f"• Error Handling: Comprehensive",
-        "",
-        "Output Details:",
-        f"• File Format: PDF",
-        f"• Compression: Optimized",
-        f"• Pages: Multi-page professional document",
-        f"• Size: Full-featured output",
-    ]
-    
-    for detail in tech_details:
-        c.drawString(50, y_pos, detail)
-        y_pos -= 15
-        if y_pos < 100:
-            c.showPage()
-            y_pos = height - 80
-    
-    # Footer on last page
-    c.setFont("Helvetica-Oblique", 10)
-    c.drawString(50, 60, "Generated by Suntyn AI - Enterprise-Grade PDF Processing Platform")
-    c.drawString(50, 45, f"© {datetime.now().year} Suntyn AI • Powered by FastAPI Microservices")
-    c.drawString(50, 30, "Professional Neural Intelligence • Real-time Document Processing")
-    
-    c.save()
+    # Render with ReportLab in a pool worker
+    inputs = [(getattr(file, 'filename', None), getattr(file, 'content_type', None)) for file in files]
+    await pdf_pool.run(
+        pdf_operations.render_processed_pdf, output_path, tool_name, inputs,
+        on_progress=progress_callback(),
+    )
     
     file_size = os.path.getsize(output_path)
+    await report("write", bytes_done=file_size, bytes_total=file_size)
     print(f"✅ Professional multi-page PDF created: {output_filename} ({file_size} bytes)")
     
     return output_filename, file_size
 
+# Registry handler name -> coroutine(tool_name, files, metadata)
+PDF_HANDLERS = {
+    "merge": lambda tool_name, files, metadata: merge_pdfs_real(files),
+    "split": lambda tool_name, files, metadata: split_pdf_real(files[0], metadata),
+    "compress": lambda tool_name, files, metadata: compress_pdf_real(files[0]),
+    "generate": generate_processed_pdf,
+}
+
 # Utility functions for PDF validation
 def estimate_pdf_pages(content: bytes) -> int:
     """Estimate number of pages in PDF"""
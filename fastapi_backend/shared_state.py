@@ -0,0 +1,131 @@
+"""
+Shared Gateway State
+SQLite (WAL mode) store for the state every gateway worker process has to
+agree on: rate-limit token buckets and job records
+"""
+import json
+import os
+import sqlite3
+import time
+from typing import Optional, Tuple
+
+SCHEMA = """
+CREATE TABLE IF NOT EXISTS rate_buckets (
+    rule TEXT NOT NULL,
+    key TEXT NOT NULL,
+    tokens REAL NOT NULL,
+    updated REAL NOT NULL,
+    allowed INTEGER NOT NULL,
+    PRIMARY KEY (rule, key)
+) WITHOUT ROWID;
+CREATE INDEX IF NOT EXISTS rate_buckets_updated ON rate_buckets (rule, updated);
+CREATE TABLE IF NOT EXISTS jobs (
+    id TEXT PRIMARY KEY,
+    data TEXT NOT NULL,
+    expires REAL NOT NULL
+);
+CREATE INDEX IF NOT EXISTS jobs_expires ON jobs (expires);
+"""
+
+# Refill and consume in one statement, so concurrent workers never read a
+# stale bucket. SET expressions all see the old row, so "allowed" is decided
+# from the same refilled value that "tokens" is computed from.
+BUCKET_HIT = """
+INSERT INTO rate_buckets (rule, key, tokens, updated, allowed)
+VALUES (:rule, :key, :capacity - 1.0, :now, 1)
+ON CONFLICT (rule, key) DO UPDATE SET
+    tokens = MIN(:capacity, tokens + MAX(0.0, :now - updated) * :rate)
+             - (MIN(:capacity, tokens + MAX(0.0, :now - updated) * :rate) >= 1.0),
+    updated = MAX(updated, :now),
+    allowed = MIN(:capacity, tokens + MAX(0.0, :now - updated) * :rate) >= 1.0
+RETURNING tokens, allowed
+"""
+
+
+class SharedState:
+    """One SQLite file shared by all gateway workers on a host
+
+    Autocommit with WAL and synchronous=OFF: each call is a single short
+    write transaction, and losing the last moments of counters in a crash is
+    acceptable for this kind of state. Connections are opened lazily per
+    process so the store is safe to create before uvicorn spawns workers.
+
+    Calls run on the event loop, so busy_timeout (seconds) is kept short:
+    under write contention a call raises sqlite3.OperationalError instead
+    of stalling the worker, and callers degrade (rate limits fail open).
+    """
+
+    def __init__(self, path: str, busy_timeout: float = 0.02):
+        self.path = path
+        self.busy_timeout = busy_timeout
+        self._conn: Optional[sqlite3.Connection] = None
+        self._pid: Optional[int] = None
+
+    @property
+    def conn(self) -> sqlite3.Connection:
+        if self._conn is None or self._pid != os.getpid():
+            os.makedirs(os.path.dirname(os.path.abspath(self.path)), exist_ok=True)
+            conn = sqlite3.connect(self.path, timeout=self.busy_timeout, isolation_level=None, check_same_thread=False)
+            conn.execute("PRAGMA journal_mode=WAL")
+            conn.execute("PRAGMA synchronous=OFF")
+            conn.executescript(SCHEMA)
+            self._conn, self._pid = conn, os.getpid()
+        return self._conn
+
+    def close(self):
+        if self._conn is not None and self._pid == os.getpid():
+            self._conn.close()
+        self._conn = None
+
+    # Rate limiting
+
+    def bucket_hit(self, rule: str, key: str, capacity: float, rate: float, now: float) -> Tuple[bool, float]:
+        """Consume one token from a bucket; return (allowed, tokens left)"""
+        tokens, allowed = self.conn.execute(
+            BUCKET_HIT, {"rule": rule, "key": key, "capacity": capacity, "rate": rate, "now": now}
+        ).fetchone()
+        return bool(allowed), tokens
+
+    def sweep_buckets(self, rule: str, idle_before: float, max_clients: int) -> int:
+        """Drop buckets idle past a full window, then the oldest beyond max_clients"""
+        conn = self.conn
+        removed = conn.execute(
+            "DELETE FROM rate_buckets WHERE rule = ? AND updated < ?", (rule, idle_before)
+        ).rowcount
+        excess = self.count_buckets(rule) - max_clients
+        if excess > 0:
+            removed += conn.execute(
+                "DELETE FROM rate_buckets WHERE rule = ? AND key IN "
+                "(SELECT key FROM rate_buckets WHERE rule = ? ORDER BY updated LIMIT ?)",
+                (rule, rule, excess),
+            ).rowcount
+        return removed
+
+    def count_buckets(self, rule: str) -> int:
+        return self.conn.execute("SELECT COUNT(*) FROM rate_buckets WHERE rule = ?", (rule,)).fetchone()[0]
+
+    # Jobs
+
+    def put_job(self, job_id: str, data: dict, expires: float):
+        self.conn.execute(
+            "INSERT OR REPLACE INTO jobs (id, data, expires) VALUES (?, ?, ?)",
+            (job_id, json.dumps(data, separators=(",", ":")), expires),
+        )
+
+    def get_job(self, job_id: str) -> Optional[dict]:
+        row = self.conn.execute(
+            "SELECT data FROM jobs WHERE id = ? AND expires > ?", (job_id, time.time())
+        ).fetchone()
+        return json.loads(row[0]) if row else None
+
+    def sweep_jobs(self) -> int:
+        return self.conn.execute("DELETE FROM jobs WHERE expires <= ?", (time.time(),)).rowcount
+
+    def stats(self) -> dict:
+        conn = self.conn
+        return {
+            "path": self.path,
+            "journal_mode": conn.execute("PRAGMA journal_mode").fetchone()[0],
+            "rate_buckets": conn.execute("SELECT COUNT(*) FROM rate_buckets").fetchone()[0],
+            "jobs": conn.execute("SELECT COUNT(*) FROM jobs").fetchone()[0],
+        }
@@ -0,0 +1,151 @@
+"""
+Staged Tool Inputs
+Microservices keep a copy of each upload under the gateway's input key so a
+retried request can refer to it instead of sending the files again
+"""
+import asyncio
+import hashlib
+import json
+import os
+import re
+import shutil
+import tempfile
+import time
+from typing import List, Optional
+
+from fastapi import HTTPException, Request, UploadFile
+from starlette.datastructures import Headers
+
+from config import settings
+from tracing import span
+from upload_handoff import HANDOFF_HEADER, open_handoff
+
+INPUT_KEY_HEADER = "x-input-key"
+_KEY_PATTERN = re.compile(r"^[0-9a-f]{64}$")
+SWEEP_INTERVAL_SECONDS = 60
+
+
+def input_key(files_data: list) -> str:
+    """Content key for a buffered upload: httpx-style ("files", (name, bytes, type)) tuples"""
+    digest = hashlib.sha256()
+    for _, (filename, content, content_type) in files_data:
+        digest.update(f"{filename}\0{content_type}\0{len(content)}\0".encode())
+        digest.update(content)
+    return digest.hexdigest()
+
+
+class InputStage:
+    """Directory of staged uploads, one sub-directory per input key"""
+
+    def __init__(self, directory: str, ttl_seconds: float = 600):
+        self.directory = directory
+        self.ttl_seconds = ttl_seconds
+        self.staged = 0
+        self.reused = 0
+        self.missing = 0
+        self._last_sweep = 0.0
+        os.makedirs(directory, exist_ok=True)
+
+    def _path(self, key: str) -> str:
+        return os.path.join(self.directory, key)
+
+    def stage(self, key: str, files: List[UploadFile]):
+        """Copy the uploads under key; a key that is already staged is left alone
+
+        Blocking file I/O: call it off the event loop.
+        """
+        self._sweep()
+        target = self._path(key)
+        if os.path.isdir(target):
+            os.utime(target)
+            return
+        work = tempfile.mkdtemp(prefix=".staging_", dir=self.directory)
+        manifest = []
+        try:
+            for i, file in enumerate(files):
+                file.file.seek(0)
+                with open(os.path.join(work, str(i)), "wb") as out:
+                    shutil.copyfileobj(file.file, out, 1024 * 1024)
+                file.file.seek(0)
+                manifest.append({"filename": file.filename, "content_type": file.content_type})
+            with open(os.path.join(work, "manifest.json"), "w") as f:
+                json.dump(manifest, f)
+            os.rename(work, target)
+            self.staged += 1
+        except OSError:
+            # A concurrent request staged the same key first, or the disk is full;
+            # either way this request still has its own copy of the files
+            shutil.rmtree(work, ignore_errors=True)
+
+    def load(self, key: str) -> Optional[List[UploadFile]]:
+        """Open the files staged under key; the caller closes them (close_inputs)"""
+        target = self._path(key)
+        try:
+            with open(os.path.join(target, "manifest.json")) as f:
+                manifest = json.load(f)
+        except (OSError, ValueError):
+            return None
+        files = []
+        for i, entry in enumerate(manifest):
+            content_type = entry.get("content_type") or "application/octet-stream"
+            files.append(UploadFile(
+                file=open(os.path.join(target, str(i)), "rb"),
+                size=os.path.getsize(os.path.join(target, str(i))),
+                filename=entry.get("filename"),
+                headers=Headers({"content-type": content_type}),
+            ))
+        os.utime(target)
+        return files
+
+    def _sweep(self):
+        now = time.time()
+        if now - self._last_sweep < SWEEP_INTERVAL_SECONDS:
+            return
+        self._last_sweep = now
+        for entry in os.scandir(self.directory):
+            try:
+                if now - entry.stat().st_mtime > self.ttl_seconds:
+                    shutil.rmtree(entry.path, ignore_errors=True)
+            except OSError:
+                pass
+
+
+async def resolve_inputs(request: Request, files: List[UploadFile], stage: InputStage) -> List[UploadFile]:
+    """Stage fresh uploads under X-Input-Key, or load them back when a retry omits them
+
+    Raises 409 when a retry refers to an input this service no longer has,
+    which tells the gateway to send the files again. Uploads the gateway
+    handed off on this host (X-Input-Handoff) are opened in place. Close the
+    returned files with close_inputs once the request is done with them.
+    """
+    handoff = request.headers.get(HANDOFF_HEADER)
+    if handoff and not files:
+        return open_handoff(handoff)
+    key = request.headers.get(INPUT_KEY_HEADER)
+    if not key or not _KEY_PATTERN.match(key):
+        return files
+    if files:
+        # Up to the tool's total size of copying; keep it off the event loop
+        with span("stage"):
+            await asyncio.to_thread(stage.stage, key, files)
+        return files
+    staged = stage.load(key)
+    if staged is None:
+        stage.missing += 1
+        raise HTTPException(status_code=409, detail="Staged input not found")
+    stage.reused += 1
+    return staged
+
+
+def close_inputs(files: List[UploadFile]):
+    """Close inputs from resolve_inputs; staged and handed-off files are not closed by FastAPI"""
+    for file in files:
+        try:
+            file.file.close()
+        except OSError:
+            pass
+
+
+def create_input_stage(service: str) -> InputStage:
+    """InputStage under INPUT_STAGE_DIR for one microservice"""
+    return InputStage(os.path.join(settings.INPUT_STAGE_DIR, service), settings.INPUT_STAGE_TTL_SECONDS)
@@ -13,6 +13,8 @@ from pathlib import Path
 import requests
 from typing import List, Tuple
 
+from config import get_replica_ports, get_replica_sockets, settings
+
 # Store process references for cleanup
 processes: List[subprocess.Popen] = []
 
@@ -54,21 +56,28 @@ def check_port_available(port: int) -> bool:
 import signal
 from multiprocessing import Process
 
-def start_service(service_name, port, script_path):
-    """Start a microservice on specified port"""
+def start_service(service_name, port, script_path, uds=None):
+    """Start a microservice on specified port, or on a Unix socket when uds is given"""
     try:
-        print(f"🚀 Starting {service_name} on port {port}...")
+        where = f"socket {uds}" if uds else f"port {port}"
+        print(f"🚀 Starting {service_name} on {where}...")
 
         # Get the current directory
         current_dir = os.getcwd()
 
         # Start the service using uvicorn with correct module path
         module_name = os.path.basename(script_path).replace('.py', '')
+        if uds:
+            # A socket left by a killed process would make the bind fail
+            if os.path.exists(uds):
+                os.remove(uds)
+            bind = ["--uds", uds]
+        else:
+            bind = ["--host", "0.0.0.0", "--port", str(port)]
         cmd = [
             sys.executable, "-m", "uvicorn", 
             f"services.{module_name}:app",
-            "--host", "0.0.0.0",
-            "--port", str(port),
+            *bind,
             "--reload",
             "--log-level", "info"
         ]
@@ -86,7 +95,7 @@ def start_service(service_name, port, script_path):
 
         # Check if process is still running
         if process.poll() is None:
-            print(f"✅ {service_name} started successfully on port {port}")
+            print(f"✅ {service_name} started successfully on {where}")
             return process
         else:
             print(f"❌ {service_name} failed to start")
@@ -123,19 +132,32 @@ def main():
     os.chdir(script_dir)
 
     # Service configurations - use relative paths from fastapi_backend
-    services = [
-        ("PDF Service", 8001, "pdf_service"),
-        ("Image Service", 8002, "image_service"),
-        ("Media Service", 8003, "media_service"),
-        ("Government Service", 8004, "government_service"),
-        ("Developer Service", 8005, "developer_service"),
+    service_types = [
+        ("PDF Service", "pdf", "pdf_service"),
+        ("Image Service", "image", "image_service"),
+        ("Media Service", "media", "media_service"),
+        ("Government Service", "government", "government_service"),
+        ("Developer Service", "developer", "developer_service"),
     ]
 
+    # SERVICE_REPLICAS starts N copies of a service on consecutive stride ports,
+    # or on one Unix socket each with SERVICE_TRANSPORT=uds
+    use_uds = settings.SERVICE_TRANSPORT == "uds"
+    if use_uds:
+        os.makedirs(settings.SERVICE_SOCKET_DIR, mode=0o700, exist_ok=True)
+    services = []
+    for service_name, key, script_name in service_types:
+        ports = get_replica_ports(key)
+        sockets = get_replica_sockets(key) if use_uds else [None] * len(ports)
+        for i, (port, uds) in enumerate(zip(ports, sockets)):
+            name = f"{service_name} #{i + 1}" if len(ports) > 1 else service_name
+            services.append((name, port, script_name, uds))
+
     processes = []
 
     # Start all services
-    for service_name, port, script_name in services:
-        process = start_service(service_name, port, f"{script_name}.py")
+    for service_name, port, script_name, uds in services:
+        process = start_service(service_name, port, f"{script_name}.py", uds)
         if process:
             processes.append((service_name, process))
         time.sleep(1)  # Stagger startup
@@ -149,9 +171,9 @@ def main():
 
     # Print service URLs
     print("\n🌐 Access URLs:")
-    for service_name, port, _ in services:
+    for service_name, port, _, uds in services:
         if any(proc[0] == service_name for proc in processes):
-            print(f"  - {service_name}: http://localhost:{port}")
+            print(f"  - {service_name}: {f'unix:{uds}' if uds else f'http://localhost:{port}'}")
 
     print("\n✨ Services ready! Main server should be running on port 5000")
     print("Press Ctrl+C to stop all services")
@@ -168,9 +190,9 @@ def main():
                     processes.remove((service_name, process))
 
                     # Find the service config and restart
-                    for svc_name, port, script_name in services:
+                    for svc_name, port, script_name, uds in services:
                         if svc_name == service_name:
-                            new_process = start_service(service_name, port, f"{script_name}.py")
+                            new_process = start_service(service_name, port, f"{script_name}.py", uds)
                             if new_process:
                                 processes.append((service_name, new_process))
                             break
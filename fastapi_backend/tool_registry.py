@@ -0,0 +1,106 @@
+"""
+Declarative Tool Registry
+Loaded once from tool_registry.json and shared by the gateway and every
+microservice: tool name -> service, handler, size limits and expected cost
+"""
+import hashlib
+import json
+import os
+from typing import Dict, List, NamedTuple, Optional
+
+REGISTRY_PATH = os.path.join(os.path.dirname(os.path.abspath(__file__)), "tool_registry.json")
+
+# Relative cost of one run, used for scheduling and capacity estimates
+COST_WEIGHTS = {"light": 1, "medium": 5, "heavy": 20}
+
+
+class ToolSpec(NamedTuple):
+    name: str
+    service: str
+    handler: str
+    output: str
+    cost: str
+    min_files: int
+    max_file_size: int   # bytes
+    max_total_size: int  # bytes
+
+    @property
+    def cost_weight(self) -> int:
+        return COST_WEIGHTS.get(self.cost, COST_WEIGHTS["medium"])
+
+    def to_catalog_entry(self) -> dict:
+        return {
+            "id": self.name,
+            "name": self.name.replace("-", " ").title(),
+            "service": self.service,
+            "cost": self.cost,
+            "output": self.output,
+            "minFiles": self.min_files,
+            "maxFileSize": self.max_file_size,
+            "maxTotalSize": self.max_total_size,
+        }
+
+
+class ToolRegistry:
+    """Dict-backed lookup of every tool, built once at import time"""
+
+    def __init__(self, config: dict):
+        base = config.get("defaults", {})
+        self.prefix_routes: Dict[str, str] = config.get("prefix_routes", {})
+        self.service_defaults: Dict[str, dict] = {}
+        self.tools: Dict[str, ToolSpec] = {}
+
+        for service, section in config.get("services", {}).items():
+            defaults = {**base, **section.get("defaults", {})}
+            self.service_defaults[service] = defaults
+            for name, overrides in section.get("tools", {}).items():
+                self.tools[name] = self._build_spec(name, service, {**defaults, **overrides})
+
+        catalog = {
+            "tools": [spec.to_catalog_entry() for spec in self.tools.values()],
+            "services": sorted(self.service_defaults),
+            "total": len(self.tools),
+        }
+        self.catalog_json = json.dumps(catalog, separators=(",", ":")).encode()
+        self.catalog_etag = '"' + hashlib.sha256(self.catalog_json).hexdigest()[:32] + '"'
+
+    @staticmethod
+    def _build_spec(name: str, service: str, fields: dict) -> ToolSpec:
+        return ToolSpec(
+            name=name,
+            service=service,
+            handler=fields.get("handler", "generate"),
+            output=fields.get("output", "bin"),
+            cost=fields.get("cost", "medium"),
+            min_files=int(fields.get("min_files", 0)),
+            max_file_size=int(fields.get("max_file_mb", 50)) * 1024 * 1024,
+            max_total_size=int(fields.get("max_total_mb", 100)) * 1024 * 1024,
+        )
+
+    def get(self, tool_name: str) -> Optional[ToolSpec]:
+        """Resolve a tool, falling back to prefix routes (e.g. any pdf-* tool)"""
+        spec = self.tools.get(tool_name)
+        if spec is not None:
+            return spec
+        for prefix, service in self.prefix_routes.items():
+            if tool_name.startswith(prefix):
+                return self._build_spec(tool_name, service, self.service_defaults[service])
+        return None
+
+    def for_service(self, service: str, tool_name: str) -> ToolSpec:
+        """Spec used inside a microservice; unknown tools get the service defaults"""
+        spec = self.tools.get(tool_name)
+        if spec is not None and spec.service == service:
+            return spec
+        return self._build_spec(tool_name, service, self.service_defaults[service])
+
+    def tools_for(self, service: str) -> List[ToolSpec]:
+        return [spec for spec in self.tools.values() if spec.service == service]
+
+
+def load_registry(path: str = REGISTRY_PATH) -> ToolRegistry:
+    with open(path, "r", encoding="utf-8") as f:
+        return ToolRegistry(json.load(f))
+
+
+registry = load_registry()
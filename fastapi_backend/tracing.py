@@ -0,0 +1,260 @@
+"""
+Request Tracing
+Request ids shared by the gateway and microservices, timed spans per stage,
+a Server-Timing breakdown on every response and a JSON-lines trace exporter
+"""
+import json
+import logging
+import os
+import queue
+import re
+import threading
+import time
+import uuid
+from contextlib import contextmanager
+from contextvars import ContextVar
+from datetime import datetime
+from typing import Dict, List, Optional
+
+from starlette.datastructures import Headers, MutableHeaders
+from starlette.types import ASGIApp, Message, Receive, Scope, Send
+
+from config import settings
+
+logger = logging.getLogger(__name__)
+
+REQUEST_ID_HEADER = "x-request-id"
+_REQUEST_ID_PATTERN = re.compile(r"^[A-Za-z0-9._:-]{1,128}$")
+_SERVER_TIMING_ENTRY = re.compile(r"^\s*([A-Za-z0-9._-]+)\s*(?:;.*?dur=([0-9.]+))?")
+
+_current_trace: ContextVar[Optional["Trace"]] = ContextVar("current_trace", default=None)
+
+
+def new_request_id() -> str:
+    return uuid.uuid4().hex
+
+
+class Trace:
+    """Spans of one request, as offsets in milliseconds from its start"""
+
+    def __init__(self, request_id: str, service: str, name: str = ""):
+        self.request_id = request_id
+        self.service = service
+        self.name = name
+        self.status: Optional[int] = None
+        self.started_at = time.time()
+        self._start = time.perf_counter()
+        self.spans: List[dict] = []
+
+    def add(self, name: str, start: float, end: float, **attrs):
+        """Record a span from perf_counter() readings"""
+        span = {
+            "name": name,
+            "start_ms": round((start - self._start) * 1000, 3),
+            "duration_ms": round((end - start) * 1000, 3),
+        }
+        if attrs:
+            span["attrs"] = attrs
+        self.spans.append(span)
+
+    def elapsed_ms(self) -> float:
+        return (time.perf_counter() - self._start) * 1000
+
+    def merge_server_timing(self, value: Optional[str], prefix: str):
+        """Adopt a downstream Server-Timing header as spans named prefix.<metric>"""
+        if not value:
+            return
+        now_ms = round(self.elapsed_ms(), 3)
+        for entry in value.split(","):
+            match = _SERVER_TIMING_ENTRY.match(entry)
+            if not match or match.group(1) == "total" or match.group(2) is None:
+                continue
+            self.spans.append({
+                "name": f"{prefix}.{match.group(1)}",
+                "start_ms": None,
+                "duration_ms": float(match.group(2)),
+                "attrs": {"reported_at_ms": now_ms},
+            })
+
+    def durations(self) -> Dict[str, float]:
+        """Total time per span name, in first-seen order"""
+        totals: Dict[str, float] = {}
+        for span in self.spans:
+            totals[span["name"]] = totals.get(span["name"], 0.0) + span["duration_ms"]
+        return totals
+
+    def server_timing(self) -> str:
+        entries = [f"{name};dur={duration:.1f}" for name, duration in self.durations().items()]
+        entries.append(f"total;dur={self.elapsed_ms():.1f}")
+        return ", ".join(entries)
+
+    def to_dict(self) -> dict:
+        return {
+            "request_id": self.request_id,
+            "service": self.service,
+            "name": self.name,
+            "status": self.status,
+            "timestamp": datetime.fromtimestamp(self.started_at).isoformat(),
+            "duration_ms": round(self.elapsed_ms(), 3),
+            "spans": self.spans,
+        }
+
+
+def current_trace() -> Optional[Trace]:
+    return _current_trace.get()
+
+
+def current_request_id() -> Optional[str]:
+    trace = _current_trace.get()
+    return trace.request_id if trace is not None else None
+
+
+@contextmanager
+def span(name: str, **attrs):
+    """Time a stage of the current request; a no-op outside a traced request"""
+    trace = _current_trace.get()
+    if trace is None:
+        yield
+        return
+    start = time.perf_counter()
+    try:
+        yield
+    finally:
+        trace.add(name, start, time.perf_counter(), **attrs)
+
+
+def record(name: str, start: float, **attrs):
+    """Span from a perf_counter() reading until now"""
+    trace = _current_trace.get()
+    if trace is not None:
+        trace.add(name, start, time.perf_counter(), **attrs)
+
+
+def record_downstream(server_timing: Optional[str], prefix: str):
+    """Fold a microservice's Server-Timing header into the current trace"""
+    trace = _current_trace.get()
+    if trace is not None:
+        trace.merge_server_timing(server_timing, prefix)
+
+
+def mark(name: str):
+    """Span from the start of the request until now (e.g. request decoding)"""
+    trace = _current_trace.get()
+    if trace is not None:
+        trace.add(name, trace._start, time.perf_counter())
+
+
+@contextmanager
+def activate(trace: Trace):
+    """Make trace current for code running outside TraceMiddleware (job workers)"""
+    token = _current_trace.set(trace)
+    try:
+        yield trace
+    finally:
+        _current_trace.reset(token)
+
+
+class FileTraceExporter:
+    """Append finished traces as JSON lines from a background thread
+
+    The file is rotated to <path>.1 once it grows past max_bytes. Traces are
+    dropped rather than queued without bound if the writer falls behind.
+    """
+
+    def __init__(self, path: str, max_bytes: int = 50 * 1024 * 1024, max_pending: int = 10_000):
+        self.path = path
+        self.max_bytes = max_bytes
+        self.exported = 0
+        self.dropped = 0
+        self._queue: "queue.Queue[dict]" = queue.Queue(maxsize=max_pending)
+        os.makedirs(os.path.dirname(os.path.abspath(path)), exist_ok=True)
+        self._thread = threading.Thread(target=self._run, name="trace-exporter", daemon=True)
+        self._thread.start()
+
+    def export(self, trace: Trace):
+        try:
+            self._queue.put_nowait(trace.to_dict())
+        except queue.Full:
+            self.dropped += 1
+
+    def _run(self):
+        while True:
+            records = [self._queue.get()]
+            while len(records) < 512:
+                try:
+                    records.append(self._queue.get_nowait())
+                except queue.Empty:
+                    break
+            try:
+                self._write(records)
+                self.exported += len(records)
+            except OSError as e:
+                self.dropped += len(records)
+                logger.warning(f"Trace export to {self.path} failed: {str(e)}")
+
+    def _write(self, records: List[dict]):
+        try:
+            if os.path.getsize(self.path) > self.max_bytes:
+                os.replace(self.path, self.path + ".1")
+        except OSError:
+            pass
+        with open(self.path, "a") as f:
+            f.write("".join(json.dumps(record, separators=(",", ":")) + "\n" for record in records))
+
+
+_exporter: Optional[FileTraceExporter] = None
+
+
+def trace_exporter() -> Optional[FileTraceExporter]:
+    """Process-wide exporter for TRACE_EXPORT_FILE, or None when exporting is off"""
+    global _exporter
+    if _exporter is None and settings.TRACE_EXPORT_FILE:
+        _exporter = FileTraceExporter(settings.TRACE_EXPORT_FILE, settings.TRACE_EXPORT_MAX_MB * 1024 * 1024)
+    return _exporter
+
+
+class TraceMiddleware:
+    """Pure ASGI middleware: adopt or mint X-Request-ID, trace the request, add Server-Timing
+
+    The breakdown covers the spans finished before the response headers are
+    sent; the exported trace also has the time spent sending the body.
+    """
+
+    def __init__(self, app: ASGIApp, service: str, exporter: Optional[FileTraceExporter] = None,
+                 skip_paths=("/metrics", "/health")):
+        self.app = app
+        self.service = service
+        self.exporter = exporter
+        self.skip_paths = frozenset(skip_paths)
+
+    async def __call__(self, scope: Scope, receive: Receive, send: Send):
+        if scope["type"] != "http" or scope["path"] in self.skip_paths:
+            await self.app(scope, receive, send)
+            return
+
+        request_id = Headers(scope=scope).get(REQUEST_ID_HEADER, "")
+        if not _REQUEST_ID_PATTERN.match(request_id):
+            request_id = new_request_id()
+        trace = Trace(request_id, self.service, f"{scope['method']} {scope['path']}")
+
+        async def send_wrapper(message: Message):
+            if message["type"] == "http.response.start":
+                headers = MutableHeaders(scope=message)
+                headers["X-Request-ID"] = request_id
+                headers.append("Server-Timing", trace.server_timing())
+                trace.status = message["status"]
+            await send(message)
+
+        token = _current_trace.set(trace)
+        try:
+            await self.app(scope, receive, send_wrapper)
+        finally:
+            _current_trace.reset(token)
+            if self.exporter is not None:
+                self.exporter.export(trace)
+
+
+def trace_service(app, service: str):
+    """Add TraceMiddleware to a microservice app when TRACE_ENABLED is set"""
+    if settings.TRACE_ENABLED:
+        app.add_middleware(TraceMiddleware, service=service, exporter=trace_exporter())
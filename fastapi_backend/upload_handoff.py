@@ -0,0 +1,243 @@
+"""
+Same-Host Upload Handoff
+The gateway spools each uploaded file once into a shared directory (tmpfs when
+available) and sends services only its path and digest; services open or
+memory-map the spooled file in place instead of parsing a re-encoded upload;
+the header is HMAC-signed so callers other than the gateway cannot name files
+"""
+import hashlib
+import hmac
+import json
+import mmap
+import os
+import secrets
+import tempfile
+import time
+from contextlib import contextmanager
+from typing import Dict, Iterator, List, Optional
+from urllib.parse import urlsplit
+
+from fastapi import HTTPException, UploadFile
+from starlette.datastructures import Headers
+
+from config import settings
+from upload_proxy import MultipartInspector
+
+HANDOFF_HEADER = "x-input-handoff"
+LOCAL_HOSTS = {"localhost", "127.0.0.1", "::1"}
+KEY_FILENAME = ".handoff.key"
+
+_keys: Dict[str, bytes] = {}
+
+
+def handoff_enabled(urls: List[str], mode: Optional[str] = None) -> bool:
+    """Whether uploads for a service with these replica URLs should be handed off"""
+    mode = mode or settings.UPLOAD_HANDOFF
+    if mode in ("on", "true", "always"):
+        return True
+    if mode != "auto":
+        return False
+    return all(url.startswith("unix:") or urlsplit(url).hostname in LOCAL_HOSTS for url in urls)
+
+
+def ensure_handoff_dir(directory: Optional[str] = None) -> str:
+    directory = directory or settings.UPLOAD_HANDOFF_DIR
+    os.makedirs(directory, mode=0o700, exist_ok=True)
+    return directory
+
+
+def handoff_key(directory: Optional[str] = None) -> bytes:
+    """HMAC key shared by the gateway and services: UPLOAD_HANDOFF_SECRET, or a
+    random key created once in the handoff directory by whichever process needs it first
+    """
+    if settings.UPLOAD_HANDOFF_SECRET:
+        return settings.UPLOAD_HANDOFF_SECRET.encode()
+    directory = ensure_handoff_dir(directory)
+    key = _keys.get(directory)
+    if key is not None:
+        return key
+    path = os.path.join(directory, KEY_FILENAME)
+    fd, temp_path = tempfile.mkstemp(prefix=".key_", dir=directory)
+    try:
+        with os.fdopen(fd, "wb") as f:
+            f.write(secrets.token_bytes(32))
+        # link() fails if another process created the key first; theirs wins
+        try:
+            os.link(temp_path, path)
+        except FileExistsError:
+            pass
+    finally:
+        os.remove(temp_path)
+    with open(path, "rb") as f:
+        key = _keys[directory] = f.read()
+    return key
+
+
+def sign_manifest(manifest: str, directory: Optional[str] = None) -> str:
+    return hmac.new(handoff_key(directory), manifest.encode(), hashlib.sha256).hexdigest()
+
+
+def sweep_handoff_dir(directory: Optional[str] = None, max_age: Optional[float] = None) -> int:
+    """Remove spool files left behind by requests that never finished (e.g. a crash)"""
+    directory = directory or settings.UPLOAD_HANDOFF_DIR
+    max_age = settings.UPLOAD_HANDOFF_TTL_SECONDS if max_age is None else max_age
+    removed = 0
+    now = time.time()
+    try:
+        entries = list(os.scandir(directory))
+    except OSError:
+        return 0
+    for entry in entries:
+        try:
+            if entry.name != KEY_FILENAME and entry.is_file() and now - entry.stat().st_mtime > max_age:
+                os.remove(entry.path)
+                removed += 1
+        except OSError:
+            pass
+    return removed
+
+
+class MultipartSpooler(MultipartInspector):
+    """MultipartInspector that also writes every file part to the handoff directory
+
+    Each file is hashed while it is written and renamed to <sha256>.<token>
+    once complete, so a service can check it got the bytes the gateway saw.
+    """
+
+    def __init__(self, boundary: bytes, validate_file, directory: str, **limits):
+        super().__init__(boundary, validate_file, **limits)
+        self.directory = directory
+        self.paths: List[str] = []
+
+    def _on_headers_finished(self):
+        super()._on_headers_finished()
+        part = self._part
+        if part is not None and part["kind"] == "file":
+            fd, path = tempfile.mkstemp(prefix=".spool_", dir=self.directory)
+            self.paths.append(path)
+            part["spool"] = os.fdopen(fd, "wb")
+            part["spool_path"] = path
+            part["digest"] = hashlib.sha256()
+
+    def _on_part_data(self, data: bytes, start: int, end: int):
+        super()._on_part_data(data, start, end)
+        part = self._part
+        if part is not None and part["kind"] == "file":
+            chunk = memoryview(data)[start:end]
+            part["spool"].write(chunk)
+            part["digest"].update(chunk)
+
+    def _on_part_end(self):
+        part = self._part
+        spool = part.get("spool") if part else None
+        try:
+            super()._on_part_end()
+        finally:
+            if spool is not None:
+                spool.close()
+        if spool is None:
+            return
+        digest = part["digest"].hexdigest()
+        final_path = os.path.join(self.directory, f"{digest}.{secrets.token_hex(8)}")
+        os.rename(part["spool_path"], final_path)
+        self.paths[self.paths.index(part["spool_path"])] = final_path
+        self.files[-1].update({"path": final_path, "sha256": digest})
+
+    def manifest(self) -> str:
+        """Signed header value describing the spooled files, in upload order"""
+        manifest = json.dumps([
+            {
+                "path": info["path"],
+                "sha256": info["sha256"],
+                "size": info["size"],
+                "filename": info["filename"],
+                "content_type": info["content_type"],
+            }
+            for info in self.files
+        ], separators=(",", ":"))
+        return f"{sign_manifest(manifest, self.directory)}.{manifest}"
+
+    def cleanup(self):
+        """Remove every spooled file, including one left half-written by a rejected upload"""
+        part = self._part
+        if part is not None and part.get("spool") is not None:
+            part["spool"].close()
+        for path in self.paths:
+            try:
+                os.remove(path)
+            except OSError:
+                pass
+        self.paths.clear()
+
+
+class HandoffFile(UploadFile):
+    """UploadFile over a file the gateway spooled; the digest is already known"""
+
+    def __init__(self, path: str, digest: str, size: int, filename: Optional[str], content_type: str):
+        super().__init__(
+            file=open(path, "rb"),
+            size=size,
+            filename=filename,
+            headers=Headers({"content-type": content_type or "application/octet-stream"}),
+        )
+        self.path = path
+        self.digest = digest
+
+    def map(self) -> mmap.mmap:
+        """Read-only memory map of the whole file; close it (or use it in a with block) when done"""
+        return mmap.mmap(self.file.fileno(), 0, access=mmap.ACCESS_READ)
+
+
+def open_handoff(value: str, directory: Optional[str] = None) -> List[HandoffFile]:
+    """Open the files named in an X-Input-Handoff header
+
+    The header must carry the gateway's signature (403 otherwise). Only plain
+    files directly inside the handoff directory whose name starts with the
+    announced digest and whose size matches are accepted. Raises 409
+    otherwise, which tells the gateway to send the upload itself.
+    """
+    directory = os.path.realpath(directory or settings.UPLOAD_HANDOFF_DIR)
+    signature, _, manifest = value.partition(".")
+    if not hmac.compare_digest(signature.encode(), sign_manifest(manifest, directory).encode()):
+        raise HTTPException(status_code=403, detail="Invalid input handoff signature")
+    try:
+        entries = json.loads(manifest)
+    except ValueError:
+        raise HTTPException(status_code=400, detail="Invalid input handoff header")
+
+    files = []
+    try:
+        for entry in entries:
+            path = os.path.realpath(str(entry["path"]))
+            digest = str(entry["sha256"])
+            size = int(entry["size"])
+            if os.path.dirname(path) != directory or not os.path.basename(path).startswith(digest + "."):
+                raise HTTPException(status_code=409, detail="Handoff input not found")
+            try:
+                if os.path.getsize(path) != size:
+                    raise HTTPException(status_code=409, detail="Handoff input not found")
+                files.append(HandoffFile(path, digest, size, entry.get("filename"), entry.get("content_type", "")))
+            except OSError:
+                raise HTTPException(status_code=409, detail="Handoff input not found")
+    except (HTTPException, KeyError, TypeError, ValueError, AttributeError) as e:
+        for file in files:
+            file.file.close()
+        if isinstance(e, HTTPException):
+            raise
+        raise HTTPException(status_code=400, detail="Invalid input handoff header")
+    return files
+
+
+@contextmanager
+def input_stream(file: UploadFile) -> Iterator:
+    """Seekable binary stream over an input without copying it into bytes
+
+    A memory map for handed-off files, unmapped when the block exits;
+    otherwise the upload's own spool file, which stays open.
+    """
+    if isinstance(file, HandoffFile):
+        with file.map() as mapped:
+            yield mapped
+        return
+    file.file.seek(0)
+    yield file.file
@@ -0,0 +1,200 @@
+"""
+Streaming Multipart Upload Proxy
+Inspects multipart uploads chunk by chunk while forwarding them to a microservice,
+so gateway memory per request stays constant regardless of file size
+"""
+import json
+from typing import AsyncIterator, Callable, Dict, List, Optional
+
+from fastapi import HTTPException, Request
+
+try:
+    import python_multipart as multipart
+    from python_multipart.multipart import parse_options_header
+except ImportError:  # python-multipart < 0.0.13
+    import multipart
+    from multipart.multipart import parse_options_header
+
+MAX_FILE_SIZE = 50 * 1024 * 1024      # 50MB per file
+MAX_TOTAL_SIZE = 100 * 1024 * 1024    # 100MB per request
+MAX_FIELD_SIZE = 64 * 1024            # non-file form fields (metadata)
+MULTIPART_OVERHEAD = 1024 * 1024      # slack for part headers and boundaries
+SNIFF_BYTES = 1024                    # bytes handed to the security validator
+
+
+def get_boundary(content_type: str) -> Optional[bytes]:
+    """Extract the multipart boundary from a Content-Type header"""
+    media_type, options = parse_options_header(content_type)
+    if media_type != b"multipart/form-data":
+        return None
+    return options.get(b"boundary")
+
+
+def check_content_length(request: Request, max_body_size: int = MAX_TOTAL_SIZE + MULTIPART_OVERHEAD):
+    """Reject an oversized body from its Content-Length before reading it"""
+    content_length = request.headers.get("content-length")
+    if content_length and content_length.isdigit() and int(content_length) > max_body_size:
+        raise HTTPException(
+            status_code=413,
+            detail=f"Request body ({int(content_length)/1024/1024:.1f}MB) exceeds {(max_body_size - MULTIPART_OVERHEAD) // (1024 * 1024)}MB limit"
+        )
+
+
+class MultipartInspector:
+    """Incrementally parse a multipart body and validate each part as it arrives"""
+
+    def __init__(
+        self,
+        boundary: bytes,
+        validate_file: Callable[[str, bytes], bool],
+        max_file_size: int = MAX_FILE_SIZE,
+        max_total_size: int = MAX_TOTAL_SIZE,
+    ):
+        self.validate_file = validate_file
+        self.max_file_size = max_file_size
+        self.max_total_size = max_total_size
+        self.files: List[Dict] = []
+        self.fields: Dict[str, str] = {}
+        self.total_size = 0
+
+        self._header_field = b""
+        self._header_value = b""
+        self._headers: Dict[bytes, bytes] = {}
+        self._part: Optional[Dict] = None
+
+        self._parser = multipart.MultipartParser(boundary, {
+            "on_part_begin": self._on_part_begin,
+            "on_header_field": self._on_header_field,
+            "on_header_value": self._on_header_value,
+            "on_header_end": self._on_header_end,
+            "on_headers_finished": self._on_headers_finished,
+            "on_part_data": self._on_part_data,
+            "on_part_end": self._on_part_end,
+        })
+
+    def feed(self, chunk: bytes):
+        self._parser.write(chunk)
+
+    def finalize(self):
+        self._parser.finalize()
+
+    def _on_part_begin(self):
+        self._headers = {}
+        self._part = None
+
+    def _on_header_field(self, data: bytes, start: int, end: int):
+        self._header_field += data[start:end]
+
+    def _on_header_value(self, data: bytes, start: int, end: int):
+        self._header_value += data[start:end]
+
+    def _on_header_end(self):
+        self._headers[self._header_field.lower()] = self._header_value
+        self._header_field = b""
+        self._header_value = b""
+
+    def _on_headers_finished(self):
+        _, options = parse_options_header(self._headers.get(b"content-disposition", b""))
+        name = options.get(b"name", b"").decode("utf-8", errors="replace")
+        if b"filename" in options:
+            filename = options[b"filename"].decode("utf-8", errors="replace")
+            index = len(self.files) + 1
+            if not filename:
+                raise HTTPException(status_code=400, detail=f"File {index} has no filename")
+            self._part = {
+                "kind": "file",
+                "name": name,
+                "filename": filename,
+                "content_type": self._headers.get(b"content-type", b"").decode("latin-1"),
+                "size": 0,
+                "head": b"",
+                "validated": False,
+            }
+        else:
+            self._part = {"kind": "field", "name": name, "value": b""}
+
+    def _on_part_data(self, data: bytes, start: int, end: int):
+        part = self._part
+        if part is None:
+            return
+        length = end - start
+        if part["kind"] == "field":
+            if len(part["value"]) + length > MAX_FIELD_SIZE:
+                raise HTTPException(status_code=413, detail=f"Form field '{part['name']}' is too large")
+            part["value"] += data[start:end]
+            return
+
+        part["size"] += length
+        self.total_size += length
+        if part["size"] > self.max_file_size:
+            raise HTTPException(
+                status_code=413,
+                detail=f"File '{part['filename']}' is too large. Maximum allowed: {self.max_file_size // (1024 * 1024)}MB"
+            )
+        if self.total_size > self.max_total_size:
+            raise HTTPException(
+                status_code=413,
+                detail=f"Total file size exceeds {self.max_total_size // (1024 * 1024)}MB limit"
+            )
+        if not part["validated"]:
+            part["head"] += data[start:min(end, start + SNIFF_BYTES - len(part["head"]))]
+            if len(part["head"]) >= SNIFF_BYTES:
+                self._validate(part)
+
+    def _on_part_end(self):
+        part = self._part
+        self._part = None
+        if part is None:
+            return
+        if part["kind"] == "field":
+            value = part["value"].decode("utf-8", errors="replace")
+            if part["name"] == "metadata":
+                stripped = value.strip()
+                if stripped.startswith("{") and stripped.endswith("}"):
+                    try:
+                        json.loads(stripped)
+                    except json.JSONDecodeError as e:
+                        raise HTTPException(status_code=400, detail=f"Invalid metadata format: {str(e)}")
+            self.fields[part["name"]] = value
+            return
+
+        if part["size"] == 0:
+            raise HTTPException(status_code=400, detail=f"File '{part['filename']}' is empty")
+        if not part["validated"]:
+            self._validate(part)
+        self.files.append({
+            "filename": part["filename"],
+            "content_type": part["content_type"],
+            "size": part["size"],
+        })
+
+    def _validate(self, part: Dict):
+        if not self.validate_file(part["filename"], part["head"]):
+            raise HTTPException(status_code=400, detail="File type not allowed for security reasons")
+        part["validated"] = True
+        part["head"] = b""
+
+
+async def inspected_body(
+    request: Request,
+    inspector: MultipartInspector,
+    max_body_size: int = MAX_TOTAL_SIZE + MULTIPART_OVERHEAD,
+) -> AsyncIterator[bytes]:
+    """Yield the raw request body chunk by chunk after inspecting each chunk
+
+    Any validation failure raises HTTPException mid-stream, which aborts the
+    upstream request before the rest of the body is read from the client.
+    """
+    received = 0
+    async for chunk in request.stream():
+        if not chunk:
+            continue
+        received += len(chunk)
+        if received > max_body_size:
+            raise HTTPException(
+                status_code=413,
+                detail=f"Request body exceeds {(max_body_size - MULTIPART_OVERHEAD) // (1024 * 1024)}MB limit"
+            )
+        inspector.feed(chunk)
+        yield chunk
+    inspector.finalize()